@@ -12,12 +12,30 @@ def create_app(config_name='dev'):
     if config_name == 'prod':
         from config import ProdConfig
         app.config.from_object(ProdConfig)
+    elif config_name == 'test':
+        from config import TestConfig
+        app.config.from_object(TestConfig)
     else:
         from config import DevConfig
         app.config.from_object(DevConfig)
     
     db.init_app(app)
     
+    from utils.query_budget import init_query_budget
+    init_query_budget(app)
+    
+    from utils.json_provider import init_json
+    init_json(app)
+    
+    from utils.metrics import init_metrics
+    init_metrics(app)
+    
+    from utils.compression import init_compression
+    init_compression(app)
+    
+    from utils.decorators import init_operation_log
+    init_operation_log(app)
+    
     CORS(app, 
          resources={
              r"/api/*": {
@@ -35,8 +53,8 @@ def create_app(config_name='dev'):
     # ✅ 注册静态文件路由（提供上传的文件访问）
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        from flask import send_from_directory
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        from utils.static_files import send_upload
+        return send_upload(filename)
     
     with app.app_context():
         from views.user import user_bp
@@ -55,7 +73,11 @@ def create_app(config_name='dev'):
         app.register_blueprint(notification_bp)
         app.register_blueprint(admin_bp)
         
-        db.create_all()
+        from utils.migrations import create_schema
+        create_schema()
+    
+    from commands import register_commands
+    register_commands(app)
     
     @app.errorhandler(404)
     def not_found(error):
@@ -63,7 +85,12 @@ def create_app(config_name='dev'):
     
     @app.errorhandler(500)
     def internal_error(error):
-        print(f"500 错误: {error}", file=sys.stderr)
+        from flask import request
+        import traceback
+        print(f"500 错误: {request.method} {request.path} ({request.endpoint}): {error}", file=sys.stderr)
+        original = getattr(error, 'original_exception', None)
+        if original is not None:
+            traceback.print_exception(original, file=sys.stderr)
         return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
     
     @app.route('/api/test', methods=['GET'])
@@ -72,6 +99,20 @@ def create_app(config_name='dev'):
     
     return app
 
+def shutdown_app(app):
+    """优雅退出：结束推送连接、停止后台线程、写完操作日志并关闭数据库连接池"""
+    broker = app.extensions.get('notification_broker')
+    if broker is not None:
+        broker.close()
+    image_pool = app.extensions.get('image_pool')
+    if image_pool is not None:
+        image_pool.shutdown(wait=True)
+    writer = app.extensions.get('operation_log')
+    if writer is not None:
+        writer.stop()
+    with app.app_context():
+        db.engine.dispose()
+
 if __name__ == '__main__': 
     app = create_app('dev')
     print("=" * 50)
@@ -80,5 +121,6 @@ if __name__ == '__main__':
     print("📡 API 服务:   http://localhost:5000")
     print("🌐 CORS 已启用")
     print("📁 上传文件夹: " + app.config['UPLOAD_FOLDER'])
+    print("⚙ 开发服务器，生产环境请使用: gunicorn -c gunicorn.conf.py wsgi:app")
     print("=" * 50)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
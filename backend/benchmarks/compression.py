@@ -0,0 +1,90 @@
+"""响应压缩与条件请求压测：对比目录类接口在不压缩、gzip、brotli 和 304 协商下的传输字节数与耗时
+
+服务端耗时用 test client 测得（包含压缩的 CPU 开销），传输耗时按 --bandwidth 和 --rtt 估算，
+两者相加即客户端感知的延迟。
+
+用法（在 backend 目录下）:
+    python benchmarks/compression.py --scale small --rounds 20
+    python benchmarks/compression.py --bandwidth 5 --rtt 80
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed import TABLES, add_scale_arguments, configure_database, scale_counts, seed  # noqa: E402
+
+
+def measure(client, url, headers, rounds):
+    """返回 (平均服务端耗时 ms, 响应字节数, 状态码)"""
+    response = client.get(url, headers=headers)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response = client.get(url, headers=headers)
+        response.get_data()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    return elapsed, len(response.get_data()), response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description='响应压缩与条件请求压测')
+    add_scale_arguments(parser)
+    parser.add_argument('--rounds', type=int, default=20, help='每个接口每种模式的请求次数')
+    parser.add_argument('--bandwidth', type=float, default=10.0, help='估算传输耗时用的带宽（Mbps）')
+    parser.add_argument('--rtt', type=float, default=50.0, help='估算用的往返时延（ms）')
+    args = parser.parse_args()
+
+    configure_database(args.database_url)
+    from sqlalchemy import func
+    from app import create_app
+    from models import db, BookComment
+    from utils.compression import brotli
+
+    app = create_app('test')
+    app.config['QUERY_BUDGET_STRICT'] = False
+    counts = scale_counts(args.scale, {table: getattr(args, table) for table in TABLES})
+    with app.app_context():
+        seed(counts, random_seed=args.seed, chunk_size=args.chunk_size, log=lambda message: None)
+        # 评论最多的图书，详情页正文最大
+        book_id = db.session.query(BookComment.book_id).group_by(BookComment.book_id).order_by(
+            func.count(BookComment.id).desc()
+        ).limit(1).scalar()
+
+    urls = [
+        '/api/books?per_page=100',
+        '/api/books?keyword=%E5%8E%86%E5%8F%B2&per_page=50',
+        f'/api/books/{book_id}',
+        '/api/books/popular?limit=50',
+        '/api/books/categories'
+    ]
+    modes = [('原实现（无压缩、无 ETag）', None, False), ('不压缩 + ETag', 'identity', True), ('gzip', 'gzip', True)]
+    if brotli is not None:
+        modes.append(('brotli', 'br', True))
+    else:
+        print('未安装 brotli，跳过 brotli 模式')
+
+    client = app.test_client()
+    print(f'带宽 {args.bandwidth} Mbps，RTT {args.rtt} ms')
+    for url in urls:
+        print(f'\n{url}')
+        for label, encoding, enabled in modes:
+            app.config['COMPRESS_ENABLED'] = enabled
+            app.config['CONDITIONAL_GET'] = enabled
+            headers = {'Accept-Encoding': encoding} if encoding else {}
+            server_ms, size, status = measure(client, url, headers, args.rounds)
+            transfer_ms = size * 8 / (args.bandwidth * 1000)
+            print(f'  {label:<24} 状态 {status}  {size / 1024:9.1f} KB  服务端 {server_ms:7.2f}ms  '
+                  f'传输 {transfer_ms:8.2f}ms  合计 {server_ms + transfer_ms + args.rtt:8.2f}ms')
+
+        # 客户端已有缓存时用 If-None-Match 协商
+        app.config['COMPRESS_ENABLED'] = app.config['CONDITIONAL_GET'] = True
+        etag = client.get(url).headers.get('ETag')
+        server_ms, size, status = measure(client, url, {'If-None-Match': etag, 'Accept-Encoding': 'gzip'}, args.rounds)
+        print(f"  {'If-None-Match 协商':<24} 状态 {status}  {size / 1024:9.1f} KB  服务端 {server_ms:7.2f}ms  "
+              f"传输 {0:8.2f}ms  合计 {server_ms + args.rtt:8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
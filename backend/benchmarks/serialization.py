@@ -0,0 +1,64 @@
+"""JSON 序列化压测：1000 行列表在标准库 json 与 orjson、全部字段与 ?fields= 稀疏字段下的耗时
+
+用法（在 backend 目录下）:
+    python benchmarks/serialization.py --rows 1000 --rounds 50
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timeit(func, rounds):
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 序列化压测')
+    parser.add_argument('--rows', type=int, default=1000, help='每次序列化的行数')
+    parser.add_argument('--rounds', type=int, default=50, help='重复次数')
+    args = parser.parse_args()
+
+    os.environ.setdefault('TEST_DATABASE_URL', 'sqlite://')
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app
+    from models import Book, BookCategory
+    from utils.json_provider import OrjsonProvider, orjson
+
+    app = create_app('test')
+    category = BookCategory(id=1, name='文学')
+    books = [
+        Book(id=i, isbn=f'978{i:010d}', title=f'图书 {i}', author='刘慈欣', publisher='重庆出版社',
+             price=Decimal('23.00'), description='简介' * 50, category_id=1, category=category,
+             location='A区1架', cover_url=f'/uploads/covers/ab/{i:064d}.jpg', stock=3, total=5,
+             borrowed_count=i, avg_rating=Decimal('4.50'), rating_count=10, created_at=datetime.utcnow())
+        for i in range(1, args.rows + 1)
+    ]
+    providers = [('标准库 json', DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    else:
+        print('未安装 orjson，只测试标准库')
+
+    sparse = Book.serializer.parse_fields('id,title,stock')
+    with app.test_request_context():
+        for field_label, fields in (('全部字段', None), ('?fields=id,title,stock', sparse)):
+            build = timeit(lambda: Book.serializer.dump_many(books, fields), args.rounds)
+            data = {'code': 200, 'data': Book.serializer.dump_many(books, fields)}
+            for label, provider in providers:
+                encode = timeit(lambda: provider.response(data).get_data(), args.rounds)
+                size = len(provider.response(data).get_data())
+                print(f'{field_label:<24} {label:<12} 构造 {build:7.2f}ms  编码 {encode:7.2f}ms  '
+                      f'合计 {build + encode:7.2f}ms  {size / 1024:8.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
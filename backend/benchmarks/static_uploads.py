@@ -0,0 +1,110 @@
+"""上传文件服务压测：对比原来的 send_from_directory 与新的静态文件模式
+
+模拟列表页加载 N 张封面，分别统计首次加载、刷新页面时的请求数、传输字节数和吞吐量。
+
+用法（在 backend 目录下）:
+    python benchmarks/static_uploads.py --files 200 --size 40000 --rounds 5 --threads 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(client_factory, urls, threads, headers_for=None):
+    """并发请求一组 URL，返回 (耗时, 总字节数, 状态码计数)"""
+    statuses = {}
+    total_bytes = 0
+
+    def fetch(url):
+        client = client_factory()
+        headers = headers_for(url) if headers_for else {}
+        response = client.get(url, headers=headers)
+        size = len(response.get_data())
+        response.close()
+        return response.status_code, size, response.headers.get('ETag')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+    etags = {}
+    for url, (status, size, etag) in zip(urls, results):
+        statuses[status] = statuses.get(status, 0) + 1
+        total_bytes += size
+        etags[url] = etag
+    return elapsed, total_bytes, statuses, etags
+
+
+def report(name, requests, elapsed, total_bytes, statuses):
+    rps = requests / elapsed if elapsed else float('inf')
+    print(f'{name:<34} 请求 {requests:>6}  耗时 {elapsed:7.3f}s  吞吐 {rps:9.1f} req/s  '
+          f'传输 {total_bytes / 1024:10.1f} KB  状态 {statuses}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上传文件服务压测')
+    parser.add_argument('--files', type=int, default=200, help='文件数（一页封面数）')
+    parser.add_argument('--size', type=int, default=40000, help='每个文件字节数')
+    parser.add_argument('--rounds', type=int, default=5, help='重复加载次数')
+    parser.add_argument('--threads', type=int, default=4, help='并发线程数')
+    args = parser.parse_args()
+
+    upload_dir = tempfile.mkdtemp()
+    os.environ.setdefault('TEST_DATABASE_URL', 'sqlite://')
+
+    from flask import send_from_directory
+    from app import create_app
+
+    app = create_app('test')
+    app.config['UPLOAD_FOLDER'] = upload_dir
+
+    # 原实现：默认参数的 send_from_directory，无 Cache-Control
+    @app.route('/legacy-uploads/<path:filename>')
+    def legacy_uploaded_file(filename):
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+
+    names = []
+    os.makedirs(os.path.join(upload_dir, 'covers'), exist_ok=True)
+    for i in range(args.files):
+        name = f'covers/bench_{i:05d}.jpg'
+        with open(os.path.join(upload_dir, name), 'wb') as f:
+            f.write(os.urandom(args.size))
+        names.append(name)
+
+    try:
+        for label, prefix in (('原实现 send_from_directory', '/legacy-uploads/'), ('静态文件模式', '/uploads/')):
+            urls = [prefix + name for name in names] * args.rounds
+            elapsed, total_bytes, statuses, etags = run(app.test_client, urls, args.threads)
+            report(f'{label} 首次加载', len(urls), elapsed, total_bytes, statuses)
+
+            # 刷新页面：没有 max-age 的响应浏览器每次都要带 If-None-Match 协商；immutable 的响应直接用本地缓存
+            sample = app.test_client().get(urls[0])
+            cache_control = sample.headers.get('Cache-Control') or ''
+            sample.close()
+            if 'immutable' in cache_control:
+                print(f'{label + " 刷新页面":<34} 请求      0  （Cache-Control: {cache_control}，浏览器不再发请求）')
+            else:
+                elapsed, total_bytes, statuses, _ = run(
+                    app.test_client, urls, args.threads,
+                    headers_for=lambda url: {'If-None-Match': etags[url]} if etags.get(url) else {}
+                )
+                report(f'{label} 刷新页面', len(urls), elapsed, total_bytes, statuses)
+
+        for mode in ('x-sendfile', 'x-accel-redirect'):
+            app.config['UPLOAD_SENDFILE'] = mode
+            urls = ['/uploads/' + name for name in names] * args.rounds
+            elapsed, total_bytes, statuses, _ = run(app.test_client, urls, args.threads)
+            report(f'{mode}（由前端服务器发送）', len(urls), elapsed, total_bytes, statuses)
+        app.config['UPLOAD_SENDFILE'] = ''
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
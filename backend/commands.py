@@ -0,0 +1,184 @@
+import click
+
+
+def register_commands(app):
+    """注册 flask 命令行工具（flask --app app <命令>）"""
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--dry-run', is_flag=True, help='只报告偏差，不修复')
+    @click.option('--batch-size', default=1000, show_default=True, help='每批核对的图书数')
+    def reconcile_counters_command(dry_run, batch_size):
+        """核对并修复图书的库存、借阅次数和评分汇总"""
+        from utils.counters import reconcile_counters
+
+        drifts = reconcile_counters(fix=not dry_run, batch_size=batch_size)
+        for drift in drifts:
+            detail = ', '.join(f'{k}: {old} -> {new}' for k, (old, new) in drift['diff'].items())
+            click.echo(f"图书 {drift['book_id']}: {detail}")
+        action = '发现' if dry_run else '已修复'
+        click.echo(f'{action} {len(drifts)} 本图书的计数偏差')
+
+    @app.cli.command('backfill-stats')
+    def backfill_stats_command():
+        """从业务表全量重建管理后台统计表"""
+        from utils.stats import backfill_stats
+
+        result = backfill_stats()
+        click.echo(f"计数器: {result['counters']}")
+        click.echo(f"已重建 {result['days']} 天的借还统计、{result['categories']} 个分类的统计")
+
+    @app.cli.command('sweep-overdue')
+    @click.option('--interval', type=int, default=None,
+                  help='每隔多少秒清扫一次并持续运行（默认取 OVERDUE_SWEEP_INTERVAL，0 表示只执行一次）')
+    def sweep_overdue_command(interval):
+        """标记逾期借阅、发送到期/逾期提醒、清理过期幂等键（由 cron 每分钟执行，或加 --interval 作为常驻进程）"""
+        from utils.overdue import sweep_overdue, run_overdue_sweeper
+
+        if interval is None:
+            interval = app.config.get('OVERDUE_SWEEP_INTERVAL', 0)
+        if interval > 0:
+            click.echo(f'每 {interval} 秒清扫一次，Ctrl+C 退出')
+            run_overdue_sweeper(app, interval, log=click.echo)
+            return
+
+        result = sweep_overdue(
+            due_soon_days=app.config.get('DUE_SOON_DAYS', 3),
+            batch_size=app.config.get('OVERDUE_SWEEP_BATCH_SIZE', 1000),
+            idempotency_ttl=app.config.get('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+        )
+        click.echo(f"新增逾期 {result['overdue']} 条，发送到期提醒 {result['reminded']} 条，"
+                   f"过期预约保留 {result['expired_holds']} 条，清理幂等键 {result['expired_keys']} 条")
+
+    @app.cli.command('refresh-recommendations')
+    @click.option('--full', is_flag=True, help='全量重建（默认只重算有新借阅/评价的图书）')
+    def refresh_recommendations_command(full):
+        """计算图书相似度（共同借阅/评分），供相似图书和个性化推荐使用（可由 cron 定时执行）"""
+        from utils.cache import invalidate
+        from utils.recommendations import refresh_similarities
+
+        run = refresh_similarities(full=full, log=click.echo)
+        # 只有共享缓存（CACHE_TYPE=redis）能在这里通知到 web worker；进程内缓存由相似图书接口的 60 秒 TTL 兜底
+        invalidate('recommendations')
+        click.echo(f"已更新 {run.books_updated} 本图书的相似图书，耗时 {run.duration:.2f} 秒")
+
+    @app.cli.command('generate-covers')
+    def generate_covers_command():
+        """为已有封面补齐缺失的缩略图/WebP 变体（升级后或后台生成失败时执行）"""
+        from utils.images import generate_missing_variants
+
+        result = generate_missing_variants(log=click.echo)
+        click.echo(f"检查 {result['covers']} 张封面，生成 {result['created']} 个变体，失败 {result['failed']} 张")
+
+    @app.cli.command('db-upgrade')
+    @click.option('--to', 'target', default='head', show_default=True, help='目标版本')
+    def db_upgrade_command(target):
+        """执行 migrations/versions 中尚未执行的结构迁移"""
+        from utils.migrations import upgrade
+
+        applied = upgrade(target, log=click.echo)
+        click.echo(f"已升级 {len(applied)} 个版本" if applied else '数据库结构已是最新')
+
+    @app.cli.command('db-downgrade')
+    @click.argument('target')
+    def db_downgrade_command(target):
+        """回退结构迁移到指定版本（base 表示回退全部）"""
+        from utils.migrations import downgrade
+
+        reverted = downgrade(target, log=click.echo)
+        click.echo(f'已回退 {len(reverted)} 个版本')
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """显示当前结构版本和待执行的迁移"""
+        from utils.migrations import current_revision, pending_migrations
+        from models import db
+
+        with db.engine.connect() as connection:
+            click.echo(f'当前版本: {current_revision(connection) or "（未记录）"}')
+        for migration in pending_migrations():
+            click.echo(f'待执行 {migration.revision}: {migration.description}')
+
+    @app.cli.command('db-stamp')
+    @click.argument('revision', default='head')
+    def db_stamp_command(revision):
+        """只记录结构版本、不执行迁移（数据库结构已手工更新时使用）"""
+        from utils.migrations import stamp
+
+        click.echo(f'已记录版本: {stamp(revision)}')
+
+    @app.cli.command('audit-queries')
+    @click.option('--min-rows', default=1000, show_default=True, help='少于该行数的表全表扫描不报告')
+    @click.option('--verbose', is_flag=True, help='输出每条 SQL 的执行计划')
+    @click.option('--strict', is_flag=True, help='发现全表扫描时以非零状态退出')
+    def audit_queries_command(min_rows, verbose, strict):
+        """请求每个 GET 接口，对其执行的 SQL 运行 EXPLAIN，报告全表扫描和额外排序"""
+        from utils.query_audit import audit_queries
+
+        full_scans = sorts = 0
+        for result in audit_queries(app, min_rows=min_rows):
+            issues = [issue for query in result['queries'] for issue in query['issues']]
+            mark = '✗' if any(kind == 'full_scan' for kind, _, _ in issues) else ('⚠' if issues else '✓')
+            click.echo(f"{mark} GET {result['url']}（{result['status']}，{len(result['queries'])} 条 SQL）")
+            for query in result['queries']:
+                if not query['issues'] and not verbose:
+                    continue
+                click.echo(f"    {query['sql'][:200]}")
+                for kind, table, detail in query['issues']:
+                    click.echo(f"      {'全表扫描' if kind == 'full_scan' else '额外排序'} {table or ''}: {detail}")
+                    full_scans += kind == 'full_scan'
+                    sorts += kind == 'sort'
+                if verbose:
+                    for line in query['plan']:
+                        click.echo(f'      | {line}')
+        click.echo(f'共 {full_scans} 处全表扫描、{sorts} 处额外排序')
+        if strict and full_scans:
+            raise SystemExit(1)
+
+    @app.cli.command('import-books')
+    @click.argument('source', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl', 'marc']), help='文件格式，默认按扩展名判断')
+    @click.option('--on-duplicate', type=click.Choice(['skip', 'update', 'error']), default='skip',
+                  show_default=True, help='ISBN 已存在时的处理方式')
+    @click.option('--chunk-size', default=None, type=int, help='每批写入的行数，默认取 IMPORT_CHUNK_SIZE')
+    @click.option('--error-file', type=click.Path(dir_okay=False), help='把错误行写入该文件（JSON Lines）')
+    @click.option('--restart', is_flag=True, help='忽略断点，从头导入')
+    def import_books_command(source, fmt, on_duplicate, chunk_size, error_file, restart):
+        """从 CSV / JSON Lines / MARC 文件批量导入图书，中断后再次执行会从断点继续"""
+        import json
+        import os
+        from utils.book_import import (
+            detect_format, open_reader, import_books, checkpoint_path, load_checkpoint, save_checkpoint
+        )
+
+        checkpoint = checkpoint_path(source)
+        state = None if restart else load_checkpoint(checkpoint)
+        start_row = state['last_row'] if state else 0
+        if start_row:
+            click.echo(f'从断点继续：跳过前 {start_row} 行')
+
+        def on_chunk(report):
+            save_checkpoint(checkpoint, report)
+            click.echo(f"已处理到第 {report['last_row']} 行：新增 {report['inserted']}，"
+                       f"更新 {report['updated']}，跳过 {report['skipped']}，错误 {report['error_count']}")
+
+        with open(source, 'rb') as f:
+            report = import_books(
+                open_reader(f, fmt or detect_format(source)),
+                on_duplicate=on_duplicate,
+                chunk_size=chunk_size or app.config.get('IMPORT_CHUNK_SIZE', 1000),
+                start_row=start_row,
+                max_errors=None if error_file else app.config.get('IMPORT_MAX_ERRORS', 1000),
+                on_chunk=on_chunk
+            )
+
+        if error_file:
+            with open(error_file, 'w', encoding='utf-8') as f:
+                for error in report['errors']:
+                    f.write(json.dumps(error, ensure_ascii=False) + '\n')
+        else:
+            for error in report['errors'][:20]:
+                click.echo(f"第 {error['row']} 行 {error['isbn'] or ''}: {error['error']}")
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        click.echo(f"导入完成：新增 {report['inserted']}，更新 {report['updated']}，"
+                   f"跳过 {report['skipped']}，错误 {report['error_count']}")
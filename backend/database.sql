@@ -17,8 +17,8 @@ CREATE TABLE user (
     status ENUM('active', 'frozen') DEFAULT 'active' COMMENT '账户状态',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '注册时间',
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_username (username),
-    INDEX idx_role (role)
+    INDEX idx_role (role),
+    INDEX idx_user_created (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户表';
 
 -- 图书分类表
@@ -45,13 +45,26 @@ CREATE TABLE book (
     total INT DEFAULT 1 COMMENT '总库存',
     borrowed_count INT DEFAULT 0 COMMENT '借阅次数',
     avg_rating DECIMAL(3, 2) DEFAULT 0 COMMENT '平均评分',
+    rating_sum INT NOT NULL DEFAULT 0 COMMENT '评分总和',
+    rating_count INT NOT NULL DEFAULT 0 COMMENT '评分人数',
+    weighted_rating DECIMAL(4, 3) NOT NULL DEFAULT 0 COMMENT '贝叶斯加权评分',
+    rating_1 INT NOT NULL DEFAULT 0 COMMENT '1星人数',
+    rating_2 INT NOT NULL DEFAULT 0 COMMENT '2星人数',
+    rating_3 INT NOT NULL DEFAULT 0 COMMENT '3星人数',
+    rating_4 INT NOT NULL DEFAULT 0 COMMENT '4星人数',
+    rating_5 INT NOT NULL DEFAULT 0 COMMENT '5星人数',
+    reservation_seq INT NOT NULL DEFAULT 0 COMMENT '已分配的最大预约序号',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (category_id) REFERENCES book_category(id),
     INDEX idx_title (title),
     INDEX idx_author (author),
-    INDEX idx_isbn (isbn),
-    INDEX idx_category (category_id)
+    INDEX idx_book_created (created_at),
+    INDEX idx_book_category_created (category_id, created_at),
+    INDEX idx_borrowed_count (borrowed_count),
+    INDEX idx_avg_rating (avg_rating),
+    INDEX idx_weighted_rating (weighted_rating, rating_count),
+    FULLTEXT INDEX ft_book_search (title, author, publisher, description) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='图书表';
 
 -- 借阅记录表
@@ -64,12 +77,14 @@ CREATE TABLE borrow_record (
     return_time DATETIME COMMENT '实际归还时间',
     status ENUM('borrowed', 'returned', 'overdue') DEFAULT 'borrowed' COMMENT '状态',
     renewal_count INT DEFAULT 0 COMMENT '续借次数',
+    reminded_at DATETIME COMMENT '到期提醒发送时间',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES user(id),
     FOREIGN KEY (book_id) REFERENCES book(id),
-    INDEX idx_user (user_id),
-    INDEX idx_book (book_id),
-    INDEX idx_status (status)
+    INDEX idx_borrow_user_status_time (user_id, status, borrow_time),
+    INDEX idx_borrow_book (book_id),
+    INDEX idx_status_due (status, due_time),
+    INDEX idx_borrow_time (borrow_time)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='借阅记录表';
 
 -- 预约表
@@ -79,12 +94,14 @@ CREATE TABLE reservation (
     book_id INT NOT NULL COMMENT '图书ID',
     queue_position INT COMMENT '队列位置',
     reserve_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '预约时间',
-    status ENUM('waiting', 'notified', 'cancelled', 'finished') DEFAULT 'waiting' COMMENT '状态',
+    status ENUM('waiting', 'notified', 'cancelled', 'finished', 'expired') DEFAULT 'waiting' COMMENT '状态',
+    hold_until DATETIME COMMENT '到书保留截止时间',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES user(id),
     FOREIGN KEY (book_id) REFERENCES book(id),
-    INDEX idx_book_status (book_id, status),
-    INDEX idx_user (user_id)
+    INDEX idx_book_status_position (book_id, status, queue_position),
+    INDEX idx_reservation_user_book_status (user_id, book_id, status),
+    INDEX idx_reservation_status_hold (status, hold_until)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='预约表';
 
 -- 评论表
@@ -100,8 +117,8 @@ CREATE TABLE book_comment (
     FOREIGN KEY (user_id) REFERENCES user(id),
     FOREIGN KEY (book_id) REFERENCES book(id),
     CHECK (rating BETWEEN 1 AND 5),
-    INDEX idx_book (book_id),
-    INDEX idx_user (user_id)
+    INDEX idx_book_approved_created (book_id, is_approved, created_at),
+    INDEX idx_comment_user (user_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='评论表';
 
 -- 系统通知表
@@ -114,6 +131,7 @@ CREATE TABLE notification (
     is_read TINYINT(1) DEFAULT 0 COMMENT '是否已读',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES user(id),
+    INDEX idx_notification_user (user_id),
     INDEX idx_user_read (user_id, is_read)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='通知表';
 
@@ -128,10 +146,86 @@ CREATE TABLE operation_log (
     new_value TEXT COMMENT '新值',
     ip_address VARCHAR(45) COMMENT 'IP地址',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    INDEX idx_user (user_id),
-    INDEX idx_action (action)
+    INDEX idx_log_user (user_id),
+    INDEX idx_action (action),
+    INDEX idx_log_created (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='操作日志表';
 
+-- 幂等键表（借还请求去重）
+CREATE TABLE idempotency_key (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL COMMENT '用户ID',
+    `key` VARCHAR(64) NOT NULL COMMENT '客户端提交的 Idempotency-Key',
+    endpoint VARCHAR(128) COMMENT '请求路径',
+    status_code INT COMMENT '响应状态码，NULL 表示处理中',
+    response_body TEXT COMMENT '响应内容',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user(id),
+    UNIQUE KEY uk_user_key (user_id, `key`),
+    INDEX idx_idempotency_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='幂等键表';
+
+-- 统计汇总表（由借还等业务事件增量维护，flask --app app backfill-stats 可全量重建）
+-- 计数行按 slot 分散，每次更新随机一行、读取时求和，避免并发借还争同一行锁
+CREATE TABLE stat_counter (
+    name VARCHAR(64) NOT NULL COMMENT '计数器名称',
+    slot SMALLINT NOT NULL DEFAULT 0 COMMENT '分片',
+    value INT NOT NULL DEFAULT 0 COMMENT '计数值',
+    PRIMARY KEY (name, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='全局统计计数器';
+
+CREATE TABLE stat_daily_borrow (
+    date DATE NOT NULL COMMENT '日期',
+    slot SMALLINT NOT NULL DEFAULT 0 COMMENT '分片',
+    borrow_count INT NOT NULL DEFAULT 0 COMMENT '借阅次数',
+    return_count INT NOT NULL DEFAULT 0 COMMENT '归还次数',
+    active_users INT NOT NULL DEFAULT 0 COMMENT '活跃用户数',
+    PRIMARY KEY (date, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='每日借还统计';
+
+CREATE TABLE stat_daily_active_user (
+    date DATE NOT NULL COMMENT '日期',
+    user_id INT NOT NULL COMMENT '用户ID',
+    PRIMARY KEY (date, user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='每日活跃用户';
+
+CREATE TABLE stat_category (
+    category_id INT NOT NULL COMMENT '分类ID',
+    slot SMALLINT NOT NULL DEFAULT 0 COMMENT '分片',
+    book_count INT NOT NULL DEFAULT 0 COMMENT '图书数',
+    borrow_count INT NOT NULL DEFAULT 0 COMMENT '借阅次数',
+    PRIMARY KEY (category_id, slot),
+    FOREIGN KEY (category_id) REFERENCES book_category(id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='分类统计';
+
+-- 图书相似度（flask --app app refresh-recommendations 离线计算，每本书保留前 K 个）
+CREATE TABLE book_similarity (
+    book_id INT NOT NULL COMMENT '图书ID',
+    similar_book_id INT NOT NULL COMMENT '相似图书ID',
+    score DOUBLE NOT NULL COMMENT '相似度',
+    co_readers INT NOT NULL DEFAULT 0 COMMENT '共同读者数',
+    PRIMARY KEY (book_id, similar_book_id),
+    FOREIGN KEY (book_id) REFERENCES book(id),
+    FOREIGN KEY (similar_book_id) REFERENCES book(id),
+    INDEX idx_book_score (book_id, score)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='图书相似度';
+
+CREATE TABLE recommendation_run (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    full_refresh TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否全量计算',
+    borrow_watermark INT NOT NULL DEFAULT 0 COMMENT '已处理的最大借阅记录ID',
+    comment_watermark DATETIME COMMENT '已处理的评论最大更新时间',
+    books_updated INT NOT NULL DEFAULT 0 COMMENT '更新的图书数',
+    duration DOUBLE COMMENT '耗时（秒）',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='相似度计算记录';
+
+-- 结构版本（flask --app app db-upgrade 执行 backend/migrations/versions 中的迁移）
+CREATE TABLE schema_version (
+    version_num VARCHAR(32) PRIMARY KEY
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='结构版本';
+INSERT INTO schema_version (version_num) VALUES ('0005');
+
 -- 插入演示数据
 INSERT INTO book_category (name, description) VALUES
 ('文学', '各类文学作品'),
@@ -175,33 +269,10 @@ LEFT JOIN reservation r ON b.id = r.book_id
 GROUP BY b.id
 ORDER BY borrow_times DESC;
 
--- 创建触发器：更新图书评分
-DELIMITER //
-CREATE TRIGGER update_book_rating AFTER INSERT ON book_comment
-FOR EACH ROW
-BEGIN
-    UPDATE book SET avg_rating = (
-        SELECT ROUND(AVG(rating), 2) FROM book_comment WHERE book_id = NEW.book_id
-    ) WHERE id = NEW.book_id;
-END//
-DELIMITER ;
-
--- 创建触发器：自动更新库存
-DELIMITER //
-CREATE TRIGGER update_stock_on_borrow AFTER INSERT ON borrow_record
-FOR EACH ROW
-BEGIN
-    UPDATE book SET stock = stock - 1 WHERE id = NEW.book_id;
-    UPDATE book SET borrowed_count = borrowed_count + 1 WHERE id = NEW.book_id;
-END//
-DELIMITER ;
-
-DELIMITER //
-CREATE TRIGGER update_stock_on_return AFTER UPDATE ON borrow_record
-FOR EACH ROW
-BEGIN
-    IF NEW.status = 'returned' AND OLD.status != 'returned' THEN
-        UPDATE book SET stock = stock + 1 WHERE id = NEW.book_id;
-    END IF;
-END//
-DELIMITER ;
\ No newline at end of file
+-- 库存、借阅次数和评分汇总均由应用在业务事务中增量维护（见 utils/inventory.py、utils/counters.py），
+-- 不再使用触发器，否则会重复计数。
+-- 已有数据库的结构变更见 backend/migrations/versions，在 backend 目录下执行：
+--   flask --app app db-upgrade
+-- 然后运行 flask --app app reconcile-counters 回填并校正计数器，
+-- 运行 flask --app app backfill-stats 生成统计汇总表，
+-- 运行 flask --app app refresh-recommendations --full 计算图书相似度。
\ No newline at end of file
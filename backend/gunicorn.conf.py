@@ -0,0 +1,59 @@
+"""gunicorn 配置（在 backend 目录下执行）
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+进程数、线程数和超时时间取自 config.ProdConfig，可用环境变量 WEB_WORKERS、WEB_THREADS 等覆盖；
+数据库连接池大小按线程数推算（见 ProdConfig.DB_POOL_SIZE）。
+"""
+import signal
+import threading
+
+from config import ProdConfig
+
+bind = ProdConfig.WEB_BIND
+workers = ProdConfig.WEB_WORKERS
+# 线程 worker：数据库 IO 时释放 GIL。每个 SSE 推送连接在打开期间独占一个线程，
+# 因此每个 worker 只允许 NOTIFICATION_MAX_STREAMS 个推送连接（超出返回 503，前端改为稍后重连）；
+# 推送连接多时用 WEB_WORKER_CLASS=gevent 另起一组进程专门处理 /api/notifications/stream
+worker_class = ProdConfig.WEB_WORKER_CLASS
+threads = ProdConfig.WEB_THREADS
+worker_connections = ProdConfig.WEB_WORKER_CONNECTIONS
+timeout = ProdConfig.WEB_TIMEOUT
+graceful_timeout = ProdConfig.WEB_GRACEFUL_TIMEOUT
+keepalive = ProdConfig.WEB_KEEPALIVE
+max_requests = ProdConfig.WEB_MAX_REQUESTS
+max_requests_jitter = ProdConfig.WEB_MAX_REQUESTS // 10
+# 每个 worker 各自创建应用和连接池，fork 后不会共用父进程的数据库连接
+preload_app = False
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    per_worker = ProdConfig.DB_POOL_SIZE + ProdConfig.DB_MAX_OVERFLOW
+    concurrency = f'{threads} 个线程' if worker_class == 'gthread' else f'{worker_connections} 个连接（{worker_class}）'
+    print(f"🚀 {workers} 个 worker × {concurrency}，数据库连接最多 {workers} × {per_worker} = {workers * per_worker} 个，"
+          f"推送连接每个 worker 最多 {ProdConfig.NOTIFICATION_MAX_STREAMS} 个")
+
+
+def post_worker_init(worker):
+    # 收到 SIGTERM 时 worker 会等处理中的请求结束再退出，而 SSE 推送连接不会自己结束，
+    # 先通知它们关闭（浏览器自动重连到其他 worker），避免拖到 graceful_timeout 被强制杀掉
+    original = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        broker = worker.wsgi.extensions.get('notification_broker')
+        if broker is not None:
+            # 信号处理函数中不直接加锁，交给线程执行
+            threading.Thread(target=broker.close, daemon=True).start()
+        original(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+
+
+def worker_exit(server, worker):
+    from app import shutdown_app
+
+    app = getattr(worker, 'wsgi', None)
+    if app is not None:
+        shutdown_app(app)
@@ -0,0 +1,40 @@
+"""库存、借阅次数、评分汇总改为应用内增量维护：计数器列、到期提醒、预约保留
+
+已有数据库升级后运行 flask --app app reconcile-counters 回填计数器。
+"""
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+
+
+def upgrade(op):
+    if op.dialect == 'mysql':
+        # 计数器改由应用维护，触发器会重复计数
+        for trigger in ('update_book_rating', 'update_stock_on_borrow', 'update_stock_on_return'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.add_column('book', sa.Column('rating_sum', sa.Integer, nullable=False, server_default='0'))
+    op.add_column('book', sa.Column('rating_count', sa.Integer, nullable=False, server_default='0'))
+    op.add_column('borrow_record', sa.Column('reminded_at', sa.DateTime))
+    op.create_index('idx_status_due', 'borrow_record', ['status', 'due_time'])
+
+    if not op.has_column('book', 'reservation_seq'):
+        op.add_column('book', sa.Column('reservation_seq', sa.Integer, nullable=False, server_default='0'))
+        op.execute('UPDATE book SET reservation_seq = (SELECT COALESCE(MAX(queue_position), 0) '
+                   'FROM reservation WHERE reservation.book_id = book.id)')
+
+    if op.dialect == 'mysql':
+        op.execute("ALTER TABLE reservation MODIFY status "
+                   "ENUM('waiting', 'notified', 'cancelled', 'finished', 'expired') DEFAULT 'waiting'")
+    op.add_column('reservation', sa.Column('hold_until', sa.DateTime))
+    op.create_index('idx_book_status_position', 'reservation', ['book_id', 'status', 'queue_position'])
+
+
+def downgrade(op):
+    op.drop_index('idx_book_status_position', 'reservation')
+    op.drop_column('reservation', 'hold_until')
+    op.drop_column('book', 'reservation_seq')
+    op.drop_index('idx_status_due', 'borrow_record')
+    op.drop_column('borrow_record', 'reminded_at')
+    op.drop_column('book', 'rating_count')
+    op.drop_column('book', 'rating_sum')
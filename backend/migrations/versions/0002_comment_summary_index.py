@@ -0,0 +1,16 @@
+"""图书详情评论摘要和评论列表的 (book_id, is_approved, created_at) 索引"""
+
+revision = '0002'
+down_revision = '0001'
+
+
+def upgrade(op):
+    op.create_index('idx_book_approved_created', 'book_comment', ['book_id', 'is_approved', 'created_at'])
+    # 新索引以 book_id 开头，可以替代外键使用的单列索引
+    op.drop_index('idx_book', 'book_comment')
+
+
+def downgrade(op):
+    if op.dialect == 'mysql':
+        op.create_index('idx_book', 'book_comment', ['book_id'])
+    op.drop_index('idx_book_approved_created', 'book_comment')
@@ -0,0 +1,24 @@
+"""各星级评分人数和贝叶斯加权评分
+
+已有数据库升级后运行 flask --app app reconcile-counters 回填。
+"""
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+
+HISTOGRAM_COLUMNS = [f'rating_{rating}' for rating in range(1, 6)]
+
+
+def upgrade(op):
+    op.add_column('book', sa.Column('weighted_rating', sa.Numeric(4, 3), nullable=False, server_default='0'))
+    for column in HISTOGRAM_COLUMNS:
+        op.add_column('book', sa.Column(column, sa.Integer, nullable=False, server_default='0'))
+    op.create_index('idx_weighted_rating', 'book', ['weighted_rating', 'rating_count'])
+
+
+def downgrade(op):
+    op.drop_index('idx_weighted_rating', 'book')
+    for column in HISTOGRAM_COLUMNS:
+        op.drop_column('book', column)
+    op.drop_column('book', 'weighted_rating')
@@ -0,0 +1,42 @@
+"""图书相似度表和相似度计算记录
+
+升级后运行 flask --app app refresh-recommendations --full 生成相似度。
+"""
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+
+
+def _tables(op):
+    metadata = sa.MetaData()
+    sa.Table('book', metadata, autoload_with=op.connection)
+    book_similarity = sa.Table(
+        'book_similarity', metadata,
+        sa.Column('book_id', sa.Integer, sa.ForeignKey('book.id'), primary_key=True, autoincrement=False),
+        sa.Column('similar_book_id', sa.Integer, sa.ForeignKey('book.id'), primary_key=True, autoincrement=False),
+        sa.Column('score', sa.Float, nullable=False),
+        sa.Column('co_readers', sa.Integer, nullable=False, server_default='0'),
+        sa.Index('idx_book_score', 'book_id', 'score'),
+    )
+    recommendation_run = sa.Table(
+        'recommendation_run', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('full_refresh', sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column('borrow_watermark', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('comment_watermark', sa.DateTime),
+        sa.Column('books_updated', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('duration', sa.Float),
+        sa.Column('created_at', sa.DateTime),
+    )
+    return book_similarity, recommendation_run
+
+
+def upgrade(op):
+    for table in _tables(op):
+        op.create_table(table)
+
+
+def downgrade(op):
+    op.drop_table('recommendation_run')
+    op.drop_table('book_similarity')
@@ -0,0 +1,69 @@
+"""按实际查询补充组合索引，去掉被组合索引覆盖的单列索引
+
+索引名在整个库内唯一（SQLite 的索引名不区分表），原 database.sql 中重名的 idx_user / idx_book 改名。
+"""
+
+revision = '0005'
+down_revision = '0004'
+
+# (表, 索引名, 列)
+INDEXES = [
+    ('user', 'idx_user_created', ['created_at']),
+    ('book', 'idx_borrowed_count', ['borrowed_count']),
+    ('book', 'idx_avg_rating', ['avg_rating']),
+    ('book', 'idx_book_created', ['created_at']),
+    ('book', 'idx_book_category_created', ['category_id', 'created_at']),
+    ('borrow_record', 'idx_borrow_user_status_time', ['user_id', 'status', 'borrow_time']),
+    ('borrow_record', 'idx_borrow_time', ['borrow_time']),
+    ('reservation', 'idx_reservation_user_book_status', ['user_id', 'book_id', 'status']),
+    ('reservation', 'idx_reservation_status_hold', ['status', 'hold_until']),
+    ('notification', 'idx_notification_user', ['user_id']),
+    ('operation_log', 'idx_log_created', ['created_at']),
+]
+
+# (表, 旧名, 新名, 列)：只改名，MySQL 上不重建索引
+RENAMES = [
+    ('borrow_record', 'idx_book', 'idx_borrow_book', ['book_id']),
+    ('book_comment', 'idx_user', 'idx_comment_user', ['user_id']),
+    ('operation_log', 'idx_user', 'idx_log_user', ['user_id']),
+]
+
+# 已被唯一约束或组合索引的前缀覆盖（需在新索引创建之后删除，外键仍有可用的索引）
+REDUNDANT = [
+    ('user', 'idx_username', ['username']),
+    ('book', 'idx_isbn', ['isbn']),
+    ('book', 'idx_category', ['category_id']),
+    ('borrow_record', 'idx_user', ['user_id']),
+    ('borrow_record', 'idx_status', ['status']),
+    ('reservation', 'idx_user', ['user_id']),
+    ('reservation', 'idx_book_status', ['book_id', 'status']),
+]
+
+# database.sql 一直有、但 models.py 之前未声明的索引（create_all 建的库缺少）
+EXISTING = [
+    ('user', 'idx_role', ['role']),
+    ('book', 'idx_title', ['title']),
+    ('book', 'idx_author', ['author']),
+    ('notification', 'idx_user_read', ['user_id', 'is_read']),
+    ('operation_log', 'idx_action', ['action']),
+]
+
+
+def upgrade(op):
+    for table, name, columns in EXISTING + INDEXES:
+        op.create_index(name, table, columns)
+    for table, old, new, columns in RENAMES:
+        op.rename_index(table, old, new, columns)
+    for table, name, _ in REDUNDANT:
+        op.drop_index(name, table)
+
+
+def downgrade(op):
+    if op.dialect == 'mysql':
+        # 旧索引名只在 MySQL 上能恢复（SQLite 中 idx_user 等会重名）
+        for table, name, columns in REDUNDANT:
+            op.create_index(name, table, columns)
+        for table, old, new, columns in RENAMES:
+            op.rename_index(table, new, old, columns)
+    for table, name, _ in INDEXES:
+        op.drop_index(name, table)
@@ -0,0 +1,75 @@
+"""统计汇总表增加 slot 主键列：同一计数器/日期/分类分散到多行，并发借还不再争同一行锁
+
+原有的值保留在 slot 0 行上；回退时各 slot 的值合并回一行。
+"""
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+
+# 表 -> (原主键列, 原主键列类型, 其他列)
+TABLES = {
+    'stat_counter': ('name', sa.String(64), ['value']),
+    'stat_daily_borrow': ('date', sa.Date(), ['borrow_count', 'return_count', 'active_users']),
+    'stat_category': ('category_id', sa.Integer(), ['book_count', 'borrow_count']),
+}
+
+
+def _table(op, name, sharded):
+    key, key_type, values = TABLES[name]
+    metadata = sa.MetaData()
+    columns = [sa.Column(key, key_type, primary_key=True)]
+    if name == 'stat_category':
+        sa.Table('book_category', metadata, autoload_with=op.connection)
+        columns.append(sa.ForeignKeyConstraint([key], ['book_category.id']))
+    if sharded:
+        columns.append(sa.Column('slot', sa.SmallInteger, primary_key=True, autoincrement=False,
+                                 nullable=False, server_default='0'))
+    columns += [sa.Column(value, sa.Integer, nullable=False, server_default='0') for value in values]
+    return sa.Table(name, metadata, *columns)
+
+
+def _rebuild(op, name, sharded):
+    """SQLite 不能修改主键：改名后按新结构建表，再把数据复制回来"""
+    key, _, values = TABLES[name]
+    old = f'{name}_old'
+    op.execute(f'ALTER TABLE {op._quote(name)} RENAME TO {op._quote(old)}')
+    _table(op, name, sharded).create(op.connection)
+    if sharded:
+        op.execute(f'INSERT INTO {op._quote(name)} ({key}, slot, {", ".join(values)}) '
+                   f'SELECT {key}, 0, {", ".join(values)} FROM {op._quote(old)}')
+    else:
+        op.execute(f'INSERT INTO {op._quote(name)} ({key}, {", ".join(values)}) '
+                   f'SELECT {key}, {", ".join(f"SUM({value})" for value in values)} '
+                   f'FROM {op._quote(old)} GROUP BY {key}')
+    op.drop_table(old)
+
+
+def upgrade(op):
+    for name, (key, _, _) in TABLES.items():
+        if op.has_column(name, 'slot'):
+            continue
+        if op.dialect == 'mysql':
+            op.execute(f'ALTER TABLE {name} ADD COLUMN slot SMALLINT NOT NULL DEFAULT 0 AFTER {key}, '
+                       f'DROP PRIMARY KEY, ADD PRIMARY KEY ({key}, slot)')
+        else:
+            _rebuild(op, name, sharded=True)
+        op.log(f'  {name} 按 slot 分片')
+
+
+def downgrade(op):
+    for name, (key, _, values) in TABLES.items():
+        if not op.has_column(name, 'slot'):
+            continue
+        if op.dialect == 'mysql':
+            # 先把各 slot 的值合并到 slot 0 行（不存在时补上），再去掉 slot 列
+            op.execute(f'INSERT IGNORE INTO {name} ({key}, slot) SELECT DISTINCT {key}, 0 FROM {name}')
+            sums = ', '.join(f'SUM({value}) AS {value}' for value in values)
+            assignments = ', '.join(f's.{value} = t.{value}' for value in values)
+            op.execute(f'UPDATE {name} s JOIN (SELECT {key}, {sums} FROM {name} GROUP BY {key}) t '
+                       f'ON s.{key} = t.{key} SET {assignments} WHERE s.slot = 0')
+            op.execute(f'DELETE FROM {name} WHERE slot <> 0')
+            op.execute(f'ALTER TABLE {name} DROP PRIMARY KEY, DROP COLUMN slot, ADD PRIMARY KEY ({key})')
+        else:
+            _rebuild(op, name, sharded=False)
+        op.log(f'  {name} 取消 slot 分片')
@@ -0,0 +1,20 @@
+"""图书检索的 FULLTEXT（ngram）索引（仅 MySQL），SEARCH_BACKEND=auto 在 MySQL 上依赖该索引
+
+之前只写在 database.sql 中，create_all 建的库和旧库升级后都没有该索引，检索会报错并降级为 LIKE 全表扫描。
+"""
+
+revision = '0007'
+down_revision = '0006'
+
+
+def upgrade(op):
+    if op.dialect != 'mysql' or op.has_index('book', 'ft_book_search'):
+        return
+    op.execute('ALTER TABLE book ADD FULLTEXT INDEX ft_book_search (title, author, publisher, description) '
+               'WITH PARSER ngram')
+    op.log('  创建索引 book.ft_book_search (FULLTEXT ngram)')
+
+
+def downgrade(op):
+    if op.dialect == 'mysql':
+        op.drop_index('ft_book_search', 'book')
@@ -0,0 +1,12 @@
+"""幂等键的 created_at 索引，逾期清扫按创建时间分批删除过期的键"""
+
+revision = '0008'
+down_revision = '0007'
+
+
+def upgrade(op):
+    op.create_index('idx_idempotency_created', 'idempotency_key', ['created_at'])
+
+
+def downgrade(op):
+    op.drop_index('idx_idempotency_created', 'idempotency_key')
@@ -1,12 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 
+from utils.images import variant_urls
+from utils.serializers import Serializer, Field, iso, to_float, or_zero
+
 db = SQLAlchemy()
 
 
 class User(db.Model):
     """用户模型"""
     __tablename__ = 'user'
+    __table_args__ = (
+        db.Index('idx_role', 'role'),
+        db.Index('idx_user_created', 'created_at'),  # 管理后台用户列表、导出按注册时间
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(32), unique=True, nullable=False)
@@ -24,17 +32,13 @@ class User(db.Model):
     comments = db.relationship('BookComment', backref='user', lazy=True)
     notifications = db.relationship('Notification', backref='user', lazy=True)
     
+    serializer = Serializer(
+        'id', 'username', 'real_name', 'email', 'phone', 'role', 'status',
+        Field('created_at', convert=iso)
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'real_name': self.real_name,
-            'email': self.email,
-            'phone': self.phone,
-            'role':  self.role,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return self.serializer.dump(self)
 
 
 class BookCategory(db.Model):
@@ -48,17 +52,24 @@ class BookCategory(db.Model):
     
     books = db.relationship('Book', backref='category', lazy=True)
     
+    serializer = Serializer('id', 'name', 'description')
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description
-        }
+        return self.serializer.dump(self)
 
 
 class Book(db.Model):
     """图书模型"""
     __tablename__ = 'book'
+    __table_args__ = (
+        db.Index('idx_title', 'title'),
+        db.Index('idx_author', 'author'),
+        db.Index('idx_book_created', 'created_at'),  # 图书列表默认排序
+        db.Index('idx_book_category_created', 'category_id', 'created_at'),  # 按分类浏览
+        db.Index('idx_borrowed_count', 'borrowed_count'),  # 热门图书、按借阅次数排序
+        db.Index('idx_avg_rating', 'avg_rating'),  # 按平均评分排序
+        db.Index('idx_weighted_rating', 'weighted_rating', 'rating_count'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     isbn = db.Column(db.String(20), unique=True, nullable=False)
@@ -74,6 +85,15 @@ class Book(db.Model):
     total = db.Column(db.Integer, default=1)
     borrowed_count = db.Column(db.Integer, default=0)
     avg_rating = db.Column(db.Numeric(3, 2), default=0)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    weighted_rating = db.Column(db.Numeric(4, 3), default=0, nullable=False)  # 贝叶斯加权评分，排行榜按此排序
+    rating_1 = db.Column(db.Integer, default=0, nullable=False)  # 各星级评分人数
+    rating_2 = db.Column(db.Integer, default=0, nullable=False)
+    rating_3 = db.Column(db.Integer, default=0, nullable=False)
+    rating_4 = db.Column(db.Integer, default=0, nullable=False)
+    rating_5 = db.Column(db.Integer, default=0, nullable=False)
+    reservation_seq = db.Column(db.Integer, default=0, nullable=False)  # 已分配的最大预约序号
     created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
     updated_at = db.Column(db.DateTime, default=lambda: datetime.utcnow(), onupdate=lambda: datetime.utcnow())
     
@@ -81,33 +101,39 @@ class Book(db.Model):
     reservations = db.relationship('Reservation', backref='book', lazy=True)
     comments = db.relationship('BookComment', backref='book', lazy=True)
     
-    def to_dict(self, include_comments=False):
-        data = {
-            'id': self.id,
-            'isbn':  self.isbn,
-            'title': self.title,
-            'author': self.author,
-            'publisher': self.publisher,
-            'price': float(self.price) if self.price else 0,
-            'description': self.description,
-            'category_id': self.category_id,
-            'category': self.category.name if self.category else None,
-            'location': self.location,
-            'cover_url': self.cover_url,
-            'stock':  self.stock,
-            'total': self.total,
-            'borrowed_count': self.borrowed_count,
-            'avg_rating': float(self.avg_rating) if self.avg_rating else 0,
-            'created_at':  self.created_at.isoformat() if self.created_at else None
-        }
-        if include_comments:
-            data['comments'] = [c.to_dict() for c in self.comments]
-        return data
+    serializer = Serializer(
+        'id', 'isbn', 'title', 'author', 'publisher',
+        Field('price', convert=to_float),
+        'description', 'category_id',
+        Field('category', getter=lambda book: book.category.name if book.category else None,
+              columns=('category_id',),
+              options=lambda: [joinedload(Book.category).load_only(BookCategory.name)]),
+        'location', 'cover_url',
+        Field('cover_variants', getter=lambda book: variant_urls(book.cover_url), columns=('cover_url',)),
+        'stock', 'total', 'borrowed_count',
+        Field('avg_rating', convert=to_float),
+        Field('rating_count', convert=or_zero),
+        Field('weighted_rating', convert=to_float),
+        Field('created_at', convert=iso)
+    )
+    
+    def to_dict(self):
+        return self.serializer.dump(self)
+    
+    def rating_histogram(self):
+        """各星级评分人数 {'1': n, ..., '5': n}"""
+        return {str(rating): getattr(self, f'rating_{rating}') or 0 for rating in range(1, 6)}
 
 
 class BorrowRecord(db.Model):
     """借阅记录"""
     __tablename__ = 'borrow_record'
+    __table_args__ = (
+        db.Index('idx_borrow_user_status_time', 'user_id', 'status', 'borrow_time'),  # 我的借阅、在借/逾期检查
+        db.Index('idx_borrow_book', 'book_id'),
+        db.Index('idx_status_due', 'status', 'due_time'),  # 逾期扫描、逾期报表
+        db.Index('idx_borrow_time', 'borrow_time'),  # 借阅记录导出、按天统计
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -117,31 +143,34 @@ class BorrowRecord(db.Model):
     return_time = db.Column(db.DateTime)
     status = db.Column(db.Enum('borrowed', 'returned', 'overdue'), default='borrowed')
     renewal_count = db.Column(db.Integer, default=0)
+    reminded_at = db.Column(db.DateTime)  # 到期提醒发送时间，续借后清空
     created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
     
+    serializer = Serializer(
+        'id', 'user_id',
+        Field('user', getter=lambda record: record.user.username if record.user else None,
+              columns=('user_id',),
+              options=lambda: [joinedload(BorrowRecord.user).load_only(User.username)]),
+        'book_id',
+        Field('book', getter=lambda record: record.book.title if record.book else None,
+              columns=('book_id',),
+              options=lambda: [joinedload(BorrowRecord.book).load_only(Book.title)]),
+        Field('borrow_time', convert=iso),
+        Field('due_time', convert=iso),
+        Field('return_time', convert=iso),
+        'status', 'renewal_count',
+        Field('days_left', getter=lambda record: (record.due_time - datetime.utcnow()).days if record.due_time else 0,
+              columns=('due_time',))
+    )
+    
     def to_dict(self):
         """转换为字典"""
-        days_left = 0
-        if self.due_time:
-            delta = self.due_time - datetime.utcnow()
-            days_left = delta.days
-        
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'user': self.user.username if self.user else None,
-            'book_id': self.book_id,
-            'book':  self.book.title if self.book else None,
-            'borrow_time': self.borrow_time.isoformat() if self.borrow_time else None,
-            'due_time':  self.due_time.isoformat() if self.due_time else None,
-            'return_time': self.return_time.isoformat() if self.return_time else None,
-            'status': self.status,
-            'renewal_count': self.renewal_count,
-            'days_left': days_left
-        }
+        return self.serializer.dump(self)
     
     def is_overdue(self):
         """判断是否逾期"""
+        if self.status == 'overdue':
+            return True
         if self.status == 'borrowed' and self.due_time:
             return datetime.utcnow() > self.due_time
         return False
@@ -150,30 +179,44 @@ class BorrowRecord(db.Model):
 class Reservation(db.Model):
     """预约记录"""
     __tablename__ = 'reservation'
+    __table_args__ = (
+        db.Index('idx_book_status_position', 'book_id', 'status', 'queue_position'),
+        db.Index('idx_reservation_user_book_status', 'user_id', 'book_id', 'status'),  # 重复预约检查、我的预约
+        db.Index('idx_reservation_status_hold', 'status', 'hold_until'),  # 过期保留扫描
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
     queue_position = db.Column(db.Integer)
     reserve_time = db.Column(db.DateTime, default=lambda: datetime.utcnow())
-    status = db.Column(db.Enum('waiting', 'notified', 'cancelled', 'finished'), default='waiting')
+    status = db.Column(db.Enum('waiting', 'notified', 'cancelled', 'finished', 'expired'), default='waiting')
+    hold_until = db.Column(db.DateTime)  # 到书通知后的保留截止时间
     created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
     
+    serializer = Serializer(
+        'id', 'user_id', 'book_id',
+        Field('book_title', getter=lambda reservation: reservation.book.title,
+              columns=('book_id',),
+              options=lambda: [joinedload(Reservation.book).load_only(Book.title)]),
+        'queue_position',
+        Field('reserve_time', convert=iso),
+        Field('hold_until', convert=iso),
+        'status'
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'book_id': self.book_id,
-            'book_title': self.book.title,
-            'queue_position': self.queue_position,
-            'reserve_time': self.reserve_time.isoformat() if self.reserve_time else None,
-            'status': self.status
-        }
+        return self.serializer.dump(self)
 
 
 class BookComment(db.Model):
     """评论"""
     __tablename__ = 'book_comment'
+    # 图书详情的评论摘要和评论列表都按 (book_id, is_approved) 过滤、按 created_at 倒序
+    __table_args__ = (
+        db.Index('idx_book_approved_created', 'book_id', 'is_approved', 'created_at'),
+        db.Index('idx_comment_user', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -184,22 +227,27 @@ class BookComment(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
     updated_at = db.Column(db.DateTime, default=lambda: datetime.utcnow(), onupdate=lambda: datetime.utcnow())
     
+    serializer = Serializer(
+        'id', 'user_id',
+        Field('username', getter=lambda comment: comment.user.username,
+              columns=('user_id',),
+              options=lambda: [joinedload(BookComment.user).load_only(User.username)]),
+        'book_id', 'rating', 'comment', 'is_approved',
+        Field('created_at', convert=iso)
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'username': self.user.username,
-            'book_id': self.book_id,
-            'rating': self.rating,
-            'comment': self.comment,
-            'is_approved': self.is_approved,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return self.serializer.dump(self)
 
 
 class Notification(db.Model):
     """通知"""
     __tablename__ = 'notification'
+    # 二级索引隐含主键，idx_notification_user 即 (user_id, id)：通知列表按 id（与创建时间同序）倒序分页不需要排序
+    __table_args__ = (
+        db.Index('idx_notification_user', 'user_id'),
+        db.Index('idx_user_read', 'user_id', 'is_read'),  # 未读数
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -209,20 +257,20 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
     
+    serializer = Serializer('id', 'title', 'content', 'type', 'is_read', Field('created_at', convert=iso))
+    
     def to_dict(self):
-        return {
-            'id':  self.id,
-            'title': self.title,
-            'content': self.content,
-            'type': self.type,
-            'is_read': self.is_read,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return self.serializer.dump(self)
 
 
 class OperationLog(db.Model):
     """操作日志"""
     __tablename__ = 'operation_log'
+    __table_args__ = (
+        db.Index('idx_log_user', 'user_id'),
+        db.Index('idx_action', 'action'),
+        db.Index('idx_log_created', 'created_at'),  # 管理后台日志列表
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -234,12 +282,92 @@ class OperationLog(db.Model):
     ip_address = db.Column(db.String(45))
     created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
     
+    serializer = Serializer(
+        'id', 'user_id', 'action', 'table_name', 'record_id', 'old_value', 'new_value', 'ip_address',
+        Field('created_at', convert=iso)
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'action':  self.action,
-            'table_name': self.table_name,
-            'record_id':  self.record_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        return self.serializer.dump(self)
+
+
+class IdempotencyKey(db.Model):
+    """借还请求的幂等键"""
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uk_user_key'),
+        db.Index('idx_idempotency_created', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    endpoint = db.Column(db.String(128))
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+
+
+class BookSimilarity(db.Model):
+    """图书相似度：离线计算的每本书前 K 个相似图书（共同借阅/评分），由 refresh-recommendations 维护"""
+    __tablename__ = 'book_similarity'
+    __table_args__ = (db.Index('idx_book_score', 'book_id', 'score'),)
+    
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    similar_book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    co_readers = db.Column(db.Integer, default=0, nullable=False)  # 同时借阅/评价过两本书的读者数
+
+
+class RecommendationRun(db.Model):
+    """相似度计算记录，增量刷新从上一次的水位继续"""
+    __tablename__ = 'recommendation_run'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    full_refresh = db.Column(db.Boolean, default=False, nullable=False)
+    borrow_watermark = db.Column(db.Integer, default=0, nullable=False)  # 已处理的最大借阅记录 id
+    comment_watermark = db.Column(db.DateTime)  # 已处理的评论最大 updated_at
+    books_updated = db.Column(db.Integer, default=0, nullable=False)
+    duration = db.Column(db.Float)  # 秒
+    created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+
+
+class StatCounter(db.Model):
+    """全局统计计数器（用户数、图书数、在借数等），由业务事件增量维护
+
+    每个计数器分散在多个 slot 行上，每次随机更新其中一行，读取时求和，并发的借还事务不会争同一行锁。
+    """
+    __tablename__ = 'stat_counter'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    slot = db.Column(db.SmallInteger, primary_key=True, default=0, autoincrement=False)
+    value = db.Column(db.Integer, default=0, nullable=False)
+
+
+class StatDailyBorrow(db.Model):
+    """按天汇总的借还统计（与 StatCounter 一样按 slot 分行，读取时按天求和）"""
+    __tablename__ = 'stat_daily_borrow'
+    
+    date = db.Column(db.Date, primary_key=True)
+    slot = db.Column(db.SmallInteger, primary_key=True, default=0, autoincrement=False)
+    borrow_count = db.Column(db.Integer, default=0, nullable=False)
+    return_count = db.Column(db.Integer, default=0, nullable=False)
+    active_users = db.Column(db.Integer, default=0, nullable=False)
+
+
+class StatDailyActiveUser(db.Model):
+    """每天有借阅行为的用户（用于去重统计活跃用户数）"""
+    __tablename__ = 'stat_daily_active_user'
+    
+    date = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+
+class StatCategory(db.Model):
+    """按分类汇总的图书数与借阅次数（与 StatCounter 一样按 slot 分行，读取时按分类求和）"""
+    __tablename__ = 'stat_category'
+    
+    category_id = db.Column(db.Integer, db.ForeignKey('book_category.id'), primary_key=True)
+    slot = db.Column(db.SmallInteger, primary_key=True, default=0, autoincrement=False)
+    book_count = db.Column(db.Integer, default=0, nullable=False)
+    borrow_count = db.Column(db.Integer, default=0, nullable=False)
\ No newline at end of file
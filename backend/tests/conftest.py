@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, shutdown_app
+from models import db, User, BookCategory
+from utils.jwt_handler import create_token
+
+
+@pytest.fixture
+def app(tmp_path):
+    """TestConfig 应用：内存 SQLite、严格的查询预算，上传文件写到临时目录"""
+    app = create_app('test')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield app
+    shutdown_app(app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """创建用户，返回 (用户ID, 认证请求头)"""
+    def make(username, role='reader'):
+        with app.app_context():
+            user = User(username=username, password='x', role=role)
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f'Bearer {create_token(user.id, role)}'}
+    return make
+
+
+@pytest.fixture
+def category(app):
+    with app.app_context():
+        category = BookCategory(name='小说')
+        db.session.add(category)
+        db.session.commit()
+        return category.id
@@ -0,0 +1,19 @@
+"""认证状态：没有共享存储（AUTH_STORE=memory）时每次请求以数据库中的用户状态为准"""
+from models import db, User
+
+
+def test_frozen_user_is_rejected_without_shared_store(app, client, make_user):
+    user_id, reader = make_user('reader')
+    assert client.get('/api/borrows/my-records', headers=reader).status_code == 200
+
+    # 模拟另一个 worker 冻结了账户：本进程没有收到失效通知
+    with app.app_context():
+        User.query.filter_by(id=user_id).update({'status': 'frozen'})
+        db.session.commit()
+    assert client.get('/api/borrows/my-records', headers=reader).status_code == 403
+
+
+def test_logout_revokes_token(client, make_user):
+    _, reader = make_user('reader')
+    assert client.post('/api/users/logout', headers=reader).status_code == 200
+    assert client.get('/api/borrows/my-records', headers=reader).status_code == 401
@@ -0,0 +1,31 @@
+"""幂等键：重复提交返回第一次的响应，过期的键按新请求处理并由逾期清扫删除"""
+from datetime import datetime, timedelta
+
+from models import db, IdempotencyKey
+from utils.overdue import sweep_overdue
+from test_query_budget import add_book
+
+
+def test_expired_keys_are_reused_and_purged(app, client, make_user, category):
+    _, admin = make_user('admin', role='admin')
+    _, reader = make_user('reader')
+    book_id = add_book(client, admin, category, stock=2)
+    headers = dict(reader, **{'Idempotency-Key': 'borrow-1'})
+
+    first = client.post(f'/api/borrows/{book_id}', headers=headers)
+    assert first.status_code == 200
+    assert client.post(f'/api/borrows/{book_id}', headers=headers).get_json() == first.get_json()
+
+    ttl = app.config['IDEMPOTENCY_KEY_TTL']
+    with app.app_context():
+        IdempotencyKey.query.update({'created_at': datetime.utcnow() - timedelta(seconds=ttl + 60)})
+        db.session.commit()
+    # 过期后同一个键是新请求：同一本书已借阅，不再返回第一次的成功响应
+    assert client.post(f'/api/borrows/{book_id}', headers=headers).status_code == 400
+
+    with app.app_context():
+        IdempotencyKey.query.update({'created_at': datetime.utcnow() - timedelta(seconds=ttl + 60)})
+        db.session.commit()
+        result = sweep_overdue(due_soon_days=0, idempotency_ttl=ttl)
+        assert result['expired_keys'] == 1
+        assert IdempotencyKey.query.count() == 0
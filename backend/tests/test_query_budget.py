@@ -0,0 +1,126 @@
+"""在 TestConfig 的严格查询预算下驱动每个写接口：超出预算时 after_request 抛出 QueryBudgetExceeded，测试失败"""
+import io
+
+from PIL import Image
+
+from models import db, BookCategory
+
+
+def add_book(client, admin, category, isbn='9787000000001', stock=1):
+    response = client.post('/api/books', headers=admin, data={
+        'isbn': isbn, 'title': '围城', 'author': '钱锺书', 'category_id': str(category),
+        'stock': str(stock), 'total': str(stock)
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']['id']
+
+
+def borrow(client, reader, book_id, key=None):
+    headers = dict(reader, **({'Idempotency-Key': key} if key else {}))
+    response = client.post(f'/api/borrows/{book_id}', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']['id']
+
+
+def test_user_writes(client, make_user):
+    response = client.post('/api/users/register', json={'username': 'reader', 'password': 'secret1'})
+    assert response.status_code == 201
+    response = client.post('/api/users/login', json={'username': 'reader', 'password': 'secret1'})
+    assert response.status_code == 200
+    headers = {'Authorization': f"Bearer {response.get_json()['data']['token']}"}
+
+    assert client.put('/api/users/profile', headers=headers, json={'real_name': '读者'}).status_code == 200
+    response = client.post('/api/users/change-password', headers=headers,
+                           json={'old_password': 'secret1', 'new_password': 'secret2'})
+    assert response.status_code == 200
+    assert client.post('/api/users/logout', headers=headers).status_code == 200
+
+
+def test_book_writes(app, client, make_user, category):
+    _, admin = make_user('admin', role='admin')
+    book_id = add_book(client, admin, category)
+    response = client.put(f'/api/books/{book_id}', headers=admin, data={'title': '围城（新版）', 'stock': '2'})
+    assert response.status_code == 200
+
+    # 最坏情况：同时换分类、改库存和上传封面
+    with app.app_context():
+        other = BookCategory(name='散文')
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    cover = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(cover, 'PNG')
+    cover.seek(0)
+    response = client.put(f'/api/books/{book_id}', headers=admin, data={
+        'category_id': str(other_id), 'stock': '3', 'total': '3', 'cover': (cover, 'cover.png')
+    })
+    assert response.status_code == 200, response.get_json()
+    assert client.delete(f'/api/books/{book_id}', headers=admin).status_code == 200
+
+    data = 'isbn,title,author\n9787000000002,呐喊,鲁迅\n9787000000003,彷徨,鲁迅\n'
+    response = client.post('/api/books/import', headers=admin, data={
+        'file': (io.BytesIO(data.encode('utf-8')), 'books.csv')
+    })
+    assert response.status_code == 200, response.get_json()
+
+
+def test_borrow_reserve_return(client, make_user, category):
+    _, admin = make_user('admin', role='admin')
+    _, first = make_user('reader1')
+    _, second = make_user('reader2')
+    _, third = make_user('reader3')
+    book_id = add_book(client, admin, category)
+
+    record_id = borrow(client, first, book_id, key='borrow-1')
+    assert client.post(f'/api/borrows/{record_id}/renew', headers=first).status_code == 200
+
+    # 库存为 0 时排队，归还时副本保留给队首读者
+    response = client.post(f'/api/reservations/{book_id}', headers=second)
+    assert response.status_code == 200
+    response = client.post(f'/api/reservations/{book_id}', headers=third)
+    assert response.status_code == 200
+    waiting_id = response.get_json()['data']['id']
+    response = client.post(f'/api/borrows/{record_id}/return', headers=dict(first, **{'Idempotency-Key': 'return-1'}))
+    assert response.status_code == 200
+
+    # 队首读者借走保留的副本，另一位读者取消排队
+    held_record_id = borrow(client, second, book_id)
+    assert client.post(f'/api/reservations/{waiting_id}/cancel', headers=third).status_code == 200
+
+    assert client.post(f'/api/borrows/{held_record_id}/return', headers=second).status_code == 200
+
+    # 取消已保留的预约：副本转给下一位读者或加回库存
+    response = client.post(f'/api/reservations/{book_id}', headers=third)
+    assert response.status_code == 200
+    reservation_id = response.get_json()['data']['id']
+    record_id = borrow(client, first, book_id)
+    assert client.post(f'/api/borrows/{record_id}/return', headers=first).status_code == 200
+    assert client.post(f'/api/reservations/{reservation_id}/cancel', headers=third).status_code == 200
+    assert client.get(f'/api/books/{book_id}').get_json()['data']['stock'] == 1
+
+
+def test_comment_and_notification_writes(client, make_user, category):
+    _, admin = make_user('admin', role='admin')
+    _, reader = make_user('reader')
+    book_id = add_book(client, admin, category)
+
+    for rating in (4.5, True, '5', 0, 6, None):
+        response = client.post(f'/api/comments/{book_id}', headers=reader, json={'rating': rating})
+        assert response.status_code == 400, rating
+    response = client.post(f'/api/comments/{book_id}', headers=reader, json={'rating': 5, 'comment': '好书'})
+    assert response.status_code in (200, 201), response.get_json()
+    comment_id = response.get_json()['data']['id']
+    assert client.delete(f'/api/comments/{comment_id}', headers=reader).status_code == 200
+
+    borrow(client, reader, book_id)
+    notifications = client.get('/api/notifications', headers=reader).get_json()['data']
+    assert client.put(f"/api/notifications/{notifications[0]['id']}/read", headers=reader).status_code == 200
+    assert client.put('/api/notifications/read-all', headers=reader).status_code == 200
+    assert client.post('/api/notifications/stream-ticket', headers=reader).status_code == 200
+
+
+def test_admin_user_writes(client, make_user):
+    _, admin = make_user('admin', role='admin')
+    user_id, _ = make_user('reader')
+    assert client.post(f'/api/admin/users/{user_id}/freeze', headers=admin).status_code == 200
+    assert client.post(f'/api/admin/users/{user_id}/unfreeze', headers=admin).status_code == 200
@@ -0,0 +1,78 @@
+"""列表和导出接口的SQL条数不随返回行数增长（关联数据一次预加载，没有 N+1 查询）"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db, User, Book, BorrowRecord, Notification, OperationLog
+
+ENDPOINTS = [
+    ('reader', '/api/borrows/my-records'),
+    ('reader', '/api/borrows/overdue'),
+    ('reader', '/api/notifications'),
+    ('admin', '/api/admin/users'),
+    ('admin', '/api/admin/logs'),
+    ('admin', '/api/admin/statistics/overdue-report'),
+    ('admin', '/api/admin/export/users?format=csv'),
+    ('admin', '/api/admin/export/borrow-records?format=csv'),
+]
+
+
+@contextmanager
+def count_queries():
+    counter = {'count': 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter['count'] += 1
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+
+
+def seed(app, reader_id, admin_id, category, start, n):
+    """为读者添加 n 本书的借阅记录（一半逾期）、n 条通知，再添加 n 个用户和 n 条操作日志"""
+    with app.app_context():
+        now = datetime.utcnow()
+        for i in range(start, start + n):
+            book = Book(isbn=f'97870000{i:05d}', title=f'图书{i}', author=f'作者{i}',
+                        category_id=category, stock=1, total=1)
+            user = User(username=f'user{i}', password='x')
+            db.session.add_all([book, user])
+            db.session.flush()
+            overdue = i % 2 == 0
+            db.session.add_all([
+                BorrowRecord(user_id=reader_id, book_id=book.id, borrow_time=now - timedelta(days=40),
+                             due_time=now + timedelta(days=-10 if overdue else 30),
+                             status='overdue' if overdue else 'borrowed'),
+                Notification(user_id=reader_id, title='借阅成功', content=f'图书{i}'),
+                OperationLog(user_id=admin_id, action='update_book', table_name='book', record_id=book.id),
+            ])
+        db.session.commit()
+
+
+def request_counts(client, headers):
+    counts = {}
+    for role, url in ENDPOINTS:
+        with count_queries() as counter:
+            response = client.get(url, headers=headers[role])
+            response.get_data()  # 导出接口流式输出，读完响应体才执行完全部查询
+        assert response.status_code == 200, (url, response.get_data(as_text=True)[:200])
+        counts[url] = counter['count']
+    return counts
+
+
+def test_read_query_counts_do_not_grow_with_rows(app, client, make_user, category):
+    reader_id, reader = make_user('reader')
+    admin_id, admin = make_user('admin', role='admin')
+    headers = {'reader': reader, 'admin': admin}
+
+    seed(app, reader_id, admin_id, category, 0, 3)
+    request_counts(client, headers)  # 预热用户状态等缓存
+    small = request_counts(client, headers)
+    seed(app, reader_id, admin_id, category, 3, 10)
+    large = request_counts(client, headers)
+    assert large == small
@@ -0,0 +1,344 @@
+import csv
+import io
+import json
+import os
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Book, BookCategory
+from utils import stats
+from utils.cache import invalidate, invalidate_book
+from utils.search import index_book
+
+FORMATS = ('csv', 'jsonl', 'marc')
+
+# 可导入的字段及长度限制（与 book 表一致）
+TEXT_FIELDS = {'title': 128, 'author': 64, 'publisher': 64, 'location': 64, 'description': None}
+# on_duplicate=update 时覆盖的字段；库存由借还流程维护，不随导入覆盖
+UPDATE_FIELDS = ('title', 'author', 'publisher', 'price', 'description', 'category_id', 'location')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    """根据扩展名判断文件格式"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if ext in ('.mrc', '.marc'):
+        return 'marc'
+    return 'csv'
+
+
+def read_csv(stream):
+    """逐行读取 CSV（首行为表头，兼容 Excel 导出的 BOM），产出 (行号, dict)"""
+    for row_number, row in enumerate(csv.DictReader(stream), start=1):
+        yield row_number, row
+
+
+def read_jsonl(stream):
+    """逐行读取 JSON Lines，空行跳过"""
+    for row_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, ImportRowError(f'JSON 解析失败: {e}')
+            continue
+        yield row_number, row if isinstance(row, dict) else ImportRowError('每行必须是一个 JSON 对象')
+
+
+# MARC21 字段到图书字段的映射：(字段, 子字段)
+MARC_FIELDS = {
+    'isbn': [('020', 'a')],
+    'title': [('245', 'a'), ('245', 'b')],
+    'author': [('100', 'a'), ('110', 'a')],
+    'publisher': [('260', 'b'), ('264', 'b')],
+    'description': [('520', 'a')],
+    'price': [('020', 'c'), ('365', 'b')],
+    'location': [('852', 'h')]
+}
+
+
+def _parse_marc_record(data):
+    """解析一条 ISO 2709 格式的 MARC 记录，返回 {字段: [{子字段: 值}]}"""
+    base = int(data[12:17])
+    directory = data[24:base - 1]
+    fields = {}
+    for i in range(0, len(directory) - 11, 12):
+        tag = directory[i:i + 3].decode('ascii')
+        length = int(directory[i + 3:i + 7])
+        start = int(directory[i + 7:i + 12])
+        raw = data[base + start:base + start + length].rstrip(b'\x1e')
+        if tag < '010':
+            continue
+        subfields = {}
+        for part in raw.split(b'\x1f')[1:]:
+            if part:
+                code = part[:1].decode('ascii', 'replace')
+                subfields.setdefault(code, part[1:].decode('utf-8', 'replace').strip())
+        fields.setdefault(tag, []).append(subfields)
+    return fields
+
+
+def _marc_value(fields, key):
+    values = []
+    for tag, code in MARC_FIELDS[key]:
+        for subfields in fields.get(tag, ()):
+            if subfields.get(code):
+                # 去掉 ISBD 标点，例如 "三体 /"、"重庆出版社,"
+                values.append(subfields[code].rstrip(' /:;,.='))
+                break
+        if values and key != 'title':
+            break
+    value = ' '.join(values).strip()
+    if key == 'isbn':
+        value = value.split(' ')[0]
+    elif key == 'price':
+        # 020$c 形如 "CNY23.00"，只取数字部分
+        match = re.search(r'\d+(\.\d+)?', value)
+        value = match.group() if match else ''
+    return value
+
+
+def read_marc(stream):
+    """逐条读取二进制 MARC21 记录（每条以 5 位长度开头，以 0x1d 结尾）"""
+    row_number = 0
+    while True:
+        head = stream.read(5)
+        if not head or not head.strip():
+            break
+        row_number += 1
+        try:
+            length = int(head)
+            data = head + stream.read(length - 5)
+            fields = _parse_marc_record(data)
+        except (ValueError, IndexError) as e:
+            yield row_number, ImportRowError(f'MARC 记录格式错误: {e}')
+            break
+        yield row_number, {key: _marc_value(fields, key) for key in MARC_FIELDS}
+
+
+def open_reader(fileobj, fmt):
+    """按格式包装二进制文件流，返回逐行产出 (行号, dict) 的迭代器"""
+    if fmt == 'marc':
+        return read_marc(fileobj)
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    return read_jsonl(text) if fmt == 'jsonl' else read_csv(text)
+
+
+def _int(value, field, default):
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'{field} 必须是整数')
+    if number < 0:
+        raise ImportRowError(f'{field} 不能为负数')
+    return number
+
+
+def validate_row(raw, categories):
+    """校验并规范化一行数据，返回可直接插入 book 表的字典；数据有误时抛出 ImportRowError
+
+    categories 为 {分类名: 分类ID}，行中可用 category_id 或 category（分类名）指定分类。
+    """
+    raw = {str(k).strip().lower(): (v.strip() if isinstance(v, str) else v)
+           for k, v in raw.items() if k is not None}
+
+    isbn = re.sub(r'[\s-]', '', str(raw.get('isbn') or '')).upper()
+    if not isbn:
+        raise ImportRowError('缺少ISBN')
+    if len(isbn) > 20:
+        raise ImportRowError('ISBN 过长')
+    if not raw.get('title'):
+        raise ImportRowError('缺少书名')
+
+    row = {'isbn': isbn}
+    for field, max_length in TEXT_FIELDS.items():
+        value = raw.get(field) or None
+        if value is not None:
+            value = str(value)
+            if max_length and len(value) > max_length:
+                raise ImportRowError(f'{field} 超过 {max_length} 个字符')
+        row[field] = value
+
+    try:
+        price = Decimal(str(raw.get('price') or 0))
+    except InvalidOperation:
+        raise ImportRowError('price 格式错误')
+    if price < 0 or price >= Decimal('1000000'):
+        raise ImportRowError('price 超出范围')
+    row['price'] = price
+
+    total = _int(raw.get('total'), 'total', None)
+    stock = _int(raw.get('stock'), 'stock', None)
+    total = total if total is not None else (stock if stock is not None else 1)
+    stock = stock if stock is not None else total
+    if stock > total:
+        raise ImportRowError('stock 不能大于 total')
+    row['stock'], row['total'] = stock, total
+
+    category_id = None
+    if raw.get('category_id') not in (None, ''):
+        category_id = _int(raw.get('category_id'), 'category_id', None)
+        if category_id not in categories.values():
+            raise ImportRowError(f'分类ID {category_id} 不存在')
+    elif raw.get('category'):
+        category_id = categories.get(raw['category'])
+        if category_id is None:
+            raise ImportRowError(f"分类 {raw['category']} 不存在")
+    row['category_id'] = category_id
+    return row
+
+
+def load_checkpoint(path):
+    """读取断点文件，返回上次已提交的最后一行行号等信息；文件不存在时返回 None"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, report):
+    """原子地写入断点（先写临时文件再替换），中断时不会留下半个文件"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in report.items() if k != 'errors'}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _existing(isbns):
+    """一条 IN 查询取回一批 ISBN 中已存在的图书"""
+    rows = db.session.query(Book.isbn, Book.id, Book.category_id).filter(Book.isbn.in_(isbns)).all()
+    return {row.isbn: row for row in rows}
+
+
+def _insert_rows(rows, report, max_errors):
+    """多行 INSERT 写入一批新书；与并发新增冲突时逐行重试，只跳过冲突的行"""
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Book), [row for _, row in rows])
+        return [row for _, row in rows]
+    except IntegrityError:
+        pass
+    inserted = []
+    for row_number, row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Book), [row])
+            inserted.append(row)
+        except IntegrityError:
+            _error(report, row_number, row['isbn'], 'ISBN 已存在', max_errors)
+    return inserted
+
+
+def _error(report, row_number, isbn, message, max_errors=None):
+    report['error_count'] += 1
+    if max_errors is None or len(report['errors']) < max_errors:
+        report['errors'].append({'row': row_number, 'isbn': isbn, 'error': message})
+
+
+def _flush_chunk(chunk, report, on_duplicate, max_errors):
+    """处理一批已校验的行：集合查重、批量插入或更新、维护统计与检索索引，然后提交"""
+    existing = _existing([row['isbn'] for _, row in chunk])
+    new_rows, updates, category_changes = [], [], []
+    for row_number, row in chunk:
+        current = existing.get(row['isbn'])
+        if current is None:
+            new_rows.append((row_number, row))
+        elif on_duplicate == 'update':
+            updates.append(dict({field: row[field] for field in UPDATE_FIELDS}, id=current.id))
+            category_changes.append((current.category_id, row['category_id']))
+        elif on_duplicate == 'error':
+            _error(report, row_number, row['isbn'], 'ISBN 已存在', max_errors)
+        else:
+            report['skipped'] += 1
+
+    inserted = _insert_rows(new_rows, report, max_errors) if new_rows else []
+    if updates:
+        db.session.bulk_update_mappings(Book, updates)
+
+    if inserted:
+        stats.record_books_imported(Counter(row['category_id'] for row in inserted))
+    for old_category_id, new_category_id in category_changes:
+        stats.record_book_category(old_category_id, new_category_id)
+    db.session.commit()
+
+    report['inserted'] += len(inserted)
+    report['updated'] += len(updates)
+    report['last_row'] = chunk[-1][0]
+
+    for update in updates:
+        invalidate_book(update['id'])
+
+    # 新增和更新的图书同步检索索引（MySQL FULLTEXT 由数据库自动维护，这里是空操作）
+    changed = [row['isbn'] for row in inserted]
+    if updates:
+        changed += [row['isbn'] for _, row in chunk if row['isbn'] in existing]
+    if changed:
+        for book in db.session.query(
+            Book.id, Book.isbn, Book.title, Book.author, Book.publisher, Book.description
+        ).filter(Book.isbn.in_(changed)):
+            index_book(book)
+
+
+def import_books(rows, on_duplicate='skip', chunk_size=1000, start_row=0, max_errors=1000, on_chunk=None):
+    """批量导入图书
+
+    rows 为 (行号, dict) 迭代器（见 open_reader），按 chunk_size 分批查重并写入，每批一个事务。
+    on_duplicate：skip 跳过已存在的 ISBN / update 更新书目信息 / error 记为错误行。
+    start_row 之前（含）的行视为已导入，用于断点续传；每批提交后调用 on_chunk(report) 保存进度。
+    """
+    if on_duplicate not in ('skip', 'update', 'error'):
+        raise ValueError('on_duplicate 只能是 skip、update 或 error')
+    categories = dict(db.session.query(BookCategory.name, BookCategory.id).all())
+    report = {
+        'inserted': 0, 'updated': 0, 'skipped': 0, 'error_count': 0,
+        'last_row': start_row, 'errors': []
+    }
+
+    chunk = []
+    seen = set()  # 文件内重复的 ISBN
+    for row_number, raw in rows:
+        if row_number <= start_row:
+            continue
+        if isinstance(raw, ImportRowError):
+            _error(report, row_number, None, str(raw), max_errors)
+            continue
+        try:
+            row = validate_row(raw, categories)
+        except ImportRowError as e:
+            _error(report, row_number, raw.get('isbn'), str(e), max_errors)
+            continue
+        if row['isbn'] in seen:
+            _error(report, row_number, row['isbn'], '文件中 ISBN 重复', max_errors)
+            continue
+        seen.add(row['isbn'])
+        chunk.append((row_number, row))
+
+        if len(chunk) >= chunk_size:
+            _flush_chunk(chunk, report, on_duplicate, max_errors)
+            chunk = []
+            if on_chunk:
+                on_chunk(report)
+
+    if chunk:
+        _flush_chunk(chunk, report, on_duplicate, max_errors)
+        if on_chunk:
+            on_chunk(report)
+    if report['inserted'] or report['updated']:
+        invalidate('book_lists')
+    return report
+
+
+def checkpoint_path(source):
+    return source + '.checkpoint'
@@ -0,0 +1,185 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, make_response
+
+
+class NullCache:
+    """不缓存（测试或临时关闭缓存时使用）"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def incr(self, key):
+        return 0
+
+    def get_counter(self, key):
+        return 0
+
+
+class LRUCache:
+    """进程内 LRU + TTL 缓存，单进程部署使用"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (过期时间, value)
+        self._counters = {}  # 计数器（命名空间版本号）不参与淘汰
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+
+class RedisCache:
+    """Redis 共享缓存，多 worker 部署时使用（需要安装 redis）"""
+
+    def __init__(self, url, prefix='library:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_TYPE=redis 需要安装 redis 包: pip install redis')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self._client.incr(self.prefix + key)
+
+    def get_counter(self, key):
+        return int(self._client.get(self.prefix + key) or 0)
+
+
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """返回当前应用配置的缓存后端"""
+    app = current_app._get_current_object()
+    cache = app.extensions.get('cache')
+    if cache is not None:
+        return cache
+
+    with _cache_lock:
+        cache = app.extensions.get('cache')
+        if cache is None:
+            cache_type = app.config.get('CACHE_TYPE', 'memory')
+            if cache_type == 'redis':
+                cache = RedisCache(app.config['CACHE_REDIS_URL'])
+            elif cache_type == 'null':
+                cache = NullCache()
+            else:
+                cache = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1024))
+            app.extensions['cache'] = cache
+    return cache
+
+
+def _namespace_version(cache, namespace):
+    return cache.get_counter(f'ns:{namespace}')
+
+
+def invalidate(*namespaces):
+    """使命名空间下的所有缓存失效（递增版本号，旧键自然过期）"""
+    try:
+        cache = get_cache()
+        for namespace in namespaces:
+            cache.incr(f'ns:{namespace}')
+    except Exception as e:
+        print(f"缓存失效失败:{e}")
+
+
+def invalidate_book(book_id):
+    """图书数据（库存、借阅次数、评分等）变化后调用"""
+    invalidate('book_lists', f'book:{book_id}')
+
+
+def cached_view(namespace, ttl=None):
+    """读穿缓存装饰器：缓存 GET 接口的 200 响应，并支持 ETag/304
+
+    namespace 可以是字符串，或接收视图参数返回字符串的函数。
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            ns = namespace(**kwargs) if callable(namespace) else namespace
+            timeout = ttl or current_app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+            cache = get_cache()
+
+            entry = None
+            try:
+                version = _namespace_version(cache, ns)
+                key = f'view:{ns}:{version}:{request.full_path}'
+                entry = cache.get(key)
+            except Exception as e:
+                print(f"读取缓存失败:{e}")
+                key = None
+
+            if entry is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or key is None:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest()
+                }
+                try:
+                    cache.set(key, entry, timeout)
+                except Exception as e:
+                    print(f"写入缓存失败:{e}")
+
+            response = current_app.response_class(entry['body'], status=200, mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.headers['Cache-Control'] = current_app.config.get(
+                'CACHE_CONTROL', 'public, max-age=0, must-revalidate'
+            )
+            return response.make_conditional(request)
+        return decorated
+    return decorator
@@ -0,0 +1,37 @@
+from sqlalchemy import func
+
+from models import BookComment
+from utils.pagination import keyset_paginate
+
+# 评论列表的排序（最新在前），与 idx_book_approved_created 索引一致
+COMMENT_ORDER = [(BookComment.created_at, True, None), (BookComment.id, True, None)]
+
+
+def approved_comments(book_id):
+    """图书已审核评论的查询，条件正好是 idx_book_approved_created 的前两列"""
+    return BookComment.query.filter(BookComment.book_id == book_id, BookComment.is_approved == True)
+
+
+def comment_summary(book, limit):
+    """图书详情内嵌的评论摘要：最新 limit 条评论、评分分布和已审核评论数
+
+    评分分布读取图书上增量维护的汇总列（包含未审核的评论）；评论只取走索引的前 limit 条，
+    comment_count 与评论列表一致只统计已审核的评论，一页取完时不再单独计数；
+    comments_next_cursor 可直接作为 /api/comments/book/<id>?cursor= 的参数继续加载后面的评论。
+    """
+    comments, next_cursor, comment_count = [], None, 0
+    if book.rating_count:
+        if limit > 0:
+            comments, next_cursor = keyset_paginate(
+                approved_comments(book.id).options(*BookComment.serializer.load_options()), COMMENT_ORDER, limit
+            )
+        if limit > 0 and next_cursor is None:
+            comment_count = len(comments)
+        else:
+            comment_count = approved_comments(book.id).with_entities(func.count(BookComment.id)).scalar()
+    return {
+        'comments': BookComment.serializer.dump_many(comments),
+        'comment_count': comment_count,
+        'rating_histogram': book.rating_histogram(),
+        'comments_next_cursor': next_cursor
+    }
@@ -0,0 +1,134 @@
+import hashlib
+import time
+import zlib
+from flask import request, g
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 可压缩的响应类型（图片等已压缩的格式不再压缩）
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class _GzipEncoder:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 输出 gzip 格式
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def _encoder(encoding, config):
+    if encoding == 'br':
+        return _BrotliEncoder(config.get('COMPRESS_BR_QUALITY', 4))
+    return _GzipEncoder(config.get('COMPRESS_LEVEL', 6))
+
+
+def negotiate_encoding(config):
+    """按服务端优先顺序选择客户端接受的编码，没有可用编码时返回 None"""
+    for encoding in config.get('COMPRESS_ALGORITHMS', ('br', 'gzip')):
+        if encoding == 'br' and brotli is None:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _compress_stream(chunks, encoder):
+    """逐块压缩流式响应；每块都同步刷新，客户端能及时收到已生成的部分"""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        # 客户端中途断开时关闭原生成器，释放其中的数据库游标
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _add_etag(response):
+    """GET 的 JSON 响应按内容计算弱 ETag，并处理 If-None-Match（304 不再压缩和发送正文）"""
+    if (request.method != 'GET' or response.status_code != 200 or response.is_streamed
+            or response.mimetype != 'application/json' or 'no-store' in response.headers.get('Cache-Control', '')):
+        return response
+    if response.get_etag()[0] is None:
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest(), weak=True)
+    return response.make_conditional(request)
+
+
+def _compress(response, config):
+    if not response.mimetype.startswith(COMPRESSIBLE_TYPES):
+        return response
+    # 同一 URL 是否压缩取决于 Accept-Encoding，缓存需要区分
+    response.vary.add('Accept-Encoding')
+    if ('Content-Encoding' in response.headers or response.status_code < 200
+            or response.status_code in (204, 206, 304) or request.method == 'HEAD'
+            or response.mimetype == 'text/event-stream'):
+        return response
+    encoding = negotiate_encoding(config)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, _encoder(encoding, config))
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        encoder = _encoder(encoding, config)
+        response.set_data(encoder.compress(body) + encoder.finish())
+
+    response.headers['Content-Encoding'] = encoding
+    # 压缩后字节与原文不同，强 ETag 改为弱 ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """为 /api 下的响应注册条件请求（弱 ETag / 304）和 gzip/brotli 压缩
+
+    需在 init_metrics 之后调用：after_request 倒序执行，压缩耗时会计入请求总耗时。
+    未安装 brotli 时只使用 gzip。
+    """
+    @app.after_request
+    def compress_response(response):
+        if not request.path.startswith('/api/'):
+            return response
+        start = time.perf_counter()
+        if app.config.get('CONDITIONAL_GET', True):
+            response = _add_etag(response)
+        if app.config.get('COMPRESS_ENABLED', True):
+            response = _compress(response, app.config)
+        g.compress_time = time.perf_counter() - start
+        return response
@@ -0,0 +1,134 @@
+from flask import current_app
+from sqlalchemy import update, func, case, literal
+
+from models import db, Book, BookComment, BorrowRecord, Reservation
+
+RATING_LEVELS = range(1, 6)
+
+
+def rating_prior():
+    """贝叶斯加权评分的先验 (均值 m, 权重 C)：相当于每本书预先有 C 个 m 分的评分"""
+    return (
+        float(current_app.config.get('RATING_PRIOR_MEAN', 3.5)),
+        int(current_app.config.get('RATING_PRIOR_WEIGHT', 5))
+    )
+
+
+def weighted_rating(rating_sum, rating_count, prior=None):
+    """贝叶斯加权评分 (C*m + 评分总和) / (C + 评分人数)，没有评分时为 0"""
+    if not rating_count:
+        return 0
+    mean, weight = prior or rating_prior()
+    return round((weight * mean + rating_sum) / (weight + rating_count), 3)
+
+
+def apply_rating_delta(book_id, old_rating, new_rating):
+    """O(1) 增量维护评分汇总：rating_sum/rating_count/avg_rating/weighted_rating 和各星级人数
+
+    新增评论时 old_rating 为 None，删除时 new_rating 为 None。
+    avg_rating、weighted_rating 放在 SET 的最前面并只引用旧值：MySQL 按从左到右使用新值求值，
+    其他数据库使用旧值，两者结果一致。
+    """
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    new_sum = Book.rating_sum + sum_delta
+    new_count = Book.rating_count + count_delta
+    mean, weight = rating_prior()
+
+    values = [
+        (Book.avg_rating, case(
+            (new_count > 0, func.round(new_sum * literal(1.0) / new_count, 2)),
+            else_=0
+        )),
+        (Book.weighted_rating, case(
+            (new_count > 0, func.round((new_sum + literal(weight * mean)) / (new_count + weight), 3)),
+            else_=0
+        )),
+        (Book.rating_sum, new_sum),
+        (Book.rating_count, new_count)
+    ]
+    if old_rating != new_rating:
+        for rating, delta in ((old_rating, -1), (new_rating, 1)):
+            if rating is not None:
+                column = getattr(Book, f'rating_{rating}')
+                values.append((column, column + delta))
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .ordered_values(*values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_counters(fix=True, batch_size=1000):
+    """按批核对图书计数器（评分汇总、借阅次数、库存），返回存在偏差的记录
+
+    fix=True 时用批量 UPDATE 修复偏差。
+    """
+    drifts = []
+    last_id = 0
+    prior = rating_prior()
+    histogram_columns = [getattr(Book, f'rating_{rating}') for rating in RATING_LEVELS]
+    while True:
+        books = db.session.query(
+            Book.id, Book.stock, Book.total, Book.borrowed_count,
+            Book.rating_sum, Book.rating_count, Book.avg_rating, Book.weighted_rating, *histogram_columns
+        ).filter(Book.id > last_id).order_by(Book.id).limit(batch_size).all()
+        if not books:
+            break
+        first_id, last_id = books[0].id, books[-1].id
+
+        histograms = {}
+        for book_id, rating, count in db.session.query(
+            BookComment.book_id, BookComment.rating, func.count(BookComment.id)
+        ).filter(BookComment.book_id.between(first_id, last_id)).group_by(BookComment.book_id, BookComment.rating):
+            histograms.setdefault(book_id, {})[rating] = count
+        borrows = dict(
+            (row[0], (row[1], row[2])) for row in db.session.query(
+                BorrowRecord.book_id,
+                func.count(BorrowRecord.id),
+                func.sum(case((BorrowRecord.status.in_(['borrowed', 'overdue']), 1), else_=0))
+            ).filter(BorrowRecord.book_id.between(first_id, last_id)).group_by(BorrowRecord.book_id)
+        )
+
+        # 预约到书后保留的副本不计入可借库存
+        holds = dict(db.session.query(Reservation.book_id, func.count(Reservation.id)).filter(
+            Reservation.book_id.between(first_id, last_id),
+            Reservation.status == 'notified'
+        ).group_by(Reservation.book_id).all())
+
+        fixes = []
+        for book in books:
+            histogram = histograms.get(book.id, {})
+            rating_sum = sum(rating * count for rating, count in histogram.items())
+            rating_count = sum(histogram.values())
+            borrowed_count, active = borrows.get(book.id, (0, 0))
+            borrowed_count, active = int(borrowed_count or 0), int(active or 0)
+            expected = {
+                'rating_sum': rating_sum,
+                'rating_count': rating_count,
+                'avg_rating': round(rating_sum / rating_count, 2) if rating_count else 0,
+                'weighted_rating': weighted_rating(rating_sum, rating_count, prior),
+                'borrowed_count': borrowed_count,
+                'stock': max((book.total or 0) - active - holds.get(book.id, 0), 0)
+            }
+            actual = {
+                'rating_sum': book.rating_sum or 0,
+                'rating_count': book.rating_count or 0,
+                'avg_rating': float(book.avg_rating or 0),
+                'weighted_rating': float(book.weighted_rating or 0),
+                'borrowed_count': book.borrowed_count or 0,
+                'stock': book.stock or 0
+            }
+            for rating in RATING_LEVELS:
+                expected[f'rating_{rating}'] = histogram.get(rating, 0)
+                actual[f'rating_{rating}'] = getattr(book, f'rating_{rating}') or 0
+            diff = {k: (actual[k], v) for k, v in expected.items() if abs(actual[k] - v) > 0.0005}
+            if diff:
+                drifts.append({'book_id': book.id, 'diff': diff})
+                fixes.append(dict({'id': book.id}, **{k: v for k, (_, v) in diff.items()}))
+
+        if fix and fixes:
+            db.session.bulk_update_mappings(Book, fixes)
+            db.session.commit()
+    return drifts
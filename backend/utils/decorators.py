@@ -1,29 +1,176 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from datetime import datetime
 from functools import wraps
-from models import User, OperationLog
-from app import db
-from flask import request
+from flask import request, current_app, make_response
+from models import db, OperationLog
 
-def log_operation(action, table_name):
-    """操作日志装饰器"""
+
+class OperationLogWriter:
+    """操作日志后台写入器：请求线程只负责入队，后台线程按批量 INSERT 落库
+
+    队列满时按 overflow 策略处理：drop 丢弃新日志并计数，block 最多阻塞 block_timeout 秒后丢弃。
+    """
+
+    def __init__(self, app, maxsize=10000, batch_size=200, flush_interval=1.0,
+                 overflow='drop', block_timeout=0.5):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='operation-log-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, entry):
+        """日志入队，不阻塞请求（block 策略除外）"""
+        if self._thread is None:
+            self.start()
+        try:
+            if self.overflow == 'block':
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                print(f"⚠ 操作日志队列已满，累计丢弃 {self.dropped} 条")
+
+    def _drain(self, first=None):
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # 攒够一批或等到刷新间隔再写，降低写入次数
+            deadline = time.monotonic() + self.flush_interval
+            batch = self._drain(first)
+            while len(batch) < self.batch_size and time.monotonic() < deadline and not self._stop.is_set():
+                time.sleep(min(0.05, self.flush_interval))
+                batch.extend(self._drain()[:self.batch_size - len(batch)])
+            self.write(batch)
+        self.flush()
+
+    def write(self, batch):
+        """用一条多行 INSERT 写入一批日志（独立会话，不影响请求中的事务）"""
+        if not batch:
+            return
+        try:
+            with self.app.app_context():
+                db.session.execute(OperationLog.__table__.insert(), batch)
+                db.session.commit()
+                db.session.remove()
+        except Exception as e:
+            print(f"✗ 写入操作日志失败({len(batch)}条): {e}")
+
+    def flush(self):
+        """把队列中剩余的日志全部写入"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self.write(batch)
+
+    def stop(self, timeout=5):
+        """停止后台线程并写完剩余日志（进程退出时调用）"""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+
+def init_operation_log(app):
+    """创建操作日志写入器，进程退出时自动刷新"""
+    writer = OperationLogWriter(
+        app,
+        maxsize=app.config.get('OPERATION_LOG_QUEUE_SIZE', 10000),
+        batch_size=app.config.get('OPERATION_LOG_BATCH_SIZE', 200),
+        flush_interval=app.config.get('OPERATION_LOG_FLUSH_INTERVAL', 1.0),
+        overflow=app.config.get('OPERATION_LOG_OVERFLOW', 'drop')
+    )
+    app.extensions['operation_log'] = writer
+    atexit.register(writer.stop)
+    return writer
+
+
+def _snapshot(model, record_id):
+    if model is None or record_id is None:
+        return None
+    obj = db.session.get(model, record_id, populate_existing=True)
+    if obj is None:
+        return None
+    return json.dumps(obj.to_dict(), ensure_ascii=False, default=str)
+
+
+def log_operation(action, table_name, model=None, id_arg=None):
+    """操作日志装饰器
+
+    放在 token_required/admin_required 之下。指定 model 和 id_arg（视图中记录ID的参数名）时，
+    会记录操作前后的数据到 old_value/new_value；新增类接口取响应中的 data 作为 new_value。
+    """
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            result = f(*args, **kwargs)
-            
+            record_id = kwargs.get(id_arg) if id_arg else None
+            old_value = _snapshot(model, record_id)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code >= 400:
+                return response
+
             # 记录操作日志
             user_id = None
-            if 'payload' in kwargs:
-                user_id = kwargs['payload'].get('user_id')
-            
-            log = OperationLog(
-                user_id=user_id,
-                action=action,
-                table_name=table_name,
-                ip_address=request.remote_addr
-            )
-            db.session.add(log)
-            db.session.commit()
-            
-            return result
+            payload = kwargs.get('payload') or (args[0] if args and isinstance(args[0], dict) else None)
+            if payload:
+                user_id = payload.get('user_id')
+
+            new_value = None
+            if record_id is not None:
+                new_value = _snapshot(model, record_id)
+            else:
+                data = (response.get_json(silent=True) or {}).get('data')
+                if isinstance(data, dict):
+                    record_id = data.get('id')
+                    new_value = json.dumps(data, ensure_ascii=False, default=str)
+
+            entry = {
+                'user_id': user_id,
+                'action': action,
+                'table_name': table_name,
+                'record_id': record_id,
+                'old_value': old_value,
+                'new_value': new_value,
+                'ip_address': request.remote_addr,
+                'created_at': datetime.utcnow()
+            }
+            writer = current_app.extensions.get('operation_log')
+            if writer is not None and current_app.config.get('OPERATION_LOG_ASYNC', True):
+                writer.submit(entry)
+            elif writer is not None:
+                writer.write([entry])
+
+            return response
         return decorated
-    return decorator
\ No newline at end of file
+    return decorator
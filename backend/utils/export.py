@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from flask import Response, stream_with_context
+
+FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+FLUSH_SIZE = 64 * 1024  # 输出缓冲达到该大小时才向客户端发送一块
+
+
+def parse_date_arg(value, end_of_day=False):
+    """解析 YYYY-MM-DD 或 ISO 格式的日期参数"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(row):
+    return json.dumps(row, ensure_ascii=False, default=_json_default)
+
+
+def _buffered(pieces):
+    """把小片段合并成较大的块，减少 WSGI 层的写次数"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_pieces(rows):
+    # 与原接口保持相同的外层结构，只是逐行写出
+    yield '{"code": 200, "msg": "导出成功", "data": ['
+    total = 0
+    for row in rows:
+        yield (',' if total else '') + _dumps(row)
+        total += 1
+    yield f'], "total": {total}}}'
+
+
+def _ndjson_pieces(rows):
+    for row in rows:
+        yield _dumps(row) + '\n'
+
+
+def _csv_pieces(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    # 带 BOM，Excel 打开中文不乱码
+    yield '\ufeff'
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            k: v.isoformat() if isinstance(v, datetime) else v
+            for k, v in row.items()
+        })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 输出 gzip 格式
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(rows, fields, fmt='json', filename='export', use_gzip=False):
+    """生成流式导出响应，rows 为逐行产出字典的可迭代对象，内存占用与总行数无关"""
+    if fmt not in FORMATS:
+        raise ValueError(f'不支持的导出格式: {fmt}')
+
+    if fmt == 'csv':
+        pieces = _csv_pieces(rows, fields)
+    elif fmt == 'ndjson':
+        pieces = _ndjson_pieces(rows)
+    else:
+        pieces = _json_pieces(rows)
+
+    chunks = _buffered(pieces)
+    headers = {}
+    if fmt != 'json':
+        headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    if use_gzip:
+        chunks = _gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+
+    return Response(stream_with_context(chunks), mimetype=FORMATS[fmt], headers=headers)
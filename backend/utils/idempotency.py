@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+
+
+def idempotent(f):
+    """幂等键装饰器：相同用户重复提交相同 Idempotency-Key 时直接返回第一次的响应
+
+    需放在 token_required 之下，被装饰视图的第一个参数为 payload。
+    超过 IDEMPOTENCY_KEY_TTL 的键视为过期，同一个键会按新请求处理。
+    """
+    @wraps(f)
+    def decorated(payload, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key', '').strip()
+        if not key:
+            return f(payload, *args, **kwargs)
+        if len(key) > 64:
+            return jsonify({'code': 400, 'msg': 'Idempotency-Key 过长'}), 400
+
+        user_id = payload['user_id']
+        record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        if record and record.created_at < _expired_before(datetime.utcnow()):
+            # 过期的键（清扫之前）先删除再重新占用
+            IdempotencyKey.query.filter_by(id=record.id).delete()
+            db.session.commit()
+            record = None
+        if record:
+            if record.endpoint != request.path:
+                return jsonify({'code': 422, 'msg': 'Idempotency-Key 已用于其他请求'}), 422
+            if record.status_code is None:
+                return jsonify({'code': 409, 'msg': '请求正在处理中'}), 409
+            return current_app.response_class(
+                record.response_body, status=record.status_code, mimetype='application/json'
+            )
+
+        # 先占用幂等键，唯一约束保证并发的重复请求只有一个能继续
+        record = IdempotencyKey(user_id=user_id, key=key, endpoint=request.path)
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'code': 409, 'msg': '请求正在处理中'}), 409
+
+        try:
+            response = make_response(f(payload, *args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(id=record.id).delete()
+            db.session.commit()
+            raise
+
+        if response.status_code >= 500:
+            # 服务端错误不记录结果，允许客户端用同一个键重试
+            IdempotencyKey.query.filter_by(id=record.id).delete()
+        else:
+            IdempotencyKey.query.filter_by(id=record.id).update({
+                'status_code': response.status_code,
+                'response_body': response.get_data(as_text=True)
+            })
+        db.session.commit()
+        return response
+    return decorated
+
+
+def _expired_before(now, ttl=None):
+    if ttl is None:
+        ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+    return now - timedelta(seconds=ttl)
+
+
+def purge_idempotency_keys(now, ttl, batch_size):
+    """分批删除超过保留期的幂等键，返回删除条数"""
+    cutoff = _expired_before(now, ttl)
+    total = 0
+    while True:
+        ids = [row.id for row in db.session.query(IdempotencyKey.id)
+               .filter(IdempotencyKey.created_at < cutoff)
+               .order_by(IdempotencyKey.created_at).limit(batch_size)]
+        if not ids:
+            break
+        db.session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+    return total
@@ -0,0 +1,220 @@
+import glob
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from flask import current_app
+from werkzeug.security import safe_join
+
+# 封面变体：名称 -> 最大宽高；每个尺寸生成 WebP 和 JPEG（兼容不支持 WebP 的浏览器）两种编码
+COVER_VARIANTS = {
+    'thumb': (160, 240),
+    'medium': (400, 600)
+}
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+_pool_lock = threading.Lock()
+
+
+def variant_path(path, name, ext):
+    """原图路径/URL 对应的变体路径：covers/ab/<hash>.png -> covers/ab/<hash>_thumb.webp"""
+    stem = path.rsplit('.', 1)[0]
+    return f'{stem}_{name}.{ext}'
+
+
+def variant_urls(cover_url):
+    """封面各尺寸变体的 URL，供前端列表页按需选用"""
+    if not cover_url:
+        return None
+    return {
+        name: {ext: variant_path(cover_url, name, ext) for ext in VARIANT_FORMATS}
+        for name in COVER_VARIANTS
+    }
+
+
+def _pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None, None
+    return Image, ImageOps
+
+
+def _write_atomic(path, write):
+    """先写临时文件再改名，其他请求不会读到写了一半的图片"""
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def generate_variants(original_path):
+    """为原图生成全部尺寸变体（已存在的跳过），返回生成的文件数；未安装 Pillow 时返回 0"""
+    Image, ImageOps = _pillow()
+    if Image is None:
+        return 0
+
+    created = 0
+    with Image.open(original_path) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for name, size in COVER_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)  # 等比缩小，不放大
+            for ext, fmt in VARIANT_FORMATS.items():
+                target = variant_path(original_path, name, ext)
+                if os.path.exists(target):
+                    continue
+                output = resized
+                if fmt == 'JPEG' and has_alpha:
+                    # JPEG 不支持透明通道，铺白底
+                    output = Image.new('RGB', resized.size, 'white')
+                    output.paste(resized, mask=resized.getchannel('A'))
+                options = {'quality': 80, 'method': 4} if fmt == 'WEBP' else {
+                    'quality': 82, 'optimize': True, 'progressive': True
+                }
+                _write_atomic(target, lambda tmp: output.save(tmp, fmt, **options))
+                created += 1
+    return created
+
+
+def _generate_safely(original_path):
+    try:
+        generate_variants(original_path)
+    except Exception as e:
+        print(f"✗ 生成封面缩略图失败({original_path}): {e}")
+
+
+def get_image_pool():
+    """返回当前应用的图片处理线程池（Pillow 缩放和编码时会释放 GIL）"""
+    app = current_app._get_current_object()
+    pool = app.extensions.get('image_pool')
+    if pool is not None:
+        return pool
+
+    with _pool_lock:
+        pool = app.extensions.get('image_pool')
+        if pool is None:
+            pool = ThreadPoolExecutor(
+                max_workers=app.config.get('COVER_WORKERS', 2),
+                thread_name_prefix='cover-worker'
+            )
+            app.extensions['image_pool'] = pool
+    return pool
+
+
+def save_cover(file):
+    """保存上传的封面，返回 (url, 错误信息)
+
+    文件按内容的 SHA-256 存放（covers/<前两位>/<哈希>.<扩展名>），相同封面只存一份；
+    缩略图在后台线程池中生成，不占用请求线程。
+    """
+    if not file or file.filename == '' or '.' not in file.filename:
+        return None, '没有选择文件'
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    if ext not in allowed:
+        return None, f'不支持的文件格式。允许的格式：{", ".join(allowed)}'
+    if ext == 'jpeg':
+        ext = 'jpg'
+
+    try:
+        data = file.read()
+        Image, _ = _pillow()
+        if Image is not None:
+            # 校验确实是图片，防止伪造扩展名
+            try:
+                with Image.open(BytesIO(data)) as image:
+                    image.verify()
+            except Exception:
+                return None, '文件不是有效的图片'
+
+        digest = hashlib.sha256(data).hexdigest()
+        relative = f'covers/{digest[:2]}/{digest}.{ext}'
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            def write(tmp):
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+            _write_atomic(path, write)
+
+        if current_app.config.get('COVER_ASYNC', True):
+            get_image_pool().submit(_generate_safely, path)
+        else:
+            _generate_safely(path)
+
+        return f"{current_app.config['UPLOAD_URL_PREFIX']}/{relative}", None
+    except Exception as e:
+        return None, f'文件上传失败: {str(e)}'
+
+
+def _is_variant(path):
+    stem, _, ext = path.rpartition('.')
+    return ext in VARIANT_FORMATS and any(stem.endswith(f'_{name}') for name in COVER_VARIANTS)
+
+
+def variant_fallback(filename):
+    """请求的变体文件不存在时（后台尚未生成完，或是旧封面）对应的原图相对路径，不是变体或原图不存在时返回 None
+
+    请求中不做图片解码和缩放，缺失的变体由上传时的后台任务或 flask --app app generate-covers 补齐。
+    """
+    stem, _, ext = filename.rpartition('.')
+    for name in COVER_VARIANTS:
+        suffix = f'_{name}'
+        if ext in VARIANT_FORMATS and stem.endswith(suffix):
+            original_stem = stem[:-len(suffix)]
+            break
+    else:
+        return None
+
+    folder = current_app.config['UPLOAD_FOLDER']
+    base = safe_join(folder, original_stem)
+    if base is None:
+        return None
+    candidates = [p for p in glob.glob(glob.escape(base) + '.*')
+                  if p.rsplit('.', 1)[1] in current_app.config['ALLOWED_EXTENSIONS']]
+    if not candidates:
+        return None
+    return os.path.relpath(candidates[0], folder).replace(os.sep, '/')
+
+
+def generate_missing_variants(log=print):
+    """为上传目录中所有封面补齐缺失的变体，返回 {'covers': 原图数, 'created': 生成数, 'failed': 失败数}"""
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'covers')
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    result = {'covers': 0, 'created': 0, 'failed': 0}
+    for root, _, files in os.walk(folder):
+        for filename in sorted(files):
+            if filename.rsplit('.', 1)[-1].lower() not in allowed or _is_variant(filename):
+                continue
+            path = os.path.join(root, filename)
+            result['covers'] += 1
+            try:
+                result['created'] += generate_variants(path)
+            except Exception as e:
+                result['failed'] += 1
+                log(f"✗ {os.path.relpath(path, folder)}: {e}")
+    return result
+
+
+def delete_cover(cover_url):
+    """删除封面原图及其全部变体（调用方需确认没有其他图书引用同一封面）"""
+    if not cover_url:
+        return
+    prefix = current_app.config['UPLOAD_URL_PREFIX']
+    relative = cover_url.replace(prefix, '', 1).lstrip('/')
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative)
+    paths = [path] + [variant_path(path, name, ext) for name in COVER_VARIANTS for ext in VARIANT_FORMATS]
+    for p in paths:
+        try:
+            if os.path.exists(p):
+                os.remove(p)
+        except OSError as e:
+            print(f"删除文件失败: {e}")
@@ -0,0 +1,91 @@
+import random
+import time
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+from models import db, Book, BorrowRecord
+
+# MySQL: 1213 死锁，1205 锁等待超时
+RETRYABLE_MYSQL_ERRORS = {1205, 1213}
+
+
+class InventoryError(Exception):
+    """库存操作失败（库存不足、状态不符等），message 可直接返回给前端"""
+
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def is_retryable(error):
+    """判断数据库错误是否可以通过重试事务解决"""
+    orig = getattr(error, 'orig', None)
+    args = getattr(orig, 'args', ())
+    if args and args[0] in RETRYABLE_MYSQL_ERRORS:
+        return True
+    # SQLite 写锁竞争
+    return 'database is locked' in str(orig)
+
+
+def run_in_transaction(work, retries=3, backoff=0.02):
+    """执行 work 并提交；遇到死锁/锁超时时回滚后指数退避重试"""
+    for attempt in range(retries + 1):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt >= retries or not is_retryable(e):
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def take_copy(book_id, held=False):
+    """原子地扣减一本库存：UPDATE ... WHERE stock > 0，不会超借
+
+    在 MySQL 上该语句同时锁住图书行直到事务结束，同一本书的借阅请求因此串行化。
+    held=True 表示借走的是预约保留的副本（保留时已扣过库存），只累加借阅次数。
+    """
+    if held:
+        db.session.execute(
+            update(Book)
+            .where(Book.id == book_id)
+            .values(borrowed_count=Book.borrowed_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.stock > 0)
+        .values(stock=Book.stock - 1, borrowed_count=Book.borrowed_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise InventoryError('图书库存不足')
+
+
+def return_copy(book_id):
+    """归还一本库存（不超过总库存）"""
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.stock < Book.total)
+        .values(stock=Book.stock + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def close_borrow_record(record_id, return_time):
+    """把借阅记录从 借阅中/逾期 原子地改为 已归还，防止重复归还"""
+    result = db.session.execute(
+        update(BorrowRecord)
+        .where(BorrowRecord.id == record_id, BorrowRecord.status.in_(['borrowed', 'overdue']))
+        .values(status='returned', return_time=return_time)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise InventoryError('该图书已归还')
@@ -0,0 +1,66 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """orjson 序列化（比标准库 json 快数倍）
+
+    orjson 不能直接处理的类型（date/datetime、Decimal 等）交给 Flask 默认规则，
+    输出与 DefaultJSONProvider 一致（键排序、日期格式），只是中文不再转义为 \\uXXXX。
+    调用方传入 json.dumps 参数或遇到 orjson 不支持的数据（如超过 64 位的整数）时退回标准库。
+    """
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumps_bytes(self, obj, indent=False):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(indent))
+        except TypeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            data = self._dumps_bytes(obj)
+            if data is not None:
+                return data.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        data = self._dumps_bytes(obj, indent)
+        if data is None:
+            return super().response(obj)
+        # 与 DefaultJSONProvider 一样以换行结尾
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    """按 JSON_PROVIDER 配置选择 JSON 序列化实现：auto（装了 orjson 就用）/ orjson / stdlib
+
+    需在 init_metrics 之前调用，序列化计时包装的是这里选定的实现。
+    """
+    name = app.config.get('JSON_PROVIDER', 'auto')
+    if name == 'stdlib':
+        return app.json
+    if orjson is None:
+        if name == 'orjson':
+            print("⚠ 未安装 orjson，JSON 序列化使用标准库: pip install orjson")
+        return app.json
+    app.json = OrjsonProvider(app)
+    return app.json
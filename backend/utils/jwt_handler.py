@@ -1,8 +1,120 @@
 import jwt
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from flask import request, jsonify, current_app
 from datetime import datetime, timedelta,timezone
 
+
+class TokenCache:
+    """已验证 token 的有界 LRU 缓存：token 哈希 -> payload，过期的条目不会命中"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._revoked = {}  # token 哈希 -> exp，本进程的吊销列表
+        self._lock = threading.Lock()
+
+    def get(self, token_hash):
+        with self._lock:
+            payload = self._data.get(token_hash)
+            if payload is None:
+                return None
+            if payload.get('exp', 0) <= time.time():
+                del self._data[token_hash]
+                return None
+            self._data.move_to_end(token_hash)
+            return payload
+
+    def set(self, token_hash, payload):
+        with self._lock:
+            self._data[token_hash] = payload
+            self._data.move_to_end(token_hash)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def revoke(self, token_hash, exp):
+        with self._lock:
+            self._data.pop(token_hash, None)
+            self._revoked[token_hash] = exp
+            # 顺便清理已经自然过期的吊销记录
+            if len(self._revoked) > self.max_entries:
+                now = time.time()
+                self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+
+    def is_revoked(self, token_hash):
+        with self._lock:
+            return token_hash in self._revoked
+
+
+class RedisAuthStore:
+    """用户状态和 token 吊销列表存放在 Redis，多 worker 共享（需要安装 redis）
+
+    与目录缓存分开：吊销记录按 token 剩余有效期过期，不参与 LRU 淘汰。
+    """
+
+    def __init__(self, url, prefix='library:auth:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('AUTH_STORE=redis 需要安装 redis 包: pip install redis')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_state(self, user_id):
+        value = self._client.get(f'{self.prefix}user:{user_id}')
+        return json.loads(value) if value is not None else None
+
+    def set_state(self, user_id, state, ttl):
+        self._client.set(f'{self.prefix}user:{user_id}', json.dumps(state), ex=ttl or None)
+
+    def delete_state(self, user_id):
+        self._client.delete(f'{self.prefix}user:{user_id}')
+
+    def revoke(self, token_hash, ttl):
+        self._client.set(f'{self.prefix}revoked:{token_hash}', 1, ex=ttl)
+
+    def is_revoked(self, token_hash):
+        return bool(self._client.exists(f'{self.prefix}revoked:{token_hash}'))
+
+
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """返回当前应用的 token 缓存"""
+    app = current_app._get_current_object()
+    token_cache = app.extensions.get('token_cache')
+    if token_cache is None:
+        with _token_cache_lock:
+            token_cache = app.extensions.get('token_cache')
+            if token_cache is None:
+                token_cache = TokenCache(app.config.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+                app.extensions['token_cache'] = token_cache
+    return token_cache
+
+
+def get_auth_store():
+    """AUTH_STORE=redis 时返回共享的认证状态存储；memory 返回 None（用户状态每次查库，吊销列表在 TokenCache 中）"""
+    app = current_app._get_current_object()
+    if app.config.get('AUTH_STORE', 'memory') != 'redis':
+        return None
+    store = app.extensions.get('auth_store')
+    if store is None:
+        with _token_cache_lock:
+            store = app.extensions.get('auth_store')
+            if store is None:
+                store = RedisAuthStore(app.config['AUTH_REDIS_URL'])
+                app.extensions['auth_store'] = store
+    return store
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
 def create_token(user_id, role):
     """创建JWT token"""
     payload = {
@@ -31,6 +143,102 @@ def verify_token(token):
     except jwt.InvalidTokenError:
         return None
 
+def _stream_ticket_key():
+    # 与登录 token 使用不同的密钥，票据不能当作登录 token 使用，反之亦然
+    return hashlib.sha256(f"{current_app.config['JWT_SECRET_KEY']}:notification-stream".encode('utf-8')).digest()
+
+
+def create_stream_ticket(user_id):
+    """签发通知推送连接用的短期票据（EventSource 只能把凭证放在 URL 中，不使用登录 token）"""
+    now = datetime.now(timezone.utc)
+    payload = {
+        'user_id': user_id,
+        'purpose': 'notification_stream',
+        'exp': now + timedelta(seconds=current_app.config.get('NOTIFICATION_TICKET_TTL', 60)),
+        'iat': now
+    }
+    return jwt.encode(payload, _stream_ticket_key(), algorithm='HS256')
+
+
+def authenticate_stream_ticket(ticket):
+    """校验推送票据，返回 (payload, 错误响应)"""
+    try:
+        payload = jwt.decode(ticket, _stream_ticket_key(), algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        payload = None
+    if not payload or payload.get('purpose') != 'notification_stream':
+        return None, (jsonify({'code': 401, 'msg': '票据过期或无效'}), 401)
+
+    state = get_user_auth_state(payload['user_id'])
+    if state is None:
+        return None, (jsonify({'code': 401, 'msg': '用户不存在'}), 401)
+    if state['status'] == 'frozen':
+        return None, (jsonify({'code': 403, 'msg': '账户已被冻结'}), 403)
+    return payload, None
+
+
+def revoke_token(token, payload):
+    """吊销 token（退出登录）；AUTH_STORE=redis 时同时写入共享存储，使其他 worker 也能拒绝该 token"""
+    token_hash = hash_token(token)
+    exp = payload.get('exp', 0)
+    get_token_cache().revoke(token_hash, exp)
+    store = get_auth_store()
+    if store is not None:
+        store.revoke(token_hash, max(int(exp - time.time()), 1))
+
+
+def is_token_revoked(token_hash):
+    if get_token_cache().is_revoked(token_hash):
+        return True
+    store = get_auth_store()
+    return store is not None and store.is_revoked(token_hash)
+
+
+def get_user_auth_state(user_id):
+    """查询用户状态与角色；共享存储中缓存 AUTH_STATUS_TTL 秒，没有共享存储时每次查库；用户不存在返回 None"""
+    store = get_auth_store()
+    state = store.get_state(user_id) if store is not None else None
+    if state is None:
+        from models import db, User
+
+        row = db.session.query(User.status, User.role).filter(User.id == user_id).first()
+        state = {'status': row.status, 'role': row.role} if row else {'status': None, 'role': None}
+        if store is not None:
+            store.set_state(user_id, state, current_app.config.get('AUTH_STATUS_TTL', 300))
+    return state if state['status'] else None
+
+
+def invalidate_user_auth_state(user_id):
+    """用户状态/角色变化（冻结、解冻等）后调用，下一次请求立即生效"""
+    store = get_auth_store()
+    if store is not None:
+        store.delete_state(user_id)
+
+
+def authenticate(token):
+    """校验 token，返回 (payload, 错误响应)；已验证过的 token 直接命中缓存"""
+    token_hash = hash_token(token)
+    if is_token_revoked(token_hash):
+        return None, (jsonify({'code': 401, 'msg': 'token已失效'}), 401)
+
+    token_cache = get_token_cache()
+    payload = token_cache.get(token_hash)
+    if payload is None:
+        payload = verify_token(token)
+        if not payload:
+            return None, (jsonify({'code': 401, 'msg': 'token过期或无效'}), 401)
+        token_cache.set(token_hash, payload)
+
+    state = get_user_auth_state(payload['user_id'])
+    if state is None:
+        return None, (jsonify({'code': 401, 'msg': '用户不存在'}), 401)
+    if state['status'] == 'frozen':
+        return None, (jsonify({'code': 403, 'msg': '账户已被冻结'}), 403)
+
+    # 以数据库中的当前角色为准，降权立即生效
+    return dict(payload, role=state['role']), None
+
+
 def token_required(f):
     """JWT认证装饰器"""
     @wraps(f)
@@ -46,9 +254,9 @@ def token_required(f):
         if not token:
             return jsonify({'code': 401, 'msg': '缺少token'}), 401
         
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({'code': 401, 'msg': 'token过期或无效'}), 401
+        payload, error = authenticate(token)
+        if error:
+            return error
         
         return f(payload, *args, **kwargs)
     
@@ -0,0 +1,234 @@
+import hmac
+import os
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from flask import g, request, current_app, has_app_context, has_request_context, Response, jsonify
+from flask.json.provider import JSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 请求耗时分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 每个请求的 SQL 条数分桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class Histogram:
+    """固定分桶直方图（Prometheus 语义：桶计数在导出时累加）"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """进程内指标：按接口统计请求数、耗时直方图、SQL 条数和数据库耗时
+
+    多 worker 部署时每个进程各自统计，/metrics 返回的是处理该请求的进程的数据。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, method, status) -> 次数
+        self.latency = {}  # (endpoint, method) -> Histogram
+        self.query_counts = {}  # endpoint -> Histogram
+        self.db_seconds = {}  # endpoint -> 累计数据库耗时
+        self.slow_queries = 0
+
+    def observe_request(self, endpoint, method, status, duration, query_count, db_time):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get((endpoint, method))
+            if histogram is None:
+                histogram = self.latency[(endpoint, method)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(duration)
+            histogram = self.query_counts.get(endpoint)
+            if histogram is None:
+                histogram = self.query_counts[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+            histogram.observe(query_count)
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + db_time
+
+    def observe_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self):
+        """导出 Prometheus 文本格式（0.0.4）"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP http_requests_total 请求总数')
+            lines.append('# TYPE http_requests_total counter')
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {value}')
+
+            lines.append('# HELP http_request_duration_seconds 请求耗时')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                _render_histogram(lines, 'http_request_duration_seconds', histogram,
+                                  endpoint=endpoint, method=method)
+
+            lines.append('# HELP http_request_db_queries 每个请求执行的 SQL 条数')
+            lines.append('# TYPE http_request_db_queries histogram')
+            for endpoint, histogram in sorted(self.query_counts.items()):
+                _render_histogram(lines, 'http_request_db_queries', histogram, endpoint=endpoint)
+
+            lines.append('# HELP http_request_db_seconds_total 请求中数据库耗时累计')
+            lines.append('# TYPE http_request_db_seconds_total counter')
+            for endpoint, value in sorted(self.db_seconds.items()):
+                lines.append(f'http_request_db_seconds_total{_labels(endpoint=endpoint)} {value:.6f}')
+
+            lines.append('# HELP db_slow_queries_total 慢查询次数')
+            lines.append('# TYPE db_slow_queries_total counter')
+            lines.append(f'db_slow_queries_total {self.slow_queries}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _render_histogram(lines, name, histogram, **labels):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}')
+    lines.append(f'{name}_sum{_labels(**labels)} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
+
+
+def _call_site():
+    """发起查询的项目代码位置（跳过 SQLAlchemy 等第三方库和本模块的栈帧）"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(_PROJECT_ROOT) and filename != _THIS_FILE
+                and 'site-packages' not in filename):
+            return f'{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.lineno} in {frame.name}'
+    return '未知'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    if has_request_context():
+        g.db_time = g.get('db_time', 0.0) + duration
+
+    app = current_app._get_current_object() if has_app_context() else None
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD', 0.2) if app else 0.2
+    if threshold and duration >= threshold:
+        registry = app.extensions.get('metrics') if app else None
+        if registry is not None:
+            registry.observe_slow_query()
+        where = f'{request.method} {request.path} ' if has_request_context() else ''
+        print(f"⚠ 慢查询 {duration * 1000:.1f}ms {where}@ {_call_site()}\n    {' '.join(statement.split())[:1000]}")
+
+
+def _handle_error(context):
+    # 执行失败的语句不会触发 after_cursor_execute，丢弃它的开始时间
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+class TimedJSONProvider(JSONProvider):
+    """包装应用原有的 JSON 序列化，记录请求中序列化所用时间（用于 Server-Timing）"""
+
+    def __init__(self, app, inner):
+        super().__init__(app)
+        self.inner = inner
+
+    def _timed(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if has_request_context():
+                g.serialize_time = g.get('serialize_time', 0.0) + time.perf_counter() - start
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(self.inner.dumps, obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return self.inner.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        return self._timed(self.inner.response, *args, **kwargs)
+
+
+def init_metrics(app):
+    """注册请求计时、SQL 计时监听器、Server-Timing 响应头和 /metrics 接口
+
+    SQL 条数沿用 init_query_budget 注册的计数（g.sql_query_count），每条语句只由一个监听器计数。
+    """
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    app.json = TimedJSONProvider(app, app.json)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        query_count = g.get('sql_query_count', 0)  # 由 query_budget 的监听器计数，这里只计时
+        db_time = g.get('db_time', 0.0)
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint != 'metrics':
+            registry.observe_request(endpoint, request.method, response.status_code,
+                                     duration, query_count, db_time)
+
+        if app.config.get('SERVER_TIMING', True):
+            serialize_time = g.get('serialize_time', 0.0)
+            compress_time = g.get('compress_time', 0.0)
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={db_time * 1000:.1f};desc="{query_count} queries"',
+                f'serialize;dur={serialize_time * 1000:.1f}',
+                f'compress;dur={compress_time * 1000:.1f}',
+                f'app;dur={(duration - db_time - serialize_time - compress_time) * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}'
+            ])
+        return response
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if not token and app.config.get('METRICS_REQUIRE_TOKEN'):
+            # 生产环境未配置令牌时不对外暴露各接口的耗时与 SQL 统计
+            return jsonify({'code': 404, 'msg': '资源不存在'}), 404
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'code': 401, 'msg': '无权访问'}), 401
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return registry
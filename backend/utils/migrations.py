@@ -0,0 +1,229 @@
+import importlib.util
+import os
+from sqlalchemy import MetaData, Table, Column, String, Index, inspect, text
+
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations', 'versions')
+
+# 记录当前结构版本的表（与 Alembic 的 alembic_version 相同，只有一行）
+version_table = Table('schema_version', MetaData(), Column('version_num', String(32), primary_key=True))
+
+
+class Migration:
+    """一个版本：migrations/versions 下的模块，声明 revision、down_revision、upgrade(op)、downgrade(op)"""
+
+    def __init__(self, module):
+        self.revision = module.revision
+        self.down_revision = module.down_revision
+        self.description = (module.__doc__ or '').strip().splitlines()[0] if module.__doc__ else ''
+        self.upgrade = module.upgrade
+        self.downgrade = module.downgrade
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """按 down_revision 链排序返回全部版本，链断开或有分叉时抛出 RuntimeError"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.py') or filename.startswith('_'):
+            continue
+        spec = importlib.util.spec_from_file_location(f'migrations.versions.{filename[:-3]}',
+                                                      os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migration = Migration(module)
+        if migration.revision in migrations:
+            raise RuntimeError(f'重复的迁移版本: {migration.revision}')
+        migrations[migration.revision] = migration
+
+    children = {}
+    for migration in migrations.values():
+        if migration.down_revision in children:
+            raise RuntimeError(f'迁移版本 {migration.down_revision} 有多个后继，请合并')
+        children[migration.down_revision] = migration
+    ordered = []
+    current = children.get(None)
+    while current is not None:
+        ordered.append(current)
+        current = children.get(current.revision)
+    if len(ordered) != len(migrations):
+        raise RuntimeError('迁移版本链不完整，请检查 down_revision')
+    return ordered
+
+
+class Operations:
+    """迁移中可用的结构操作；都先检查当前结构，已是目标状态时跳过，
+    因此对 create_all 新建的库或按 database.sql 建的库重复执行也是安全的"""
+
+    def __init__(self, connection, log=print):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.log = log
+
+    def _inspector(self):
+        # 每次重新获取，DDL 之后的结构不会读到缓存
+        return inspect(self.connection)
+
+    def has_table(self, table):
+        return self._inspector().has_table(table)
+
+    def has_column(self, table, column):
+        return any(c['name'] == column for c in self._inspector().get_columns(table))
+
+    def has_index(self, table, name):
+        inspector = self._inspector()
+        names = {index['name'] for index in inspector.get_indexes(table)}
+        names.update(constraint['name'] for constraint in inspector.get_unique_constraints(table))
+        return name in names
+
+    def execute(self, sql, **params):
+        return self.connection.execute(text(sql), params)
+
+    def create_table(self, table):
+        """table 为迁移中声明的 sqlalchemy.Table（不引用 models.py，模型以后的改动不影响旧版本）"""
+        if not self.has_table(table.name):
+            table.create(self.connection)
+            self.log(f'  创建表 {table.name}')
+
+    def drop_table(self, table):
+        if self.has_table(table):
+            self.execute(f'DROP TABLE {self._quote(table)}')
+            self.log(f'  删除表 {table}')
+
+    def add_column(self, table, column):
+        """column 为 sqlalchemy.Column，按当前方言生成列定义"""
+        if self.has_column(table, column.name):
+            return
+        from sqlalchemy.schema import CreateColumn
+        ddl = CreateColumn(column).compile(dialect=self.connection.dialect)
+        self.execute(f'ALTER TABLE {self._quote(table)} ADD COLUMN {ddl}')
+        self.log(f'  添加列 {table}.{column.name}')
+
+    def drop_column(self, table, column):
+        if self.has_column(table, column):
+            self.execute(f'ALTER TABLE {self._quote(table)} DROP COLUMN {self._quote(column)}')
+            self.log(f'  删除列 {table}.{column}')
+
+    def create_index(self, name, table, columns, unique=False):
+        if self.has_index(table, name):
+            return
+        reflected = Table(table, MetaData(), autoload_with=self.connection)
+        Index(name, *[reflected.c[column] for column in columns], unique=unique).create(self.connection)
+        self.log(f"  创建索引 {table}.{name} ({', '.join(columns)})")
+
+    def drop_index(self, name, table):
+        if not self.has_index(table, name):
+            return
+        if self.dialect == 'mysql':
+            self.execute(f'DROP INDEX {self._quote(name)} ON {self._quote(table)}')
+        else:
+            self.execute(f'DROP INDEX {self._quote(name)}')
+        self.log(f'  删除索引 {table}.{name}')
+
+    def rename_index(self, table, old, new, columns):
+        """索引改名；MySQL 只改元数据，其他数据库按新名称重建"""
+        if self.has_index(table, new):
+            return
+        if not self.has_index(table, old):
+            self.create_index(new, table, columns)
+        elif self.dialect == 'mysql':
+            self.execute(f'ALTER TABLE {self._quote(table)} RENAME INDEX {self._quote(old)} TO {self._quote(new)}')
+            self.log(f'  索引改名 {table}.{old} -> {new}')
+        else:
+            self.create_index(new, table, columns)
+            self.drop_index(old, table)
+
+    def _quote(self, name):
+        return self.connection.dialect.identifier_preparer.quote(name)
+
+
+def current_revision(connection):
+    """数据库当前的结构版本，未记录时返回 None"""
+    if not inspect(connection).has_table(version_table.name):
+        return None
+    return connection.execute(version_table.select()).scalar()
+
+
+def _set_revision(connection, revision):
+    version_table.create(connection, checkfirst=True)
+    connection.execute(version_table.delete())
+    if revision is not None:
+        connection.execute(version_table.insert().values(version_num=revision))
+
+
+def stamp(revision='head'):
+    """只记录版本号、不执行迁移（用于 create_all 刚建好的新库）"""
+    migrations = load_migrations()
+    if revision == 'head':
+        revision = migrations[-1].revision if migrations else None
+    with db.engine.begin() as connection:
+        _set_revision(connection, revision)
+    return revision
+
+
+def _index_of(migrations, revision):
+    if revision in (None, 'base'):
+        return -1
+    if revision == 'head':
+        return len(migrations) - 1
+    for i, migration in enumerate(migrations):
+        if migration.revision == revision:
+            return i
+    raise RuntimeError(f'未知的迁移版本: {revision}')
+
+
+def pending_migrations():
+    migrations = load_migrations()
+    with db.engine.connect() as connection:
+        current = _index_of(migrations, current_revision(connection))
+    return migrations[current + 1:]
+
+
+def upgrade(target='head', log=print):
+    """依次执行到 target 的升级，每个版本单独提交并更新版本号，返回执行的版本列表"""
+    migrations = load_migrations()
+    with db.engine.connect() as connection:
+        start = _index_of(migrations, current_revision(connection))
+    end = _index_of(migrations, target)
+    applied = []
+    for migration in migrations[start + 1:end + 1]:
+        log(f'升级到 {migration.revision}: {migration.description}')
+        with db.engine.begin() as connection:
+            migration.upgrade(Operations(connection, log))
+            _set_revision(connection, migration.revision)
+        applied.append(migration.revision)
+    return applied
+
+
+def downgrade(target, log=print):
+    """依次回退到 target（'base' 表示回退全部），返回回退的版本列表"""
+    migrations = load_migrations()
+    with db.engine.connect() as connection:
+        start = _index_of(migrations, current_revision(connection))
+    end = _index_of(migrations, target)
+    reverted = []
+    for i in range(start, end, -1):
+        migration = migrations[i]
+        log(f'回退 {migration.revision}: {migration.description}')
+        with db.engine.begin() as connection:
+            migration.downgrade(Operations(connection, log))
+            _set_revision(connection, migration.down_revision)
+        reverted.append(migration.revision)
+    return reverted
+
+
+def create_schema(log=print):
+    """启动时建表：新建的库（之前没有任何业务表）直接记为最新版本，已有的库提示待执行的迁移"""
+    fresh = not inspect(db.engine).has_table('book')
+    db.create_all()
+    if fresh:
+        # MySQL 全文检索索引无法用模型声明，新库在这里补建
+        from utils.search import create_fulltext_index
+        with db.engine.begin() as connection:
+            create_fulltext_index(connection)
+        stamp('head')
+        return
+    pending = pending_migrations()
+    if pending:
+        log(f"⚠ 数据库结构有 {len(pending)} 个待执行的迁移（{', '.join(m.revision for m in pending)}），"
+            f"请在 backend 目录下执行: flask --app app db-upgrade")
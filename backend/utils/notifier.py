@@ -0,0 +1,215 @@
+import json
+import queue
+import threading
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Notification
+from utils.cache import get_cache
+
+_broker_lock = threading.Lock()
+_PENDING_KEY = 'pending_notifications'
+
+
+class MemoryBroker:
+    """进程内发布/订阅，单进程部署使用
+
+    每个推送连接对应一个有界队列；客户端读取过慢、队列已满时丢弃新消息（客户端可按未读数刷新）。
+    max_connections 限制本进程同时保持的推送连接数（每个连接占用一个工作线程）。
+    """
+
+    def __init__(self, queue_size=100, max_connections=None):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self._subscribers = {}  # user_id -> {queue, ...}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """订阅用户的通知，返回消息队列；连接数已达上限时返回 None"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_connections and self._count() >= self.max_connections:
+                return None
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def close(self):
+        """结束本进程的全部推送连接（worker 退出前调用，浏览器会按 retry 自动重连到其他 worker）"""
+        with self._lock:
+            queues = [q for user_queues in self._subscribers.values() for q in user_queues]
+        for q in queues:
+            # 队列已满时丢掉积压的消息，保证结束标记能送达
+            for _ in range(2):
+                try:
+                    q.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def connection_count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, user_id, message):
+        self._deliver(user_id, message)
+
+    def _deliver(self, user_id, message):
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                pass
+
+
+class RedisBroker(MemoryBroker):
+    """通过 Redis 频道在多个 worker 之间转发，每个 worker 再投递给本进程内的连接（需要安装 redis）"""
+
+    def __init__(self, url, channel='library:notifications', queue_size=100, max_connections=None):
+        super().__init__(queue_size, max_connections)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('NOTIFICATION_BROKER=redis 需要安装 redis 包: pip install redis')
+        self._client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._listener = None
+
+    def subscribe(self, user_id):
+        # 本进程第一次有连接时才开始监听频道
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name='notification-listener', daemon=True)
+                    self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, message):
+        self._client.publish(self.channel, json.dumps({'user_id': user_id, 'message': message}, default=str))
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for item in pubsub.listen():
+            try:
+                data = json.loads(item['data'])
+                self._deliver(data['user_id'], data['message'])
+            except Exception as e:
+                print(f"✗ 通知转发失败: {e}")
+
+
+def get_broker():
+    """返回当前应用配置的通知代理"""
+    app = current_app._get_current_object()
+    broker = app.extensions.get('notification_broker')
+    if broker is not None:
+        return broker
+
+    with _broker_lock:
+        broker = app.extensions.get('notification_broker')
+        if broker is None:
+            queue_size = app.config.get('NOTIFICATION_QUEUE_SIZE', 100)
+            max_connections = app.config.get('NOTIFICATION_MAX_STREAMS')
+            if app.config.get('NOTIFICATION_BROKER', 'memory') == 'redis':
+                broker = RedisBroker(app.config['NOTIFICATION_REDIS_URL'], queue_size=queue_size,
+                                     max_connections=max_connections)
+            else:
+                broker = MemoryBroker(queue_size, max_connections)
+            app.extensions['notification_broker'] = broker
+    return broker
+
+
+def _unread_key(user_id):
+    return f'notification_unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    """未读通知数，走 (user_id, is_read) 索引计数并缓存"""
+    cache = get_cache()
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
+        cache.set(_unread_key(user_id), count, current_app.config.get('NOTIFICATION_UNREAD_TTL', 300))
+    return count
+
+
+def invalidate_unread_count(user_id):
+    get_cache().delete(_unread_key(user_id))
+
+
+def _message(entry):
+    created_at = entry.get('created_at')
+    return {
+        'id': entry.get('id'),
+        'title': entry.get('title'),
+        'content': entry.get('content'),
+        'type': entry.get('type'),
+        'is_read': bool(entry.get('is_read')),
+        'created_at': created_at.isoformat() if isinstance(created_at, datetime) else created_at
+    }
+
+
+def publish_notifications(entries):
+    """推送已提交的通知（entries 为带 user_id 的字典），同时让对应用户的未读数缓存失效
+
+    ORM 新增的 Notification 在事务提交后自动推送；批量 INSERT 写入的通知需在提交后手动调用。
+    """
+    broker = get_broker()
+    for user_id in {entry['user_id'] for entry in entries}:
+        invalidate_unread_count(user_id)
+    for entry in entries:
+        try:
+            broker.publish(entry['user_id'], _message(entry))
+        except Exception as e:
+            print(f"✗ 推送通知失败: {e}")
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_notifications(session, flush_context):
+    # 在 flush 时序列化：提交后对象会过期，再读取属性会触发查询
+    new = [obj for obj in session.new if isinstance(obj, Notification)]
+    if new:
+        session.info.setdefault(_PENDING_KEY, []).extend(
+            dict(obj.to_dict(), user_id=obj.user_id) for obj in new
+        )
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_notifications(session):
+    entries = session.info.pop(_PENDING_KEY, None)
+    if entries and has_app_context():
+        publish_notifications(entries)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_notifications(session, previous_transaction):
+    # 只在最外层事务回滚时丢弃，savepoint 回滚不影响
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def sse_event(event_name, data, event_id=None):
+    """格式化一条 Server-Sent Events 消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_name}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, default=str))
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,135 @@
+import signal
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import update, insert
+
+from models import db, BorrowRecord, Book, Notification
+from utils.reservation_queue import expire_holds
+from utils.idempotency import purge_idempotency_keys
+from utils.notifier import publish_notifications
+
+
+def _claim(query, batch_size):
+    """取一批待处理记录；MySQL 上用 FOR UPDATE SKIP LOCKED，多个进程同时清扫也不会重复处理"""
+    return query.order_by(BorrowRecord.due_time).limit(batch_size).with_for_update(
+        skip_locked=True, of=BorrowRecord
+    ).all()
+
+
+def mark_overdue(now, batch_size):
+    """把已到期仍未归还的记录批量标记为 overdue，并生成逾期通知，返回处理条数"""
+    total = 0
+    while True:
+        rows = _claim(
+            db.session.query(BorrowRecord.id, BorrowRecord.user_id, Book.title)
+            .join(Book, Book.id == BorrowRecord.book_id)
+            .filter(BorrowRecord.status == 'borrowed', BorrowRecord.due_time < now),
+            batch_size
+        )
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        db.session.execute(
+            update(BorrowRecord)
+            .where(BorrowRecord.id.in_(ids), BorrowRecord.status == 'borrowed')
+            .values(status='overdue')
+            .execution_options(synchronize_session=False)
+        )
+        notifications = [
+            {
+                'user_id': row.user_id,
+                'title': '图书逾期',
+                'content': f'您借阅的《{row.title}》已逾期，请尽快归还',
+                'type': 'overdue',
+                'is_read': False,
+                'created_at': now
+            }
+            for row in rows
+        ]
+        db.session.execute(insert(Notification), notifications)
+        db.session.commit()
+        publish_notifications(notifications)
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    return total
+
+
+def remind_due_soon(now, days, batch_size):
+    """给即将到期的借阅发送一次到期提醒（reminded_at 保证不重复提醒），返回处理条数"""
+    total = 0
+    deadline = now + timedelta(days=days)
+    while True:
+        rows = _claim(
+            db.session.query(BorrowRecord.id, BorrowRecord.user_id, BorrowRecord.due_time, Book.title)
+            .join(Book, Book.id == BorrowRecord.book_id)
+            .filter(
+                BorrowRecord.status == 'borrowed',
+                BorrowRecord.due_time >= now,
+                BorrowRecord.due_time < deadline,
+                BorrowRecord.reminded_at.is_(None)
+            ),
+            batch_size
+        )
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        db.session.execute(
+            update(BorrowRecord)
+            .where(BorrowRecord.id.in_(ids), BorrowRecord.reminded_at.is_(None))
+            .values(reminded_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        notifications = [
+            {
+                'user_id': row.user_id,
+                'title': '即将到期',
+                'content': f'您借阅的《{row.title}》将于{row.due_time.strftime("%Y-%m-%d")}到期，请按时归还或续借',
+                'type': 'overdue',
+                'is_read': False,
+                'created_at': now
+            }
+            for row in rows
+        ]
+        db.session.execute(insert(Notification), notifications)
+        db.session.commit()
+        publish_notifications(notifications)
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    return total
+
+
+def sweep_overdue(now=None, due_soon_days=3, batch_size=1000, idempotency_ttl=None):
+    """逾期清扫：可重复执行（幂等），适合每分钟运行一次；同时处理保留期已过的预约和过期的幂等键"""
+    now = now or datetime.utcnow()
+    overdue = mark_overdue(now, batch_size)
+    reminded = remind_due_soon(now, due_soon_days, batch_size) if due_soon_days else 0
+    expired_holds = expire_holds(now, batch_size)
+    expired_keys = purge_idempotency_keys(now, idempotency_ttl, batch_size) if idempotency_ttl else 0
+    return {'overdue': overdue, 'reminded': reminded, 'expired_holds': expired_holds, 'expired_keys': expired_keys}
+
+
+def run_overdue_sweeper(app, interval, log=print):
+    """每隔 interval 秒清扫一次，直到进程退出（由单独的 flask sweep-overdue --interval 进程执行）"""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while True:
+            try:
+                with app.app_context():
+                    result = sweep_overdue(
+                        due_soon_days=app.config.get('DUE_SOON_DAYS', 3),
+                        batch_size=app.config.get('OVERDUE_SWEEP_BATCH_SIZE', 1000),
+                        idempotency_ttl=app.config.get('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+                    )
+                    db.session.remove()
+                if any(result.values()):
+                    log(f"新增逾期 {result['overdue']} 条，发送到期提醒 {result['reminded']} 条，"
+                        f"过期预约保留 {result['expired_holds']} 条，清理幂等键 {result['expired_keys']} 条")
+            except Exception as e:
+                log(f"✗ 逾期清扫失败: {e}")
+            if stop.wait(interval):
+                break
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from decimal import Decimal
+from flask import request
+from sqlalchemy import and_, or_
+
+from utils.cache import get_cache
+
+
+def encode_cursor(values):
+    """把排序键的值编码为不透明的游标字符串"""
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            encoded.append({'dt': value.isoformat()})
+        elif isinstance(value, Decimal):
+            encoded.append(float(value))
+        else:
+            encoded.append(value)
+    raw = json.dumps(encoded, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError('无效的游标')
+    if not isinstance(values, list):
+        raise ValueError('无效的游标')
+    return [
+        datetime.fromisoformat(v['dt']) if isinstance(v, dict) and 'dt' in v else v
+        for v in values
+    ]
+
+
+def _after(order, values):
+    """构造“位于游标之后”的条件：(a, b) < (x, y) 展开为 a < x OR (a = x AND b < y)"""
+    clauses = []
+    for i, (expr, desc, _) in enumerate(order):
+        cmp = expr < values[i] if desc else expr > values[i]
+        clauses.append(and_(*[order[j][0] == values[j] for j in range(i)], cmp))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, order, per_page, cursor=None):
+    """游标分页
+
+    order 为 [(排序表达式, 是否降序, 取值函数), ...]，最后一项必须唯一（通常是主键）；
+    取值函数为 None 时按列名从结果行上读取。返回 (items, next_cursor)。
+    """
+    order = [(expr, desc, getter or (lambda row, key=expr.key: getattr(row, key)))
+             for expr, desc, getter in order]
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(order):
+            raise ValueError('无效的游标')
+        query = query.filter(_after(order, values))
+
+    query = query.order_by(*[expr.desc() if desc else expr.asc() for expr, desc, _ in order])
+    items = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getter(items[-1]) for _, _, getter in order])
+    return items, next_cursor
+
+
+def estimated_count(query, ttl=60):
+    """近似总数：精确 COUNT 的结果按查询条件缓存 ttl 秒"""
+    compiled = query.statement.compile()
+    key = 'count:' + hashlib.sha1(
+        (str(compiled) + repr(sorted(compiled.params.items()))).encode('utf-8')
+    ).hexdigest()
+    cache = get_cache()
+    total = cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, total, ttl)
+    return total
+
+
+def cursor_requested():
+    """请求中带有 cursor 参数（可为空，表示第一页）时使用游标分页"""
+    return 'cursor' in request.args
+
+
+def cursor_pagination(query, order, per_page):
+    """按请求参数执行游标分页，返回 (items, pagination)
+
+    total 参数：approx（默认，缓存的近似总数）/ exact / none
+    """
+    cursor = request.args.get('cursor', '', type=str)
+    total_mode = request.args.get('total', 'approx', type=str)
+
+    total = None
+    if total_mode == 'exact':
+        total = query.order_by(None).count()
+    elif total_mode != 'none':
+        total = estimated_count(query)
+
+    items, next_cursor = keyset_paginate(query, order, per_page, cursor or None)
+    pagination = {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'total': total,
+        'total_is_estimate': total_mode not in ('exact', 'none')
+    }
+    return items, pagination
@@ -0,0 +1,171 @@
+import re
+from datetime import date
+from sqlalchemy import event, func, inspect, text
+
+from models import db, Book, BorrowRecord, User
+from utils.cache import NullCache
+
+# 长连接推送，请求不会结束
+SKIP_ENDPOINTS = {'notification.stream_notifications'}
+
+# 除不带参数的请求外，还要审计的查询参数组合（覆盖各排序、过滤和游标分页分支）
+VARIANTS = {
+    'book.get_books': ['keyword=python', 'category_id=1', 'sort_by=borrowed_count', 'sort_by=avg_rating',
+                       'sort_by=weighted_rating', 'cursor=', 'cursor=&category_id=1'],
+    'comment.get_book_comments': ['cursor='],
+    'notification.get_notifications': ['is_read=0', 'cursor='],
+    'admin.get_users': ['cursor='],
+    'admin.get_logs': ['cursor='],
+    'admin.export_users': ['start_date={today}'],
+    'admin.export_borrow_records': ['start_date={today}', 'status=overdue&start_date={today}'],
+}
+
+# 导出接口不带日期时会导出全表，审计时只用带日期的组合
+DEFAULT_ARGS = {
+    'admin.export_users': 'start_date={today}',
+    'admin.export_borrow_records': 'start_date={today}',
+}
+
+
+def _sample_values():
+    """URL 参数的取值：评论最多的图书（详情、评论、相似图书的数据量最大）"""
+    book_id = db.session.query(Book.id).order_by(Book.rating_count.desc(), Book.id).limit(1).scalar()
+    return {'book_id': book_id or 1}
+
+
+def _tokens():
+    """管理员和借阅最多的读者的 token；数据库中没有对应用户时返回 None"""
+    from utils.jwt_handler import create_token
+
+    admin = User.query.filter_by(role='admin').order_by(User.id).first()
+    reader_id = db.session.query(BorrowRecord.user_id).group_by(BorrowRecord.user_id).order_by(
+        func.count(BorrowRecord.id).desc()
+    ).limit(1).scalar()
+    reader = db.session.get(User, reader_id) if reader_id else None
+    reader = reader or User.query.filter_by(role='reader').order_by(User.id).first()
+    return (
+        create_token(admin.id, admin.role) if admin else None,
+        create_token(reader.id, reader.role) if reader else None
+    )
+
+
+def audit_urls(app):
+    """[(endpoint, url, 是否管理员接口)]：全部 /api 下的 GET 接口及 VARIANTS 中的参数组合"""
+    samples = _sample_values()
+    today = date.today().isoformat()
+    urls = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or not rule.rule.startswith('/api/') or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        if any(arg not in samples for arg in rule.arguments):
+            continue
+        path = rule.build({arg: samples[arg] for arg in rule.arguments})[1]
+        admin = rule.rule.startswith('/api/admin/')
+        for query in [DEFAULT_ARGS.get(rule.endpoint, '')] + VARIANTS.get(rule.endpoint, []):
+            query = query.format(today=today)
+            urls.append((rule.endpoint, f'{path}?{query}' if query else path, admin))
+    return urls
+
+
+def explain(connection, statement, parameters):
+    """返回 (执行计划行, 问题列表)，问题为 (类型, 表名, 说明)；类型为 full_scan 或 sort"""
+    dialect = connection.dialect.name
+    issues = []
+    if dialect == 'mysql':
+        rows = [dict(row._mapping) for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        for row in rows:
+            extra = row.get('Extra') or ''
+            if row.get('type') == 'ALL':
+                issues.append(('full_scan', row.get('table'), f"type=ALL，约 {row.get('rows')} 行"))
+            if 'Using filesort' in extra or 'Using temporary' in extra:
+                issues.append(('sort', row.get('table'), extra))
+        plan = [f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} {row.get('Extra') or ''}"
+                for row in rows]
+    elif dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        plan = [row[3] for row in rows]
+        for detail in plan:
+            words = detail.split()
+            if words[0] == 'SCAN' and 'USING' not in detail and len(words) > 1:
+                issues.append(('full_scan', words[1], detail))
+            elif 'USE TEMP B-TREE' in detail:
+                issues.append(('sort', None, detail))
+    else:
+        raise RuntimeError(f'查询计划审计不支持 {dialect}')
+    return plan, issues
+
+
+def _table_rows(connection, table):
+    if connection.dialect.name == 'mysql':
+        rows = connection.execute(text(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t'
+        ), {'t': table}).scalar()
+    else:
+        rows = connection.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+    return rows or 0
+
+
+def _large_table(name, table_rows, min_rows):
+    """扫描的是否为大表；name 可能是 SQLAlchemy 生成的别名（book_1），子查询/常量行不计"""
+    if name not in table_rows:
+        name = re.sub(r'_\d+$', '', name or '')
+    return table_rows.get(name, 0) >= min_rows
+
+
+def audit_queries(app, min_rows=1000):
+    """用 test client 请求每个 GET 接口，记录其执行的 SELECT 并逐条 EXPLAIN
+
+    少于 min_rows 行的表（如分类表）全表扫描不算问题。返回每个请求的结果：
+    {'endpoint', 'url', 'status', 'queries': [{'sql', 'plan', 'issues'}]}
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() == 'SELECT':
+            captured.append((statement, parameters))
+
+    admin_token, reader_token = _tokens()
+    urls = audit_urls(app)
+    # 绕过接口缓存，每次请求都真正执行查询
+    cache = app.extensions.get('cache')
+    app.extensions['cache'] = NullCache()
+    client = app.test_client()
+    results = []
+    engine = db.engine
+    try:
+        for endpoint, url, admin in urls:
+            token = admin_token if admin else reader_token
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            captured.clear()
+            event.listen(engine, 'before_cursor_execute', capture)
+            try:
+                # 每个请求使用新的应用上下文，SQL 计数等按请求统计（命令本身已在应用上下文中）
+                with app.app_context():
+                    response = client.get(url, headers=headers)
+                    response.get_data()
+            finally:
+                event.remove(engine, 'before_cursor_execute', capture)
+            statements = {}
+            for statement, parameters in captured:
+                statements.setdefault(statement, parameters)
+            results.append({'endpoint': endpoint, 'url': url, 'status': response.status_code,
+                            'statements': list(statements.items())})
+    finally:
+        if cache is None:
+            app.extensions.pop('cache', None)
+        else:
+            app.extensions['cache'] = cache
+
+    table_rows = {}
+    with engine.connect() as connection:
+        for table in inspect(connection).get_table_names():
+            table_rows[table] = _table_rows(connection, table)
+        for result in results:
+            queries = []
+            for statement, parameters in result.pop('statements'):
+                plan, issues = explain(connection, statement, parameters)
+                issues = [issue for issue in issues
+                          if issue[0] != 'full_scan' or _large_table(issue[1], table_rows, min_rows)]
+                queries.append({'sql': ' '.join(statement.split()), 'plan': plan, 'issues': issues})
+            result['queries'] = queries
+    return results
@@ -0,0 +1,44 @@
+from functools import wraps
+from flask import g, current_app, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """单个请求执行的SQL数量超出预算"""
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+
+
+def query_budget(limit):
+    """为单个视图声明SQL查询预算（覆盖全局 QUERY_BUDGET），None 表示该视图不检查
+
+    写接口在事务中要更新库存、统计、通知等多张表，按各自最坏情况单独声明，全局预算针对读接口。
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            g.query_budget = limit
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def init_query_budget(app):
+    """注册SQL计数监听器，并在请求结束时检查查询预算"""
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    @app.after_request
+    def check_query_budget(response):
+        budget = g.query_budget if 'query_budget' in g else current_app.config.get('QUERY_BUDGET')
+        count = g.get('sql_query_count', 0)
+        if budget and count > budget:
+            msg = f'{request.method} {request.path} 执行了 {count} 条SQL，超出预算 {budget}'
+            if current_app.config.get('QUERY_BUDGET_STRICT', current_app.testing):
+                raise QueryBudgetExceeded(msg)
+            print(f"⚠ {msg}")
+        return response
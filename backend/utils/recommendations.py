@@ -0,0 +1,203 @@
+import time
+from flask import current_app
+from sqlalchemy import func, select
+
+from models import db, Book, BookComment, BookSimilarity, BorrowRecord, RecommendationRun
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+# 流式读取借阅/评论时每批的行数
+FETCH_SIZE = 50000
+
+
+def _fetch_arrays(statement, dtypes):
+    """流式执行查询，按列返回 NumPy 数组（百万行借阅记录不会整体生成 Python 元组列表）"""
+    parts = [[] for _ in dtypes]
+    result = db.session.execute(statement.execution_options(yield_per=FETCH_SIZE))
+    for rows in result.partitions():
+        for i, column in enumerate(zip(*rows)):
+            parts[i].append(np.array(column, dtype=dtypes[i]))
+    return [np.concatenate(part) if part else np.array([], dtype=dtypes[i]) for i, part in enumerate(parts)]
+
+
+def load_interactions(rating_weight):
+    """读者 × 图书的交互矩阵 (CSR)，以及行/列对应的读者 id 和图书 id
+
+    借阅过记 1；评价过按 1 + (评分 - 3) * rating_weight 计，同时借阅并评价时以评分为准。
+    """
+    borrow_users, borrow_books = _fetch_arrays(
+        select(BorrowRecord.user_id, BorrowRecord.book_id).distinct(), (np.int64, np.int64)
+    )
+    rating_users, rating_books, ratings = _fetch_arrays(
+        select(BookComment.user_id, BookComment.book_id, BookComment.rating), (np.int64, np.int64, np.float64)
+    )
+
+    user_ids, user_index = np.unique(np.concatenate([borrow_users, rating_users]), return_inverse=True)
+    book_ids, book_index = np.unique(np.concatenate([borrow_books, rating_books]), return_inverse=True)
+    shape = (len(user_ids), len(book_ids))
+    n = len(borrow_users)
+
+    borrowed = sparse.csr_matrix((np.ones(n), (user_index[:n], book_index[:n])), shape=shape)
+    borrowed.data[:] = 1
+    rated = sparse.csr_matrix(
+        (np.maximum(1 + (ratings - 3) * rating_weight, 0.1), (user_index[n:], book_index[n:])), shape=shape
+    )
+    rated_mask = rated.copy()
+    rated_mask.data[:] = 1
+    matrix = (borrowed - borrowed.multiply(rated_mask) + rated).tocsr()
+    matrix.eliminate_zeros()
+    return matrix, user_ids, book_ids
+
+
+def top_k_neighbours(matrix, book_ids, targets, top_k, shrinkage, block_size):
+    """按批计算 targets（列下标）的前 K 个相似图书，逐本生成 (book_id, [(similar_id, score, co_readers), ...])
+
+    相似度为列向量的余弦相似度乘以 co/(co + shrinkage)，co 为共同读者数。
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    normalized = (matrix @ sparse.diags(1 / np.where(norms > 0, norms, 1))).tocsc()
+    binary = matrix.copy()
+    binary.data[:] = 1
+    binary = binary.tocsc()
+
+    for start in range(0, len(targets), block_size):
+        block = targets[start:start + block_size]
+        scores = (normalized[:, block].T @ normalized).tocsr()
+        co_readers = (binary[:, block].T @ binary).tocsr()
+        scores.sort_indices()
+        co_readers.sort_indices()
+        # 两个乘积的非零结构相同（权重都为正），可直接逐元素运算
+        scores.data *= co_readers.data / (co_readers.data + shrinkage)
+
+        for row, column in enumerate(block):
+            lo, hi = scores.indptr[row], scores.indptr[row + 1]
+            columns = scores.indices[lo:hi]
+            values = scores.data[lo:hi]
+            counts = co_readers.data[lo:hi]
+            keep = columns != column
+            columns, values, counts = columns[keep], values[keep], counts[keep]
+            if len(values) > top_k:
+                picked = np.argpartition(-values, top_k - 1)[:top_k]
+                columns, values, counts = columns[picked], values[picked], counts[picked]
+            order = np.argsort(-values, kind='stable')
+            yield int(book_ids[column]), [
+                (int(book_ids[columns[i]]), float(values[i]), int(counts[i])) for i in order
+            ]
+
+
+def _affected_columns(matrix, book_ids, borrow_watermark, comment_watermark):
+    """上次计算后有新借阅/评价的图书，以及与它们有共同读者的图书（相似度都会变化）的列下标"""
+    new_books = {book_id for (book_id,) in db.session.query(BorrowRecord.book_id).filter(
+        BorrowRecord.id > borrow_watermark
+    ).distinct()}
+    if comment_watermark is not None:
+        new_books.update(book_id for (book_id,) in db.session.query(BookComment.book_id).filter(
+            BookComment.updated_at > comment_watermark
+        ).distinct())
+    if not new_books:
+        return np.array([], dtype=np.int64)
+
+    columns = np.flatnonzero(np.isin(book_ids, list(new_books)))
+    readers = np.unique(matrix.tocsc()[:, columns].indices)
+    return np.unique(matrix[readers].indices)
+
+
+def refresh_similarities(full=False, log=print):
+    """离线计算图书相似度并写入 book_similarity
+
+    默认增量：只重算上次计算后有新借阅/评价的图书及与其有共同读者的图书；
+    没有计算记录或 full=True 时全量重建。评论删除无法增量感知，建议定期全量重建。
+    返回本次的 RecommendationRun。
+    """
+    if np is None:
+        raise RuntimeError('计算图书相似度需要 NumPy 和 SciPy: pip install numpy scipy')
+
+    config = current_app.config
+    started = time.perf_counter()
+    last = RecommendationRun.query.order_by(RecommendationRun.id.desc()).first()
+    full = full or last is None
+    # 先记录水位再读取数据，期间新增的借阅会在下一次增量中重复处理，不会遗漏
+    borrow_watermark = db.session.query(func.max(BorrowRecord.id)).scalar() or 0
+    comment_watermark = db.session.query(func.max(BookComment.updated_at)).scalar()
+
+    matrix, user_ids, book_ids = load_interactions(config.get('RECOMMEND_RATING_WEIGHT', 0.25))
+    log(f'交互矩阵: {len(user_ids)} 位读者 × {len(book_ids)} 本图书，{matrix.nnz} 条交互')
+
+    if full:
+        targets = np.arange(len(book_ids))
+        BookSimilarity.query.delete()
+    elif len(book_ids):
+        targets = _affected_columns(matrix, book_ids, last.borrow_watermark, last.comment_watermark)
+    else:
+        targets = np.array([], dtype=np.int64)
+    log(f"{'全量' if full else '增量'}计算 {len(targets)} 本图书的相似图书")
+
+    block_size = config.get('RECOMMEND_BLOCK_SIZE', 2000)
+    pending_ids, rows = [], []
+
+    def flush():
+        if pending_ids and not full:
+            BookSimilarity.query.filter(BookSimilarity.book_id.in_(pending_ids)).delete(synchronize_session=False)
+        if rows:
+            db.session.bulk_insert_mappings(BookSimilarity, rows)
+        db.session.commit()
+        pending_ids.clear()
+        rows.clear()
+
+    for book_id, neighbours in top_k_neighbours(
+        matrix, book_ids, targets,
+        top_k=config.get('RECOMMEND_TOP_K', 20),
+        shrinkage=config.get('RECOMMEND_SHRINKAGE', 5),
+        block_size=block_size
+    ):
+        pending_ids.append(book_id)
+        rows.extend({'book_id': book_id, 'similar_book_id': similar_id, 'score': score, 'co_readers': co}
+                    for similar_id, score, co in neighbours)
+        if len(pending_ids) >= block_size:
+            flush()
+    flush()
+
+    run = RecommendationRun(
+        full_refresh=full,
+        borrow_watermark=borrow_watermark,
+        comment_watermark=comment_watermark,
+        books_updated=len(targets),
+        duration=round(time.perf_counter() - started, 3)
+    )
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def similar_books(book_id, limit, options=()):
+    """从相似度表读取相似图书，返回 [(Book, score), ...]（一次按 idx_book_score 的查询）"""
+    return db.session.query(Book, BookSimilarity.score).options(*options).join(
+        BookSimilarity, BookSimilarity.similar_book_id == Book.id
+    ).filter(BookSimilarity.book_id == book_id).order_by(
+        BookSimilarity.score.desc()
+    ).limit(limit).all()
+
+
+def recommend_for_user(user_id, limit, history_size, options=()):
+    """按读者最近借阅图书的相似图书汇总打分，排除已借阅过的图书，返回 [(Book, score), ...]"""
+    recent = [book_id for (book_id,) in db.session.query(BorrowRecord.book_id).filter(
+        BorrowRecord.user_id == user_id
+    ).order_by(BorrowRecord.id.desc()).limit(history_size)]
+    if not recent:
+        return []
+
+    borrowed = db.session.query(BorrowRecord.book_id).filter(BorrowRecord.user_id == user_id)
+    scores = db.session.query(
+        BookSimilarity.similar_book_id.label('book_id'),
+        func.sum(BookSimilarity.score).label('score')
+    ).filter(
+        BookSimilarity.book_id.in_(set(recent)),
+        BookSimilarity.similar_book_id.notin_(borrowed)
+    ).group_by(BookSimilarity.similar_book_id).subquery()
+    return db.session.query(Book, scores.c.score).options(*options).join(
+        scores, scores.c.book_id == Book.id
+    ).order_by(scores.c.score.desc(), Book.id).limit(limit).all()
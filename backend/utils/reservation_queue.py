@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, func
+from sqlalchemy.orm import aliased
+
+from models import db, Book, Reservation, Notification
+from utils import stats
+from utils.cache import invalidate_book
+from utils.inventory import return_copy
+
+
+def next_queue_position(book_id):
+    """为图书分配下一个预约序号：对 book.reservation_seq 原子自增，并发请求不会拿到相同序号"""
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(reservation_seq=Book.reservation_seq + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.query(Book.reservation_seq).filter(Book.id == book_id).scalar()
+
+
+def queue_positions(reservation_ids):
+    """批量计算等待中预约的实时排位（前面还有多少人等待 + 1）
+
+    序号只增不减，取消的预约不需要压缩队列；排位通过 (book_id, status, queue_position) 索引计数得到。
+    """
+    if not reservation_ids:
+        return {}
+    other = aliased(Reservation)
+    rows = db.session.query(Reservation.id, func.count(other.id)).outerjoin(
+        other,
+        (other.book_id == Reservation.book_id)
+        & (other.status == 'waiting')
+        & (other.queue_position < Reservation.queue_position)
+    ).filter(
+        Reservation.id.in_(reservation_ids),
+        Reservation.status == 'waiting'
+    ).group_by(Reservation.id).all()
+    return {reservation_id: ahead + 1 for reservation_id, ahead in rows}
+
+
+def waiting_count(book_id):
+    return Reservation.query.filter_by(book_id=book_id, status='waiting').count()
+
+
+def _hold_days():
+    return current_app.config.get('RESERVATION_HOLD_DAYS', 3)
+
+
+def promote_next(book_id, now=None):
+    """把一本空出来的副本留给队首读者：队首预约改为 notified 并设置保留期限
+
+    返回被通知的预约；没有人排队时返回 None，由调用方把库存还回去。
+    调用方需已持有这本副本（即尚未计入可借库存）。
+    """
+    now = now or datetime.utcnow()
+    # 队首必须严格按序号：用普通 FOR UPDATE 等待并发的提升完成，SKIP LOCKED 会跳过被锁的队首去通知第二位
+    head = Reservation.query.filter_by(book_id=book_id, status='waiting').order_by(
+        Reservation.queue_position
+    ).with_for_update().first()
+    if head is None:
+        return None
+
+    head.status = 'notified'
+    head.hold_until = now + timedelta(days=_hold_days())
+    stats.bump_counter(stats.WAITING_RESERVATIONS, -1)
+
+    title = db.session.query(Book.title).filter(Book.id == book_id).scalar()
+    db.session.add(Notification(
+        user_id=head.user_id,
+        title='预约图书已到馆',
+        content=f'您预约的《{title}》已为您保留，请于{head.hold_until.strftime("%Y-%m-%d")}前借阅',
+        type='reservation'
+    ))
+    return head
+
+
+def release_copy(book_id, now=None):
+    """一本副本空出来（归还、保留过期或取消保留）：有人排队就转给队首，否则加回库存"""
+    if promote_next(book_id, now) is None:
+        return_copy(book_id)
+
+
+def claim_hold(user_id, book_id):
+    """读者借阅为其保留的副本：预约改为 finished，返回是否存在保留"""
+    result = db.session.execute(
+        update(Reservation)
+        .where(
+            Reservation.user_id == user_id,
+            Reservation.book_id == book_id,
+            Reservation.status == 'notified'
+        )
+        .values(status='finished')
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def expire_holds(now=None, batch_size=500):
+    """保留期已过但未借阅的预约改为 expired，并把副本转给下一位读者，返回处理条数"""
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        expired = Reservation.query.filter(
+            Reservation.status == 'notified',
+            Reservation.hold_until < now
+        ).order_by(Reservation.hold_until).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not expired:
+            break
+        book_ids = set()
+        for reservation in expired:
+            reservation.status = 'expired'
+            db.session.add(Notification(
+                user_id=reservation.user_id,
+                title='预约已过期',
+                content='您预约的图书保留期已过，预约已失效',
+                type='reservation'
+            ))
+            release_copy(reservation.book_id, now)
+            book_ids.add(reservation.book_id)
+        db.session.commit()
+        for book_id in book_ids:
+            invalidate_book(book_id)
+        total += len(expired)
+        if len(expired) < batch_size:
+            break
+    return total
@@ -0,0 +1,295 @@
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import text
+
+# 字段权重：书名命中比简介命中更重要
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'author': 2.0,
+    'publisher': 1.0,
+    'description': 0.5
+}
+
+# 最后一个英文/数字词按前缀匹配（边输入边搜索），最多扩展的索引词数及其相对权重
+MAX_PREFIX_TERMS = 100
+PREFIX_WEIGHT = 0.8
+
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_WORD_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+')
+
+
+def tokenize(text_value):
+    """分词：英文/数字按单词切分，中文按二元组（bigram）切分"""
+    if not text_value:
+        return []
+    tokens = []
+    for part in _WORD_RE.findall(text_value.lower()):
+        if _CJK_RE.fullmatch(part):
+            if len(part) == 1:
+                tokens.append(part)
+            else:
+                tokens.extend(part[i:i + 2] for i in range(len(part) - 1))
+        else:
+            tokens.append(part)
+    return tokens
+
+
+def normalize_isbn(value):
+    """去掉ISBN中的连字符和空格"""
+    return re.sub(r'[\s-]', '', value or '').lower()
+
+
+class MemorySearchIndex:
+    """进程内倒排索引（SQLite/开发环境使用）
+
+    每个进程维护自己的一份索引，多进程部署时请使用 MySQL FULLTEXT 后端。
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {book_id: 加权词频}
+        self._terms = []  # 有序的全部索引词，用于前缀匹配
+        self._doc_tokens = {}  # book_id -> set(token)，用于增量删除
+        self._doc_lengths = {}
+        self._isbn = {}  # 规范化ISBN -> book_id
+        self._built = False
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+
+    def rebuild(self):
+        """从数据库全量重建索引"""
+        from models import db, Book
+
+        rows = db.session.query(
+            Book.id, Book.isbn, Book.title, Book.author, Book.publisher, Book.description
+        ).yield_per(1000)
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            self._doc_tokens.clear()
+            self._doc_lengths.clear()
+            self._isbn.clear()
+            for row in rows:
+                self._add(row.id, row.isbn, {
+                    'title': row.title,
+                    'author': row.author,
+                    'publisher': row.publisher,
+                    'description': row.description
+                })
+            self._built = True
+
+    def _add(self, book_id, isbn, fields):
+        weights = defaultdict(float)
+        length = 0
+        for field, value in fields.items():
+            tokens = tokenize(value)
+            length += len(tokens)
+            for token in tokens:
+                weights[token] += FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            if token not in self._postings:
+                bisect.insort(self._terms, token)
+            self._postings[token][book_id] = weight
+        self._doc_tokens[book_id] = set(weights)
+        self._doc_lengths[book_id] = max(length, 1)
+        if isbn:
+            self._isbn[normalize_isbn(isbn)] = book_id
+
+    def _remove(self, book_id):
+        for token in self._doc_tokens.pop(book_id, ()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(book_id, None)
+                if not posting:
+                    del self._postings[token]
+                    del self._terms[bisect.bisect_left(self._terms, token)]
+        self._doc_lengths.pop(book_id, None)
+        for isbn in [k for k, v in self._isbn.items() if v == book_id]:
+            del self._isbn[isbn]
+
+    def index_book(self, book):
+        """新增或更新单本图书的索引"""
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(book.id)
+            self._add(book.id, book.isbn, {
+                'title': book.title,
+                'author': book.author,
+                'publisher': book.publisher,
+                'description': book.description
+            })
+
+    def remove_book(self, book_id):
+        """从索引中删除图书"""
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(book_id)
+
+    def search(self, keyword, limit):
+        """返回按相关度排序的图书ID列表；无法检索时返回 None"""
+        tokens = tokenize(keyword)
+        isbn_key = normalize_isbn(keyword)
+        if not tokens and not isbn_key:
+            return None
+        # 单个汉字不在二元组索引中，交给调用方降级处理
+        if any(len(token) == 1 and _CJK_RE.fullmatch(token) for token in tokens):
+            return None
+
+        self._ensure_built()
+        with self._lock:
+            total_docs = max(len(self._doc_lengths), 1)
+            avg_length = sum(self._doc_lengths.values()) / total_docs if self._doc_lengths else 1
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            unique_tokens = set(tokens)
+            for token in unique_tokens:
+                # 同一个查询词展开出的多个索引词，每本书只取得分最高的一个
+                best = {}
+                for term, factor in self._expand(token, prefix=token == tokens[-1]):
+                    posting = self._postings[term]
+                    idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for book_id, weight in posting.items():
+                        # BM25 (k1=1.2, b=0.75)，词频按字段权重加权
+                        norm = 1.2 * (0.25 + 0.75 * self._doc_lengths[book_id] / avg_length)
+                        score = factor * idf * weight * 2.2 / (weight + norm)
+                        if score > best.get(book_id, 0):
+                            best[book_id] = score
+                for book_id, score in best.items():
+                    scores[book_id] += score
+                    matched[book_id] += 1
+
+            # 多词查询要求全部命中（AND 语义），与原 LIKE 子串匹配的结果保持一致
+            required = len(unique_tokens)
+            results = {book_id: score for book_id, score in scores.items() if matched[book_id] == required}
+
+            if isbn_key and isbn_key.isdigit():
+                for isbn, book_id in self._isbn.items():
+                    if isbn.startswith(isbn_key):
+                        results[book_id] = results.get(book_id, 0) + 100.0
+
+        ranked = sorted(results.items(), key=lambda item: (-item[1], -item[0]))
+        return [book_id for book_id, _ in ranked[:limit]]
+
+    def _expand(self, token, prefix):
+        """查询词对应的索引词及权重：完整匹配权重为 1；prefix 为 True 且是英文/数字时，
+        再按前缀匹配有序词表中以它开头的词（如 harr -> harry），权重为 PREFIX_WEIGHT"""
+        if token in self._postings:
+            yield token, 1.0
+        if not prefix or _CJK_RE.fullmatch(token):
+            return
+        start = bisect.bisect_right(self._terms, token)
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            yield term, PREFIX_WEIGHT
+
+
+FULLTEXT_INDEX = 'ft_book_search'
+
+
+def create_fulltext_index(connection):
+    """在 MySQL 的 book 表上创建 FULLTEXT（ngram）索引，已存在时跳过；create_all 不会创建该索引"""
+    from sqlalchemy import inspect
+
+    if connection.dialect.name != 'mysql':
+        return False
+    if any(index['name'] == FULLTEXT_INDEX for index in inspect(connection).get_indexes('book')):
+        return False
+    connection.execute(text(
+        f'ALTER TABLE book ADD FULLTEXT INDEX {FULLTEXT_INDEX} (title, author, publisher, description) WITH PARSER ngram'
+    ))
+    return True
+
+
+class MySQLFulltextSearch:
+    """MySQL FULLTEXT（ngram 解析器）后端，索引由数据库自动维护"""
+
+    name = 'mysql'
+
+    def index_book(self, book):
+        pass
+
+    def remove_book(self, book_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, keyword, limit):
+        from models import db
+
+        # ngram_token_size 默认为 2，单个汉字无法命中全文索引，交给调用方降级处理
+        if len(keyword.strip()) < 2:
+            return None
+        rows = db.session.execute(text(
+            'SELECT id FROM book '
+            'WHERE MATCH(title, author, publisher, description) AGAINST (:kw IN NATURAL LANGUAGE MODE) '
+            '   OR isbn LIKE :isbn '
+            'ORDER BY (isbn LIKE :isbn) DESC, '
+            '         MATCH(title, author, publisher, description) AGAINST (:kw IN NATURAL LANGUAGE MODE) DESC '
+            'LIMIT :limit'
+        ), {'kw': keyword, 'isbn': f'{keyword}%', 'limit': limit})
+        return [row[0] for row in rows]
+
+
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """根据配置返回当前应用的检索后端"""
+    app = current_app._get_current_object()
+    backend = app.extensions.get('search_backend')
+    if backend is not None:
+        return backend
+
+    with _backend_lock:
+        backend = app.extensions.get('search_backend')
+        if backend is None:
+            name = app.config.get('SEARCH_BACKEND', 'auto')
+            if name == 'auto':
+                from models import db
+                name = 'mysql' if db.engine.dialect.name == 'mysql' else 'memory'
+            backend = MySQLFulltextSearch() if name == 'mysql' else MemorySearchIndex()
+            app.extensions['search_backend'] = backend
+    return backend
+
+
+def search_book_ids(keyword):
+    """检索关键字，返回按相关度排序的图书ID列表（没有命中时为空列表）；返回 None 表示需要降级为 LIKE 查询
+
+    只有索引无法回答的查询（单个汉字）和检索出错时才降级，没有命中不会退回全表扫描。
+    """
+    try:
+        return get_search_backend().search(keyword, current_app.config.get('SEARCH_MAX_RESULTS', 1000))
+    except Exception as e:
+        print(f"全文检索失败，降级为LIKE查询:{e}")
+        return None
+
+
+def index_book(book):
+    """图书新增/更新后同步索引"""
+    try:
+        get_search_backend().index_book(book)
+    except Exception as e:
+        print(f"更新检索索引失败:{e}")
+
+
+def remove_book(book_id):
+    """图书删除后同步索引"""
+    try:
+        get_search_backend().remove_book(book_id)
+    except Exception as e:
+        print(f"删除检索索引失败:{e}")
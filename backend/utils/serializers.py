@@ -0,0 +1,129 @@
+import threading
+from flask import request
+from sqlalchemy.orm import load_only
+
+# 每个模型最多缓存的字段组合数（?fields= 由客户端决定，需要设上限）
+MAX_COMPILED = 64
+
+
+def iso(value):
+    return value.isoformat() if value else None
+
+
+def to_float(value):
+    return float(value) if value else 0
+
+
+def or_zero(value):
+    return value or 0
+
+
+class Field:
+    """序列化字段
+
+    默认读取同名属性；attr 指定其他属性名，convert 对属性值做转换；
+    getter 按整个对象计算（如关联对象的字段），此时用 columns 声明需要加载的列，
+    options 返回所需的预加载选项（只在请求了该字段时才预加载）。
+    """
+
+    def __init__(self, name, attr=None, convert=None, getter=None, columns=None, options=None):
+        attr = attr or name
+        if not name.isidentifier() or not attr.isidentifier():
+            raise ValueError(f'无效的字段名: {name}')
+        self.name = name
+        self.attr = attr
+        self.convert = convert
+        self.getter = getter
+        self.columns = tuple(columns) if columns is not None else (() if getter else (attr,))
+        self.options = options
+
+
+class Serializer:
+    """声明式模型序列化
+
+    按请求的字段组合生成并缓存专用的转换函数（一个字典字面量），
+    不构造、也不加载客户端没有请求的字段。在模型类体中声明：
+
+        serializer = Serializer('id', 'title', Field('created_at', convert=iso))
+    """
+
+    def __init__(self, *fields):
+        self.fields = {}
+        for field in fields:
+            field = Field(field) if isinstance(field, str) else field
+            self.fields[field.name] = field
+        self.model = None
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.model = owner
+
+    def parse_fields(self, value):
+        """解析 ?fields=id,title 形式的字段列表，未指定时返回 None（全部字段）"""
+        if not value:
+            return None
+        names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}（可选: {', '.join(self.fields)}）")
+        return names or None
+
+    def requested_fields(self):
+        """当前请求 ?fields= 指定的字段，格式错误时抛出 ValueError"""
+        return self.parse_fields(request.args.get('fields', '', type=str))
+
+    def compile(self, fields=None):
+        """返回只输出指定字段的转换函数"""
+        names = tuple(fields) if fields else tuple(self.fields)
+        func = self._compiled.get(names)
+        if func is not None:
+            return func
+
+        namespace = {}
+        items = []
+        for i, name in enumerate(names):
+            field = self.fields[name]
+            if field.getter is not None:
+                namespace[f'_g{i}'] = field.getter
+                expr = f'_g{i}(obj)'
+            else:
+                expr = f'obj.{field.attr}'
+                if field.convert is not None:
+                    namespace[f'_c{i}'] = field.convert
+                    expr = f'_c{i}({expr})'
+            items.append(f'{name!r}: {expr}')
+        source = 'def serialize(obj):\n    return {' + ', '.join(items) + '}\n'
+        exec(source, namespace)
+        func = namespace['serialize']
+
+        with self._lock:
+            if len(self._compiled) >= MAX_COMPILED:
+                self._compiled.clear()
+            self._compiled[names] = func
+        return func
+
+    def dump(self, obj, fields=None):
+        return self.compile(fields)(obj)
+
+    def dump_many(self, objs, fields=None):
+        func = self.compile(fields)
+        return [func(obj) for obj in objs]
+
+    def load_options(self, fields=None, *extra_columns):
+        """查询选项：只加载请求字段需要的列和关联
+
+        extra_columns 为视图另外要读取的列（排序、游标取值等）。未指定字段时只返回关联的预加载选项。
+        """
+        options = []
+        selected = [self.fields[name] for name in (fields or self.fields)]
+        for field in selected:
+            if field.options is not None:
+                options.extend(field.options())
+        if fields:
+            mapper_columns = self.model.__mapper__.column_attrs
+            columns = {key for field in selected for key in field.columns}
+            columns.update(column.key for column in extra_columns)
+            columns.update(column.key for column in self.model.__mapper__.primary_key)
+            options.append(load_only(*[getattr(self.model, key) for key in columns if key in mapper_columns]))
+        return options
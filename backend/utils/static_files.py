@@ -0,0 +1,77 @@
+import mimetypes
+import os
+from flask import current_app, request, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+# 只有可压缩的类型才查找预压缩文件，图片不会多做 stat
+COMPRESSIBLE_TYPES = ('text/', 'image/svg+xml', 'application/json', 'application/javascript')
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _precompressed(path, mimetype):
+    """客户端接受且存在同名 .br/.gz 文件时改为发送预压缩文件，返回 (编码, 路径)"""
+    if not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return None, path
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+
+def send_upload(filename):
+    """发送上传的文件
+
+    上传文件名唯一且内容不变（封面按内容哈希命名），因此使用长期 immutable 缓存；
+    ETag、304 和 Range 由 werkzeug 的条件响应处理。
+    UPLOAD_SENDFILE 为 x-sendfile 或 x-accel-redirect 时只返回响应头，由 Apache/nginx 发送文件内容。
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+
+    immutable = True
+    if not os.path.isfile(path):
+        # 封面变体尚未生成（或是旧封面）时返回原图，不在请求线程中解码缩放
+        from utils.images import variant_fallback
+        served = variant_fallback(filename)
+        if served is None:
+            abort(404)
+        # 退回原图时不能长期缓存，否则变体生成后客户端仍拿到原图
+        immutable = False
+        path = safe_join(folder, served)
+
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding, path = _precompressed(path, mimetype)
+
+    max_age = current_app.config.get('UPLOAD_CACHE_MAX_AGE', 31536000) if immutable else None
+    mode = current_app.config.get('UPLOAD_SENDFILE')
+    if mode == 'x-accel-redirect':
+        # nginx 内部 location 负责 ETag、Range 和 304
+        relative = os.path.relpath(path, folder).replace(os.sep, '/')
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + relative
+    else:
+        response = send_file(
+            path,
+            request.environ,
+            mimetype=mimetype,
+            conditional=True,
+            etag=True,
+            max_age=max_age,
+            use_x_sendfile=mode == 'x-sendfile',
+            response_class=current_app.response_class
+        )
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if mimetype.startswith(COMPRESSIBLE_TYPES):
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, timezone
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+
+from models import (
+    db, User, Book, BorrowRecord, Reservation,
+    StatCounter, StatDailyBorrow, StatDailyActiveUser, StatCategory
+)
+
+# 全局计数器名称
+USERS = 'users'
+BOOKS = 'books'
+BORROWED = 'borrowed'
+WAITING_RESERVATIONS = 'waiting_reservations'
+BORROWS_TOTAL = 'borrows_total'
+RETURNS_TOTAL = 'returns_total'
+
+# 汇总行的分片数：每次增量随机落在一个 slot 行上，读取时求和
+STAT_SLOTS = 16
+
+
+def _today(when=None):
+    return (when or datetime.now(timezone.utc)).date()
+
+
+def _bump(model, keys, **deltas):
+    """对汇总行做增量更新，行不存在时插入；并发插入冲突时改为更新
+
+    每次随机选一个 slot 行，同一计数器的并发更新分散到 STAT_SLOTS 行上，不会在一行上串行等锁。
+    """
+    keys = dict(keys, slot=random.randrange(STAT_SLOTS))
+    conditions = [getattr(model, k) == v for k, v in keys.items()]
+    values = {getattr(model, k): getattr(model, k) + v for k, v in deltas.items()}
+    stmt = update(model).where(*conditions).values(values).execution_options(synchronize_session=False)
+    if db.session.execute(stmt).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**keys, **deltas))
+    except IntegrityError:
+        db.session.execute(stmt)
+
+
+def bump_counter(name, delta=1):
+    _bump(StatCounter, {'name': name}, value=delta)
+
+
+def get_counters(*names):
+    rows = dict(db.session.query(StatCounter.name, func.sum(StatCounter.value)).filter(
+        StatCounter.name.in_(names)
+    ).group_by(StatCounter.name))
+    return {name: int(rows.get(name) or 0) for name in names}
+
+
+def record_borrow(user_id, category_id, when=None):
+    """借阅事件：在借阅事务中调用"""
+    day = _today(when)
+    bump_counter(BORROWED, 1)
+    bump_counter(BORROWS_TOTAL, 1)
+    # 当天首次借阅的用户才计入活跃用户数
+    new_active = 0
+    if not db.session.get(StatDailyActiveUser, (day, user_id)):
+        try:
+            with db.session.begin_nested():
+                db.session.add(StatDailyActiveUser(date=day, user_id=user_id))
+            new_active = 1
+        except IntegrityError:
+            pass
+    _bump(StatDailyBorrow, {'date': day}, borrow_count=1, return_count=0, active_users=new_active)
+    if category_id:
+        _bump(StatCategory, {'category_id': category_id}, book_count=0, borrow_count=1)
+
+
+def record_return(when=None):
+    """归还事件：在归还事务中调用"""
+    bump_counter(BORROWED, -1)
+    bump_counter(RETURNS_TOTAL, 1)
+    _bump(StatDailyBorrow, {'date': _today(when)}, borrow_count=0, return_count=1, active_users=0)
+
+
+def record_book_category(old_category_id, new_category_id):
+    """图书新增（old 为 None）、删除（new 为 None）或修改分类"""
+    if old_category_id == new_category_id:
+        return
+    if old_category_id:
+        _bump(StatCategory, {'category_id': old_category_id}, book_count=-1, borrow_count=0)
+    if new_category_id:
+        _bump(StatCategory, {'category_id': new_category_id}, book_count=1, borrow_count=0)
+
+
+def record_books_imported(category_counts):
+    """批量导入图书：category_counts 为 {分类ID: 新增本数}"""
+    bump_counter(BOOKS, sum(category_counts.values()))
+    for category_id, count in category_counts.items():
+        if category_id:
+            _bump(StatCategory, {'category_id': category_id}, book_count=count, borrow_count=0)
+
+
+def backfill_stats():
+    """从业务表全量重建所有统计表（首次部署或校正时使用）"""
+    StatDailyActiveUser.query.delete()
+    StatDailyBorrow.query.delete()
+    StatCategory.query.delete()
+    StatCounter.query.delete()
+
+    counters = {
+        USERS: User.query.count(),
+        BOOKS: Book.query.count(),
+        BORROWED: BorrowRecord.query.filter(BorrowRecord.status.in_(['borrowed', 'overdue'])).count(),
+        WAITING_RESERVATIONS: Reservation.query.filter_by(status='waiting').count(),
+        BORROWS_TOTAL: BorrowRecord.query.count(),
+        RETURNS_TOTAL: BorrowRecord.query.filter_by(status='returned').count()
+    }
+    db.session.bulk_insert_mappings(StatCounter, [{'name': k, 'value': v} for k, v in counters.items()])
+
+    borrow_day = func.date(BorrowRecord.borrow_time)
+    active_rows = db.session.query(borrow_day, BorrowRecord.user_id).filter(
+        BorrowRecord.borrow_time.isnot(None)
+    ).distinct().all()
+    db.session.bulk_insert_mappings(StatDailyActiveUser, [
+        {'date': _as_date(day), 'user_id': user_id} for day, user_id in active_rows
+    ])
+
+    daily = {}
+    for day, borrow_count, active_users in db.session.query(
+        borrow_day, func.count(BorrowRecord.id), func.count(func.distinct(BorrowRecord.user_id))
+    ).filter(BorrowRecord.borrow_time.isnot(None)).group_by(borrow_day):
+        daily[_as_date(day)] = {'borrow_count': borrow_count, 'return_count': 0, 'active_users': active_users}
+    return_day = func.date(BorrowRecord.return_time)
+    for day, return_count in db.session.query(return_day, func.count(BorrowRecord.id)).filter(
+        BorrowRecord.return_time.isnot(None)
+    ).group_by(return_day):
+        row = daily.setdefault(_as_date(day), {'borrow_count': 0, 'return_count': 0, 'active_users': 0})
+        row['return_count'] = return_count
+    db.session.bulk_insert_mappings(StatDailyBorrow, [dict(v, date=k) for k, v in daily.items()])
+
+    categories = {}
+    for category_id, book_count in db.session.query(Book.category_id, func.count(Book.id)).filter(
+        Book.category_id.isnot(None)
+    ).group_by(Book.category_id):
+        categories[category_id] = {'book_count': book_count, 'borrow_count': 0}
+    for category_id, borrow_count in db.session.query(Book.category_id, func.count(BorrowRecord.id)).join(
+        BorrowRecord, BorrowRecord.book_id == Book.id
+    ).filter(Book.category_id.isnot(None)).group_by(Book.category_id):
+        categories.setdefault(category_id, {'book_count': 0, 'borrow_count': 0})['borrow_count'] = borrow_count
+    db.session.bulk_insert_mappings(StatCategory, [dict(v, category_id=k) for k, v in categories.items()])
+
+    db.session.commit()
+    return {'counters': counters, 'days': len(daily), 'categories': len(categories)}
+
+
+def _as_date(value):
+    # SQLite 的 DATE() 返回字符串，MySQL 返回 date
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
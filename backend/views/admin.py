@@ -1,32 +1,59 @@
-from flask import Blueprint, request, jsonify
-from models import db, User, Book, BorrowRecord, Reservation, BookComment, OperationLog
-from utils.jwt_handler import admin_required
+from flask import Blueprint, request, jsonify, current_app
+from models import (
+    db, User, Book, BookCategory, BorrowRecord, OperationLog,
+    StatDailyBorrow, StatCategory
+)
+from utils.jwt_handler import admin_required, invalidate_user_auth_state
+from utils.query_budget import query_budget
+from utils.decorators import log_operation
+from utils.export import export_response, parse_date_arg
+from utils.pagination import cursor_requested, cursor_pagination
+from utils.stats import (
+    get_counters, USERS, BOOKS, BORROWED, WAITING_RESERVATIONS, BORROWS_TOTAL, RETURNS_TOTAL
+)
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import func, and_
+from sqlalchemy import func
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_all_users(payload):
-    """获取所有用户"""
+    """获取所有用户（带 cursor 参数时使用游标分页）"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     keyword = request.args.get('keyword', '', type=str).strip()
+    try:
+        fields = User.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
     
-    query = User.query
+    query = User.query.options(*User.serializer.load_options(fields, User.created_at))
     if keyword:
         query = query.filter(
             User.username.like(f'%{keyword}%') | User.real_name.like(f'%{keyword}%')
         )
     
+    if cursor_requested():
+        try:
+            users, pagination = cursor_pagination(
+                query, [(User.created_at, True, None), (User.id, True, None)], per_page
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'msg': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': User.serializer.dump_many(users, fields),
+            'pagination': pagination
+        }), 200
+    
     paginate = query.order_by(User.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
         'code':  200,
-        'data':  [user.to_dict() for user in paginate.items],
+        'data':  User.serializer.dump_many(paginate.items, fields),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -37,6 +64,7 @@ def get_all_users(payload):
 
 @admin_bp.route('/users/<int:user_id>/freeze', methods=['POST'])
 @admin_required
+@log_operation('freeze_user', 'user', model=User, id_arg='user_id')
 def freeze_user(payload, user_id):
     """冻结用户"""
     user = User.query.get(user_id)
@@ -45,11 +73,13 @@ def freeze_user(payload, user_id):
     
     user.status = 'frozen'
     db.session.commit()
+    invalidate_user_auth_state(user_id)
     
     return jsonify({'code': 200, 'msg': '冻结成功'}), 200
 
 @admin_bp.route('/users/<int:user_id>/unfreeze', methods=['POST'])
 @admin_required
+@log_operation('unfreeze_user', 'user', model=User, id_arg='user_id')
 def unfreeze_user(payload, user_id):
     """解冻用户"""
     user = User.query.get(user_id)
@@ -58,6 +88,7 @@ def unfreeze_user(payload, user_id):
     
     user.status = 'active'
     db.session.commit()
+    invalidate_user_auth_state(user_id)
     
     return jsonify({'code': 200, 'msg': '解冻成功'}), 200
 
@@ -65,16 +96,14 @@ def unfreeze_user(payload, user_id):
 @admin_required
 def get_overview_statistics(payload):
     """获取统计概览"""
-    total_users = User.query.count()
-    total_books = Book.query.count()
-    total_borrowed = BorrowRecord.query.filter_by(status='borrowed').count()
-    total_reservations = Reservation.query.filter_by(status='waiting').count()
-    overdue_count = BorrowRecord.query.filter(
-        and_(
-            BorrowRecord.status.in_(['borrowed', 'overdue']),
-            BorrowRecord.due_time < datetime.now(timezone.utc)
-        )
-    ).count()
+    # 计数类指标读取统计表，由借还等业务事件增量维护
+    counters = get_counters(USERS, BOOKS, BORROWED, WAITING_RESERVATIONS)
+    total_users = counters[USERS]
+    total_books = counters[BOOKS]
+    total_borrowed = counters[BORROWED]
+    total_reservations = counters[WAITING_RESERVATIONS]
+    # 逾期状态由清扫任务维护，走 (status, due_time) 索引
+    overdue_count = BorrowRecord.query.filter(BorrowRecord.status == 'overdue').count()
     
     return jsonify({
         'code': 200,
@@ -93,14 +122,13 @@ def get_top_books_statistics(payload):
     """获取热门图书排行"""
     limit = request.args.get('limit', 10, type=int)
     
+    # 借阅次数由借阅事务维护在 book.borrowed_count 上，无需扫描借阅记录
     top_books = db.session.query(
         Book.id,
         Book.title,
         Book.author,
-        func.count(BorrowRecord.id).label('borrow_count')
-    ).outerjoin(BorrowRecord).group_by(Book.id).order_by(
-        func.count(BorrowRecord.id).desc()
-    ).limit(limit).all()
+        Book.borrowed_count
+    ).order_by(Book.borrowed_count.desc(), Book.id).limit(limit).all()
     
     data = [
         {
@@ -122,21 +150,23 @@ def get_top_books_statistics(payload):
 def get_user_activity_statistics(payload):
     """获取用户活跃度统计"""
     days = request.args.get('days', 30, type=int)
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
+    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).date()
     
+    # 每天的汇总分散在多个 slot 行上，按天求和
+    borrow_count = func.sum(StatDailyBorrow.borrow_count)
     daily_stats = db.session.query(
-        func.date(BorrowRecord.borrow_time).label('date'),
-        func.count(BorrowRecord.id).label('borrow_count'),
-        func.count(func.distinct(BorrowRecord.user_id)).label('active_users')
-    ).filter(BorrowRecord.borrow_time >= start_date).group_by(
-        func.date(BorrowRecord.borrow_time)
-    ).all()
+        StatDailyBorrow.date,
+        borrow_count,
+        func.sum(StatDailyBorrow.active_users)
+    ).filter(
+        StatDailyBorrow.date >= start_date
+    ).group_by(StatDailyBorrow.date).having(borrow_count > 0).order_by(StatDailyBorrow.date).all()
     
     data = [
         {
             'date': str(stat[0]),
-            'borrow_count': stat[1],
-            'active_users': stat[2]
+            'borrow_count': int(stat[1]),
+            'active_users': int(stat[2] or 0)
         }
         for stat in daily_stats
     ]
@@ -150,19 +180,21 @@ def get_user_activity_statistics(payload):
 @admin_required
 def get_category_distribution(payload):
     """获取图书分类分布"""
-    from models import BookCategory
-    
+    book_counts = db.session.query(
+        StatCategory.category_id,
+        func.sum(StatCategory.book_count).label('book_count')
+    ).group_by(StatCategory.category_id).subquery()
     stats = db.session.query(
         BookCategory.id,
         BookCategory.name,
-        func.count(Book.id).label('book_count')
-    ).outerjoin(Book).group_by(BookCategory.id).all()
+        book_counts.c.book_count
+    ).outerjoin(book_counts, book_counts.c.category_id == BookCategory.id).all()
     
     data = [
         {
             'id':  stat[0],
             'category': stat[1],
-            'count': stat[2] or 0
+            'count': int(stat[2] or 0)
         }
         for stat in stats
     ]
@@ -176,8 +208,9 @@ def get_category_distribution(payload):
 @admin_required
 def get_borrow_return_rate(payload):
     """获取借还率"""
-    total_borrows = BorrowRecord.query.count()
-    total_returns = BorrowRecord.query.filter_by(status='returned').count()
+    counters = get_counters(BORROWS_TOTAL, RETURNS_TOTAL)
+    total_borrows = counters[BORROWS_TOTAL]
+    total_returns = counters[RETURNS_TOTAL]
     
     return jsonify({
         'code':  200,
@@ -197,15 +230,12 @@ def get_overdue_report(payload):
         User.username,
         Book.title
     ).join(User).join(Book).filter(
-        and_(
-            BorrowRecord.status.in_(['borrowed', 'overdue']),
-            BorrowRecord.due_time < datetime.now(timezone.utc)
-        )
+        BorrowRecord.status == 'overdue'
     ).order_by(BorrowRecord.due_time).all()
     
     data = []
     for record, username, title in overdue_records: 
-        overdue_days = (datetime.now(timezone.utc) - record.due_time).days
+        overdue_days = (datetime.utcnow() - record.due_time).days
         data.append({
             'record_id': record.id,
             'username': username,
@@ -222,22 +252,39 @@ def get_overdue_report(payload):
 @admin_bp.route('/logs', methods=['GET'])
 @admin_required
 def get_operation_logs(payload):
-    """获取操作日志"""
+    """获取操作日志（带 cursor 参数时使用游标分页，深翻页不再变慢）"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     action = request.args.get('action', '', type=str).strip()
+    try:
+        fields = OperationLog.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
     
-    query = OperationLog.query
+    query = OperationLog.query.options(*OperationLog.serializer.load_options(fields, OperationLog.created_at))
     if action:
         query = query.filter_by(action=action)
     
+    if cursor_requested():
+        try:
+            logs, pagination = cursor_pagination(
+                query, [(OperationLog.created_at, True, None), (OperationLog.id, True, None)], per_page
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'msg': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': OperationLog.serializer.dump_many(logs, fields),
+            'pagination': pagination
+        }), 200
+    
     paginate = query.order_by(OperationLog.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
         'code':  200,
-        'data':  [log.to_dict() for log in paginate.items],
+        'data':  OperationLog.serializer.dump_many(paginate.items, fields),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -246,30 +293,91 @@ def get_operation_logs(payload):
         }
     }), 200
 
+USER_EXPORT_FIELDS = ['id', 'username', 'real_name', 'email', 'phone', 'role', 'status', 'created_at']
+BORROW_EXPORT_FIELDS = [
+    'id', 'user_id', 'user', 'book_id', 'book', 'borrow_time', 'due_time',
+    'return_time', 'status', 'renewal_count', 'days_left'
+]
+
+
+def _export_options():
+    """解析导出通用参数：格式、是否压缩、日期范围"""
+    fmt = request.args.get('format', 'json', type=str).lower()
+    use_gzip = request.args.get('gzip', 0, type=int) == 1
+    start = parse_date_arg(request.args.get('start_date'))
+    end = parse_date_arg(request.args.get('end_date'), end_of_day=True)
+    return fmt, use_gzip, start, end
+
+
 @admin_bp.route('/export/users', methods=['GET'])
 @admin_required
 def export_users(payload):
-    """导出用户数据（模拟）"""
-    users = User.query.all()
-    data = [user.to_dict() for user in users]
+    """导出用户数据（流式，支持 json/csv/ndjson）"""
+    try:
+        fmt, use_gzip, start, end = _export_options()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': f'参数错误: {str(e)}'}), 400
+    status = request.args.get('status', '', type=str)
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
     
-    return jsonify({
-        'code': 200,
-        'msg': '导出成功',
-        'data': data,
-        'total':  len(data)
-    }), 200
+    query = db.session.query(*[getattr(User, field) for field in USER_EXPORT_FIELDS])
+    if status:
+        query = query.filter(User.status == status)
+    if start:
+        query = query.filter(User.created_at >= start)
+    if end:
+        query = query.filter(User.created_at <= end)
+    query = query.order_by(User.id).yield_per(batch_size)
+    
+    rows = (row._asdict() for row in query)
+    try:
+        return export_response(rows, USER_EXPORT_FIELDS, fmt, 'users', use_gzip)
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
 
 @admin_bp.route('/export/borrow-records', methods=['GET'])
+@query_budget(5)
 @admin_required
 def export_borrow_records(payload):
-    """导出借阅记录"""
-    records = BorrowRecord.query.all()
-    data = [record.to_dict() for record in records]
+    """导出借阅记录（流式，支持 json/csv/ndjson，按借阅时间和状态过滤）"""
+    try:
+        fmt, use_gzip, start, end = _export_options()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': f'参数错误: {str(e)}'}), 400
+    status = request.args.get('status', '', type=str)
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
     
-    return jsonify({
-        'code': 200,
-        'msg': '导出成功',
-        'data': data,
-        'total':  len(data)
-    }), 200
\ No newline at end of file
+    # 只查询导出需要的列，不构造 ORM 对象，也不会触发懒加载
+    query = db.session.query(
+        BorrowRecord.id,
+        BorrowRecord.user_id,
+        User.username.label('user'),
+        BorrowRecord.book_id,
+        Book.title.label('book'),
+        BorrowRecord.borrow_time,
+        BorrowRecord.due_time,
+        BorrowRecord.return_time,
+        BorrowRecord.status,
+        BorrowRecord.renewal_count
+    ).outerjoin(User, User.id == BorrowRecord.user_id).outerjoin(Book, Book.id == BorrowRecord.book_id)
+    if status:
+        query = query.filter(BorrowRecord.status == status)
+    if start:
+        query = query.filter(BorrowRecord.borrow_time >= start)
+    if end:
+        query = query.filter(BorrowRecord.borrow_time <= end)
+    # 按借阅时间过滤时按 (borrow_time, id) 排序，idx_borrow_time 同时用于过滤和排序
+    order = [BorrowRecord.borrow_time, BorrowRecord.id] if start or end else [BorrowRecord.id]
+    query = query.order_by(*order).yield_per(batch_size)
+    
+    def rows():
+        now = datetime.utcnow()
+        for row in query:
+            data = row._asdict()
+            data['days_left'] = (row.due_time - now).days if row.due_time else 0
+            yield data
+    
+    try:
+        return export_response(rows(), BORROW_EXPORT_FIELDS, fmt, 'borrow_records', use_gzip)
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
\ No newline at end of file
@@ -1,14 +1,23 @@
 from flask import Blueprint, request, jsonify, current_app
-from models import db, Book, BookCategory, BorrowRecord, Reservation
-from utils.jwt_handler import token_required, admin_required
-from utils.file_handler import save_upload_file, delete_file
-from sqlalchemy import or_
-from datetime import datetime
+from models import db, Book, BookCategory, BorrowRecord
+from utils.jwt_handler import admin_required
+from utils.query_budget import query_budget
+from utils.images import save_cover, delete_cover
+from utils.search import search_book_ids, index_book, remove_book
+from utils.cache import cached_view, invalidate_book
+from utils.pagination import cursor_requested, cursor_pagination
+from utils.comments import comment_summary
+from utils.recommendations import similar_books
+from utils import stats
+from utils.decorators import log_operation
+from utils.book_import import FORMATS as IMPORT_FORMATS, detect_format, open_reader, import_books
+from sqlalchemy import or_, case
 
 book_bp = Blueprint('book', __name__, url_prefix='/api/books')
 
 
 @book_bp.route('/categories', methods=['GET'])
+@cached_view('categories', ttl=600)
 def get_categories():
     """获取所有图书分类"""
     try:
@@ -25,19 +34,27 @@ def get_categories():
 
 @book_bp.route('', methods=['GET'])
 def get_books():
-    """获取图书列表（分页）"""
+    """获取图书列表（分页；带 cursor 参数时使用游标分页）"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         keyword = request.args.get('keyword', '', type=str)
         category_id = request.args.get('category_id', None, type=int)
-        sort_by = request.args.get('sort_by', 'created_at', type=str)
+        keyword = keyword.strip()
+        # 有关键字且未指定排序时按相关度排序
+        sort_by = request.args.get('sort_by', 'relevance' if keyword else 'created_at', type=str)
+        fields = Book.serializer.requested_fields()
         
-        # 构建查询
-        query = Book.query
+        # 构建查询（?fields= 指定字段时只加载需要的列和关联）
+        query = Book.query.options(*Book.serializer.load_options(
+            fields, Book.created_at, Book.borrowed_count, Book.avg_rating, Book.weighted_rating, Book.rating_count
+        ))
         
-        # 关键字搜索
-        if keyword:
+        # 关键字搜索：优先走全文索引，无法检索时降级为 LIKE
+        ranked_ids = search_book_ids(keyword) if keyword else None
+        if ranked_ids is not None:
+            query = query.filter(Book.id.in_(ranked_ids or [0]))
+        elif keyword:
             query = query.filter(or_(
                 Book.title.ilike(f'%{keyword}%'),
                 Book.author.ilike(f'%{keyword}%'),
@@ -48,47 +65,69 @@ def get_books():
         if category_id:
             query = query.filter_by(category_id=category_id)
         
-        # 排序
+        # 排序：(排序表达式, 是否降序, 游标取值函数)，最后以 id 保证顺序唯一
         if sort_by == 'borrowed_count':
-            query = query.order_by(Book.borrowed_count.desc())
+            order = [(Book.borrowed_count, True, None)]
         elif sort_by == 'avg_rating':
-            query = query.order_by(Book.avg_rating.desc())
+            order = [(Book.avg_rating, True, None)]
+        elif sort_by == 'weighted_rating':
+            order = [(Book.weighted_rating, True, None), (Book.rating_count, True, None)]
+        elif sort_by == 'relevance' and ranked_ids:
+            ranks = {book_id: rank for rank, book_id in enumerate(ranked_ids)}
+            order = [(case(ranks, value=Book.id), False, lambda book: ranks[book.id])]
         else:
-            query = query.order_by(Book.created_at.desc())
+            order = [(Book.created_at, True, None)]
+        order.append((Book.id, True, None))
         
-        # 分页
-        total = query.count()
-        books = query.paginate(page=page, per_page=per_page, error_out=False).items
+        # 游标分页
+        if cursor_requested():
+            books, pagination = cursor_pagination(query, order, per_page)
+            return jsonify({
+                'code':200,
+                'msg':'成功',
+                'data':Book.serializer.dump_many(books, fields),
+                'pagination':pagination
+            }), 200
+        
+        # 页码分页
+        query = query.order_by(*[expr.desc() if desc else expr.asc() for expr, desc, _ in order])
+        paginate = query.paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
             'code':200,
             'msg':'成功',
-            'data':[book.to_dict() for book in books],
+            'data':Book.serializer.dump_many(paginate.items, fields),
             'pagination':{
                 'page':page,
                 'per_page': per_page,
-                'total':total,
-                'pages': (total + per_page - 1) // per_page
+                'total':paginate.total,
+                'pages': paginate.pages
             }
         }), 200
     
+    except ValueError as e:
+        return jsonify({'code':400, 'msg':str(e)}), 400
     except Exception as e:
         print(f"获取图书列表错误:{e}")
         return jsonify({'code':500, 'msg': f'获取失败:{str(e)}'}), 500
 
 
 @book_bp.route('/<int:book_id>', methods=['GET'])
+@cached_view(lambda book_id: f'book:{book_id}')
 def get_book(book_id):
     """获取单本图书详情"""
     try:
-        book = Book.query.get(book_id)
+        book = db.session.get(Book, book_id, options=Book.serializer.load_options())
         if not book:
             return jsonify({'code':404, 'msg':'图书不存在'}), 404
         
+        # 只内嵌有限条数的评论摘要，完整列表由 /api/comments/book/<id> 游标分页加载
+        data = book.to_dict()
+        data.update(comment_summary(book, current_app.config.get('COMMENT_SUMMARY_SIZE', 5)))
         return jsonify({
             'code':200,
             'msg':'成功',
-            'data':book.to_dict(include_comments=True)
+            'data':data
         }), 200
     
     except Exception as e:
@@ -97,7 +136,9 @@ def get_book(book_id):
 
 
 @book_bp.route('', methods=['POST'])
+@query_budget(15)
 @admin_required
+@log_operation('add_book', 'book')
 def add_book(payload):
     """添加图书（仅管理员）"""
     try:
@@ -116,7 +157,7 @@ def add_book(payload):
         if 'cover' in request.files:
             file = request.files['cover']
             if file and file.filename != '':
-                cover_url, error = save_upload_file(file, folder='covers')
+                cover_url, error = save_cover(file)
                 if error:
                     return jsonify({'code':400, 'msg': error}), 400
         
@@ -136,7 +177,11 @@ def add_book(payload):
         )
         
         db.session.add(book)
+        stats.bump_counter(stats.BOOKS, 1)
+        stats.record_book_category(None, book.category_id)
         db.session.commit()
+        index_book(book)
+        invalidate_book(book.id)
         
         print(f"✓ 图书添加成功:{data['title']}")
         
@@ -154,8 +199,67 @@ def add_book(payload):
         return jsonify({'code':500, 'msg':f'添加失败:{str(e)}'}), 500
 
 
+def _release_cover(cover_url, book_id):
+    """没有其他图书引用时才删除封面（封面按内容去重，可能被多本书共用）"""
+    if cover_url and not Book.query.filter(Book.cover_url == cover_url, Book.id != book_id).first():
+        delete_cover(cover_url)
+
+
+@book_bp.route('/import', methods=['POST'])
+@query_budget(None)  # SQL 条数随文件行数增长
+@admin_required
+@log_operation('import_books', 'book')
+def import_books_view(payload):
+    """批量导入图书（仅管理员）
+
+    上传 CSV / JSON Lines / MARC 文件（字段 file），逐行流式处理并分批写入。
+    中断后重新上传同一文件并传 start_row=上次返回的 last_row 即可续传。
+    超过上传大小限制的大文件请使用命令行 flask --app app import-books。
+    """
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'code': 400, 'msg': '请上传导入文件'}), 400
+    
+    fmt = request.form.get('format') or detect_format(file.filename)
+    on_duplicate = request.form.get('on_duplicate', 'skip')
+    if fmt not in IMPORT_FORMATS or on_duplicate not in ('skip', 'update', 'error'):
+        return jsonify({'code': 400, 'msg': '不支持的文件格式或重复处理方式'}), 400
+    
+    try:
+        chunk_size = int(request.form.get('chunk_size') or current_app.config.get('IMPORT_CHUNK_SIZE', 1000))
+        start_row = int(request.form.get('start_row') or 0)
+    except ValueError:
+        return jsonify({'code': 400, 'msg': 'chunk_size 和 start_row 必须是整数'}), 400
+    
+    progress = {'last_row': start_row}
+    try:
+        report = import_books(
+            open_reader(file.stream, fmt),
+            on_duplicate=on_duplicate,
+            chunk_size=max(1, min(chunk_size, 10000)),
+            start_row=start_row,
+            max_errors=current_app.config.get('IMPORT_MAX_ERRORS', 1000),
+            on_chunk=lambda report: progress.update(last_row=report['last_row'])
+        )
+    except Exception as e:
+        db.session.rollback()
+        print(f"✗ 批量导入图书错误:{e}")
+        # 已提交的批次不会回滚，从返回的 last_row 之后续传即可
+        return jsonify({'code': 500, 'msg': f'导入中断:{str(e)}', 'data': progress}), 500
+    
+    print(f"✓ 批量导入图书：新增 {report['inserted']}，更新 {report['updated']}，错误 {report['error_count']}")
+    
+    return jsonify({
+        'code': 200,
+        'msg': '导入完成',
+        'data': report
+    }), 200
+
+
 @book_bp.route('/<int:book_id>', methods=['PUT'])
+@query_budget(20)  # 换分类时两个分类的统计行各一次更新（首次写入该分片时再加插入）
 @admin_required
+@log_operation('update_book', 'book', model=Book, id_arg='book_id')
 def update_book(payload, book_id):
     """更新图书（仅管理员）"""
     try:
@@ -169,15 +273,14 @@ def update_book(payload, book_id):
         if 'cover' in request.files:
             file = request.files['cover']
             if file and file.filename != '':
-                # 删除旧图片
-                if book.cover_url:
-                    delete_file(book.cover_url)
-                
                 # 保存新图片
-                cover_url, error = save_upload_file(file, folder='covers')
+                cover_url, error = save_cover(file)
                 if error:
                     return jsonify({'code':400, 'msg':error}), 400
                 
+                # 删除旧图片
+                if book.cover_url != cover_url:
+                    _release_cover(book.cover_url, book.id)
                 book.cover_url = cover_url
         
         # 更新其他字段
@@ -192,7 +295,9 @@ def update_book(payload, book_id):
         if 'description' in data:
             book.description = data['description']
         if 'category_id' in data:
+            old_category_id = book.category_id
             book.category_id = int(data['category_id']) if data['category_id'] else None
+            stats.record_book_category(old_category_id, book.category_id)
         if 'location' in data:
             book.location = data['location']
         if 'stock' in data:
@@ -201,6 +306,8 @@ def update_book(payload, book_id):
             book.total = int(data['total'])
         
         db.session.commit()
+        index_book(book)
+        invalidate_book(book.id)
         
         print(f"✓ 图书更新成功:{book.title}")
         
@@ -217,7 +324,9 @@ def update_book(payload, book_id):
 
 
 @book_bp.route('/<int:book_id>', methods=['DELETE'])
+@query_budget(20)
 @admin_required
+@log_operation('delete_book', 'book', model=Book, id_arg='book_id')
 def delete_book(payload, book_id):
     """删除图书（仅管理员）"""
     try:
@@ -235,11 +344,14 @@ def delete_book(payload, book_id):
             return jsonify({'code':400, 'msg':'还有未归还的借阅记录，无法删除'}), 400
         
         # 删除图片文件
-        if book.cover_url:
-            delete_file(book.cover_url)
+        _release_cover(book.cover_url, book.id)
         
         db.session.delete(book)
+        stats.bump_counter(stats.BOOKS, -1)
+        stats.record_book_category(book.category_id, None)
         db.session.commit()
+        remove_book(book_id)
+        invalidate_book(book_id)
         
         print(f"✓ 图书删除成功:{book.title}")
         
@@ -252,40 +364,77 @@ def delete_book(payload, book_id):
 
 
 @book_bp.route('/popular', methods=['GET'])
+@cached_view('book_lists')
 def get_popular_books():
     """获取热门图书"""
     try:
         limit = request.args.get('limit', 10, type=int)
-        books = Book.query.order_by(
+        fields = Book.serializer.requested_fields()
+        books = Book.query.options(*Book.serializer.load_options(fields, Book.borrowed_count)).order_by(
             Book.borrowed_count.desc()
         ).limit(limit).all()
         
         return jsonify({
             'code': 200,
             'msg': '成功',
-            'data':[book.to_dict() for book in books]
+            'data':Book.serializer.dump_many(books, fields)
         }), 200
     
+    except ValueError as e:
+        return jsonify({'code':400, 'msg':str(e)}), 400
     except Exception as e:
         print(f"获取热门图书错误:{e}")
         return jsonify({'code':500, 'msg':f'获取失败:{str(e)}'}), 500
 
 
+@book_bp.route('/<int:book_id>/similar', methods=['GET'])
+@cached_view('recommendations', ttl=60)  # 固定短 TTL：CLI 刷新相似度时无法清除 worker 的进程内缓存
+def get_similar_books(book_id):
+    """相似图书（读取离线计算的相似度表，借阅过这本书的读者还借了什么）"""
+    try:
+        limit = max(1, min(request.args.get('limit', 10, type=int), current_app.config.get('RECOMMEND_TOP_K', 20)))
+        fields = Book.serializer.requested_fields()
+        rows = similar_books(book_id, limit, Book.serializer.load_options(fields))
+        
+        data = []
+        for book, score in rows:
+            item = Book.serializer.dump(book, fields)
+            item['score'] = round(score, 4)
+            data.append(item)
+        return jsonify({
+            'code':200,
+            'msg':'成功',
+            'data':data
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'code':400, 'msg':str(e)}), 400
+    except Exception as e:
+        print(f"获取相似图书错误:{e}")
+        return jsonify({'code':500, 'msg':f'获取失败:{str(e)}'}), 500
+
+
 @book_bp.route('/top-rated', methods=['GET'])
+@cached_view('book_lists')
 def get_top_rated_books():
-    """获取评分最高的图书"""
+    """获取评分最高的图书（按贝叶斯加权评分，少量高分评价不会排到最前，走 idx_weighted_rating 索引）"""
     try:
         limit = request.args.get('limit', 10, type=int)
-        books = Book.query.order_by(
-            Book.avg_rating.desc()
+        fields = Book.serializer.requested_fields()
+        books = Book.query.options(
+            *Book.serializer.load_options(fields, Book.weighted_rating, Book.rating_count)
+        ).filter(Book.rating_count > 0).order_by(
+            Book.weighted_rating.desc(), Book.rating_count.desc()
         ).limit(limit).all()
         
         return jsonify({
             'code':200,
             'msg':'成功',
-            'data':[book.to_dict() for book in books]
+            'data':Book.serializer.dump_many(books, fields)
         }), 200
     
+    except ValueError as e:
+        return jsonify({'code':400, 'msg':str(e)}), 400
     except Exception as e:
         print(f"获取评分高的图书错误:{e}")
         return jsonify({'code':500, 'msg': f'获取失败:{str(e)}'}), 500
\ No newline at end of file
@@ -1,56 +1,76 @@
 from flask import Blueprint, request, jsonify
-from models import db, BorrowRecord, Book, User, Notification
+from models import db, BorrowRecord, Book, Notification, Reservation
 from utils.jwt_handler import token_required
+from utils.query_budget import query_budget
+from utils.cache import invalidate_book
+from utils.idempotency import idempotent
+from utils.inventory import InventoryError, run_in_transaction, take_copy, close_borrow_record
+from utils.reservation_queue import claim_hold, release_copy
+from utils import stats
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import and_
 
 borrow_bp = Blueprint('borrow', __name__, url_prefix='/api/borrows')
 
 @borrow_bp.route('/<int:book_id>', methods=['POST'])
+@query_budget(36)
 @token_required
+@idempotent
 def borrow_book(payload, book_id):
-    """借阅图书"""
+    """借阅图书（条件扣减库存，并发下不会超借）"""
     user_id = payload['user_id']
-    user = User.query.get(user_id)
     book = Book.query.get(book_id)
     
     if not book: 
         return jsonify({'code':  404, 'msg': '图书不存在'}), 404
     
-    if book.stock <= 0:
+    # 库存为 0 时只有持有预约保留的读者可以借
+    if book.stock <= 0 and not Reservation.query.filter_by(
+        user_id=user_id, book_id=book_id, status='notified'
+    ).first():
         return jsonify({'code': 400, 'msg': '图书库存不足'}), 400
     
-    # 检查用户是否已借阅此书
-    existing = BorrowRecord.query.filter(
-        and_(
-            BorrowRecord.user_id == user_id,
-            BorrowRecord.book_id == book_id,
-            BorrowRecord.status == 'borrowed'
+    def work():
+        # 先扣库存：MySQL 上该 UPDATE 会锁住图书行，后续检查在锁内进行
+        # 有预约保留时借走保留的副本，不再扣减可借库存
+        take_copy(book_id, held=claim_hold(user_id, book_id))
+        
+        # 检查用户是否已借阅此书
+        existing = BorrowRecord.query.filter(
+            and_(
+                BorrowRecord.user_id == user_id,
+                BorrowRecord.book_id == book_id,
+                BorrowRecord.status.in_(['borrowed', 'overdue'])
+            )
+        ).first()
+        if existing:
+            raise InventoryError('您已借阅此书，请先归还')
+        
+        # 创建借阅记录（30天借期）
+        due_time = datetime.now(timezone.utc) + timedelta(days=30)
+        borrow_record = BorrowRecord(
+            user_id=user_id,
+            book_id=book_id,
+            due_time=due_time
         )
-    ).first()
-    
-    if existing: 
-        return jsonify({'code':  400, 'msg': '您已借阅此书，请先归还'}), 400
-    
-    # 创建借阅记录（30天借期）
-    due_time = datetime.now(timezone.utc) + timedelta(days=30)
-    borrow_record = BorrowRecord(
-        user_id=user_id,
-        book_id=book_id,
-        due_time=due_time
-    )
-    
-    db.session.add(borrow_record)
-    
-    # 添加通知
-    notification = Notification(
-        user_id=user_id,
-        title='借阅成功',
-        content=f'您已成功借阅《{book.title}》，请于{due_time.strftime("%Y-%m-%d")}前归还',
-        type='borrow'
-    )
-    db.session.add(notification)
-    db.session.commit()
+        db.session.add(borrow_record)
+        stats.record_borrow(user_id, book.category_id)
+        
+        # 添加通知
+        notification = Notification(
+            user_id=user_id,
+            title='借阅成功',
+            content=f'您已成功借阅《{book.title}》，请于{due_time.strftime("%Y-%m-%d")}前归还',
+            type='borrow'
+        )
+        db.session.add(notification)
+        return borrow_record
+    
+    try:
+        borrow_record = run_in_transaction(work)
+    except InventoryError as e:
+        return jsonify({'code': e.code, 'msg': e.message}), e.code
+    invalidate_book(book_id)
     
     return jsonify({
         'code': 200,
@@ -59,7 +79,9 @@ def borrow_book(payload, book_id):
     }), 200
 
 @borrow_bp.route('/<int:record_id>/return', methods=['POST'])
+@query_budget(32)
 @token_required
+@idempotent
 def return_book(payload, record_id):
     """归还图书"""
     user_id = payload['user_id']
@@ -71,24 +93,33 @@ def return_book(payload, record_id):
     if borrow_record.user_id != user_id:
         return jsonify({'code': 403, 'msg': '无权操作'}), 403
     
-    if borrow_record.status != 'borrowed':
+    if borrow_record.status not in ('borrowed', 'overdue'):
         return jsonify({'code': 400, 'msg': '该图书已归还'}), 400
     
-    borrow_record.return_time = datetime.now(timezone.utc)
-    borrow_record.status = 'returned'
-    
-    book = borrow_record.book
-
+    book_id = borrow_record.book_id
+    book_title = borrow_record.book.title
+    
+    def work():
+        # 条件更新记录状态，重复归还不会重复加库存
+        close_borrow_record(record_id, datetime.now(timezone.utc))
+        # 有人预约时副本直接保留给队首读者，否则加回库存
+        release_copy(book_id)
+        stats.record_return()
+        
+        # 添加通知
+        notification = Notification(
+            user_id=user_id,
+            title='归还成功',
+            content=f'您已成功归还《{book_title}》',
+            type='return'
+        )
+        db.session.add(notification)
     
-    # 添加通知
-    notification = Notification(
-        user_id=user_id,
-        title='归还成功',
-        content=f'您已成功归还《{book.title}》',
-        type='return'
-    )
-    db.session.add(notification)
-    db.session.commit()
+    try:
+        run_in_transaction(work)
+    except InventoryError as e:
+        return jsonify({'code': e.code, 'msg': e.message}), e.code
+    invalidate_book(book_id)
     
     return jsonify({
         'code':  200,
@@ -96,13 +127,18 @@ def return_book(payload, record_id):
     }), 200
 
 @borrow_bp.route('/my-records', methods=['GET'])
+@query_budget(5)
 @token_required
 def get_my_borrow_records(payload):
     """获取我的借阅记录"""
     user_id = payload['user_id']
     status = request.args.get('status', '', type=str)
+    try:
+        fields = BorrowRecord.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
     
-    query = BorrowRecord.query.filter_by(user_id=user_id)
+    query = BorrowRecord.query.options(*BorrowRecord.serializer.load_options(fields)).filter_by(user_id=user_id)
     if status:
         query = query.filter_by(status=status)
     
@@ -110,7 +146,7 @@ def get_my_borrow_records(payload):
     
     return jsonify({
         'code': 200,
-        'data': [record.to_dict() for record in records]
+        'data': BorrowRecord.serializer.dump_many(records, fields)
     }), 200
 
 @borrow_bp.route('/<int:record_id>/renew', methods=['POST'])
@@ -135,6 +171,7 @@ def renew_book(payload, record_id):
     # 延期14天
     borrow_record.due_time = borrow_record.due_time + timedelta(days=14)
     borrow_record.renewal_count += 1
+    borrow_record.reminded_at = None  # 新的到期日需要重新提醒
     db.session.commit()
     
     return jsonify({
@@ -146,17 +183,20 @@ def renew_book(payload, record_id):
 @borrow_bp.route('/overdue', methods=['GET'])
 @token_required
 def get_overdue_records(payload):
-    """获取逾期图书"""
+    """获取逾期图书（状态由逾期清扫任务维护）"""
     user_id = payload['user_id']
-    overdue_records = BorrowRecord.query.filter(
+    try:
+        fields = BorrowRecord.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
+    overdue_records = BorrowRecord.query.options(*BorrowRecord.serializer.load_options(fields)).filter(
         and_(
             BorrowRecord.user_id == user_id,
-            BorrowRecord.status.in_(['borrowed', 'overdue']),
-            BorrowRecord.due_time < datetime.now(timezone.utc)
+            BorrowRecord.status == 'overdue'
         )
-    ).all()
+    ).order_by(BorrowRecord.due_time).all()
     
     return jsonify({
         'code': 200,
-        'data': [record.to_dict() for record in overdue_records]
+        'data': BorrowRecord.serializer.dump_many(overdue_records, fields)
     }), 200
\ No newline at end of file
@@ -1,6 +1,11 @@
 from flask import Blueprint, request, jsonify
 from models import db, BookComment, Book, User
 from utils.jwt_handler import token_required, admin_required
+from utils.query_budget import query_budget
+from utils.cache import invalidate_book
+from utils.pagination import cursor_requested, cursor_pagination
+from utils.counters import apply_rating_delta
+from utils.comments import COMMENT_ORDER, approved_comments
 
 comment_bp = Blueprint('comment', __name__, url_prefix='/api/comments')
 
@@ -18,7 +23,8 @@ def add_comment(payload, book_id):
     rating = data.get('rating', 0)
     comment = data.get('comment', '')
     
-    if not rating or rating < 1 or rating > 5:
+    # bool 是 int 的子类，true 不能当作 1 分；小数和字符串也不接受
+    if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
         return jsonify({'code': 400, 'msg': '评分必须在1-5之间'}), 400
     
     # 检查是否已评论
@@ -27,7 +33,9 @@ def add_comment(payload, book_id):
         book_id=book_id
     ).first()
     
+    # 增量更新图书评分汇总，与评论写入在同一事务中
     if existing:
+        apply_rating_delta(book_id, existing.rating, rating)
         existing.rating = rating
         existing.comment = comment
     else: 
@@ -38,13 +46,10 @@ def add_comment(payload, book_id):
             comment=comment
         )
         db.session.add(existing)
+        apply_rating_delta(book_id, None, rating)
     
     db.session.commit()
-    
-    # 更新图书评分
-    avg_rating = db.session.query(db.func.avg(BookComment.rating)).filter_by(book_id=book_id).scalar() or 0
-    book.avg_rating = round(avg_rating, 2)
-    db.session.commit()
+    invalidate_book(book_id)
     
     return jsonify({
         'code': 200,
@@ -67,31 +72,42 @@ def delete_comment(payload, comment_id):
         return jsonify({'code': 403, 'msg': '无权操作'}), 403
     
     book_id = comment.book_id
+    apply_rating_delta(book_id, comment.rating, None)
     db.session.delete(comment)
     db.session.commit()
-    
-    # 更新图书评分
-    avg_rating = db.session.query(db.func.avg(BookComment.rating)).filter_by(book_id=book_id).scalar() or 0
-    book = Book.query.get(book_id)
-    book.avg_rating = round(avg_rating, 2) if avg_rating else 0
-    db.session.commit()
+    invalidate_book(book_id)
     
     return jsonify({'code': 200, 'msg':  '删除成功'}), 200
 
 @comment_bp.route('/book/<int:book_id>', methods=['GET'])
+@query_budget(5)
 def get_book_comments(book_id):
-    """获取图书评论"""
+    """获取图书评论（带 cursor 参数时使用游标分页）"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    try:
+        fields = BookComment.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
+    
+    query = approved_comments(book_id).options(*BookComment.serializer.load_options(fields, BookComment.created_at))
+    
+    if cursor_requested():
+        try:
+            comments, pagination = cursor_pagination(query, COMMENT_ORDER, per_page)
+        except ValueError as e:
+            return jsonify({'code': 400, 'msg': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': BookComment.serializer.dump_many(comments, fields),
+            'pagination': pagination
+        }), 200
     
-    paginate = BookComment.query.filter(
-        BookComment.book_id == book_id,
-        BookComment.is_approved == True
-    ).order_by(BookComment.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    paginate = query.order_by(BookComment.created_at.desc(), BookComment.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
         'code':  200,
-        'data':  [comment.to_dict() for comment in paginate.items],
+        'data':  BookComment.serializer.dump_many(paginate.items, fields),
         'pagination': {
             'page': page,
             'per_page':  per_page,
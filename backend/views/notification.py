@@ -1,27 +1,137 @@
-from flask import Blueprint, request, jsonify
+import queue
+from flask import Blueprint, Response, current_app, request, jsonify
 from models import db, Notification
-from utils.jwt_handler import token_required
+from utils.jwt_handler import token_required, authenticate, create_stream_ticket, authenticate_stream_ticket
+from utils.pagination import cursor_requested, cursor_pagination
+from utils.notifier import get_broker, get_unread_count, invalidate_unread_count, sse_event
 
 notification_bp = Blueprint('notification', __name__, url_prefix='/api/notifications')
 
 @notification_bp.route('', methods=['GET'])
 @token_required
 def get_notifications(payload):
-    """获取通知"""
+    """获取通知（分页，带 cursor 参数时使用游标分页）"""
     user_id = payload['user_id']
     is_read = request.args.get('is_read', None, type=int)
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    try:
+        fields = Notification.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
     
-    query = Notification.query.filter_by(user_id=user_id)
+    query = Notification.query.options(*Notification.serializer.load_options(fields)).filter_by(user_id=user_id)
     if is_read is not None:
         query = query.filter_by(is_read=bool(is_read))
     
-    notifications = query.order_by(Notification.created_at.desc()).all()
+    if cursor_requested():
+        try:
+            notifications, pagination = cursor_pagination(
+                query, [(Notification.id, True, None)], per_page
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'msg': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': Notification.serializer.dump_many(notifications, fields),
+            'pagination': pagination
+        }), 200
     
+    # id 与创建时间同序，按主键倒序分页不需要额外排序
+    paginate = query.order_by(Notification.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    
+    return jsonify({
+        'code': 200,
+        'data': Notification.serializer.dump_many(paginate.items, fields),
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': paginate.total
+        }
+    }), 200
+
+@notification_bp.route('/unread-count', methods=['GET'])
+@token_required
+def get_notification_unread_count(payload):
+    """未读通知数（缓存）"""
     return jsonify({
         'code': 200,
-        'data': [notif.to_dict() for notif in notifications]
+        'data': {'count': get_unread_count(payload['user_id'])}
     }), 200
 
+@notification_bp.route('/stream-ticket', methods=['POST'])
+@token_required
+def get_stream_ticket(payload):
+    """签发推送连接票据：EventSource 无法设置请求头，用短期票据代替登录 token 放在 URL 中"""
+    return jsonify({
+        'code': 200,
+        'data': {
+            'ticket': create_stream_ticket(payload['user_id']),
+            'expires_in': current_app.config.get('NOTIFICATION_TICKET_TTL', 60)
+        }
+    }), 200
+
+@notification_bp.route('/stream', methods=['GET'])
+def stream_notifications():
+    """通知推送（Server-Sent Events）
+
+    认证使用 Authorization 头，或 ?ticket= 传入 /stream-ticket 签发的短期票据（不接受 URL 中的登录 token）。
+    本进程的推送连接数达到 NOTIFICATION_MAX_STREAMS 时返回 503，前端改为定时刷新未读数。
+    断线重连时浏览器带上 Last-Event-ID，补发期间漏掉的通知。
+    """
+    auth_header = request.headers.get('Authorization', '')
+    ticket = request.args.get('ticket', '', type=str)
+    if auth_header.startswith('Bearer '):
+        payload, error = authenticate(auth_header.split(' ', 1)[1])
+    elif ticket:
+        payload, error = authenticate_stream_ticket(ticket)
+    else:
+        return jsonify({'code': 401, 'msg': '缺少票据'}), 401
+    if error:
+        return error
+    user_id = payload['user_id']
+    
+    broker = get_broker()
+    subscription = broker.subscribe(user_id)
+    if subscription is None:
+        response = jsonify({'code': 503, 'msg': '推送连接已满，请稍后重试'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    missed = []
+    last_event_id = request.headers.get('Last-Event-ID', None, type=int)
+    if last_event_id is not None:
+        missed = [notif.to_dict() for notif in Notification.query.filter(
+            Notification.user_id == user_id,
+            Notification.id > last_event_id
+        ).order_by(Notification.id).limit(50)]
+    unread = get_unread_count(user_id)
+    heartbeat = current_app.config.get('NOTIFICATION_HEARTBEAT', 15)
+    
+    def generate():
+        yield 'retry: 5000\n\n'
+        yield sse_event('unread', {'count': unread})
+        for message in missed:
+            yield sse_event('notification', message, message['id'])
+        while True:
+            try:
+                message = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                # 心跳：保持连接并及时发现已断开的客户端
+                yield ': ping\n\n'
+                continue
+            if message is None:
+                # 服务正在退出
+                return
+            yield sse_event('notification', message, message.get('id'))
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: broker.unsubscribe(user_id, subscription))
+    return response
+
 @notification_bp.route('/<int:notif_id>/read', methods=['PUT'])
 @token_required
 def mark_as_read(payload, notif_id):
@@ -34,8 +144,10 @@ def mark_as_read(payload, notif_id):
     if notification.user_id != payload['user_id']: 
         return jsonify({'code': 403, 'msg': '无权操作'}), 403
     
-    notification.is_read = True
-    db.session.commit()
+    if not notification.is_read:
+        notification.is_read = True
+        db.session.commit()
+        invalidate_unread_count(notification.user_id)
     
     return jsonify({'code': 200, 'msg': '已标记'}), 200
 
@@ -46,5 +158,6 @@ def read_all_notifications(payload):
     user_id = payload['user_id']
     Notification.query.filter_by(user_id=user_id, is_read=False).update({'is_read': True})
     db.session.commit()
+    invalidate_unread_count(user_id)
     
     return jsonify({'code':  200, 'msg': '全部标记成功'}), 200
\ No newline at end of file
@@ -1,62 +1,71 @@
 from flask import Blueprint, request, jsonify
-from models import db, Reservation, Book, BorrowRecord, Notification, User
+from models import db, Reservation, Book, Notification
 from utils.jwt_handler import token_required
-from datetime import datetime
-from sqlalchemy import and_
+from utils.query_budget import query_budget
+from utils.cache import invalidate_book
+from utils.inventory import InventoryError, run_in_transaction
+from utils.reservation_queue import next_queue_position, queue_positions, waiting_count, release_copy
+from utils import stats
+from sqlalchemy import and_, case
 
 reservation_bp = Blueprint('reservation', __name__, url_prefix='/api/reservations')
 
 @reservation_bp.route('/<int:book_id>', methods=['POST'])
+@query_budget(16)
 @token_required
 def reserve_book(payload, book_id):
     """预约图书"""
     user_id = payload['user_id']
-    user = User.query.get(user_id)
     book = Book.query.get(book_id)
     
     if not book:
         return jsonify({'code': 404, 'msg': '图书不存在'}), 404
     
-    # 检查是否已预约
-    existing = Reservation.query.filter(
-        and_(
-            Reservation.user_id == user_id,
-            Reservation.book_id == book_id,
-            Reservation.status.in_(['waiting', 'notified'])
+    def work():
+        # 先分配序号：MySQL 上该 UPDATE 锁住图书行，同一本书的预约串行化，重复检查在锁内进行
+        queue_position = next_queue_position(book_id)
+        
+        # 检查是否已预约
+        existing = Reservation.query.filter(
+            and_(
+                Reservation.user_id == user_id,
+                Reservation.book_id == book_id,
+                Reservation.status.in_(['waiting', 'notified'])
+            )
+        ).first()
+        if existing:
+            raise InventoryError('您已预约此书')
+        
+        position = waiting_count(book_id) + 1
+        reservation = Reservation(
+            user_id=user_id,
+            book_id=book_id,
+            queue_position=queue_position
+        )
+        db.session.add(reservation)
+        stats.bump_counter(stats.WAITING_RESERVATIONS, 1)
+        
+        # 添加通知
+        notification = Notification(
+            user_id=user_id,
+            title='预约成功',
+            content=f'您已预约《{book.title}》，队列位置：{position}',
+            type='reservation'
         )
-    ).first()
-    
-    if existing: 
-        return jsonify({'code':  400, 'msg': '您已预约此书'}), 400
-    
-    # 获取队列位置
-    queue_position = db.session.query(db.func.max(Reservation.queue_position)).filter(
-        Reservation.book_id == book_id
-    ).scalar() or 0
-    queue_position += 1
-    
-    reservation = Reservation(
-        user_id=user_id,
-        book_id=book_id,
-        queue_position=queue_position
-    )
-    
-    db.session.add(reservation)
-    
-    # 添加通知
-    notification = Notification(
-        user_id=user_id,
-        title='预约成功',
-        content=f'您已预约《{book.title}》，队列位置：{queue_position}',
-        type='reservation'
-    )
-    db.session.add(notification)
-    db.session.commit()
+        db.session.add(notification)
+        return reservation, position
     
+    try:
+        reservation, position = run_in_transaction(work)
+    except InventoryError as e:
+        return jsonify({'code': e.code, 'msg': e.message}), e.code
+    
+    data = reservation.to_dict()
+    data['position'] = position
     return jsonify({
         'code': 200,
         'msg': '预约成功',
-        'data': reservation.to_dict()
+        'data': data
     }), 200
 
 @reservation_bp.route('/my-reservations', methods=['GET'])
@@ -66,18 +75,26 @@ def get_my_reservations(payload):
     user_id = payload['user_id']
     status = request.args.get('status', '', type=str)
     
-    query = Reservation.query.filter_by(user_id=user_id)
+    query = Reservation.query.options(*Reservation.serializer.load_options()).filter_by(user_id=user_id)
     if status:
         query = query.filter_by(status=status)
     
     reservations = query.order_by(Reservation.queue_position).all()
+    positions = queue_positions([res.id for res in reservations if res.status == 'waiting'])
+    
+    data = []
+    for res in reservations:
+        item = res.to_dict()
+        item['position'] = positions.get(res.id)
+        data.append(item)
     
     return jsonify({
         'code': 200,
-        'data': [res.to_dict() for res in reservations]
+        'data': data
     }), 200
 
 @reservation_bp.route('/<int:reservation_id>/cancel', methods=['POST'])
+@query_budget(16)
 @token_required
 def cancel_reservation(payload, reservation_id):
     """取消预约"""
@@ -90,25 +107,60 @@ def cancel_reservation(payload, reservation_id):
     if reservation.user_id != user_id:
         return jsonify({'code': 403, 'msg': '无权操作'}), 403
     
-    if reservation.status == 'cancelled':
-        return jsonify({'code': 400, 'msg':  '已取消'}), 400
-    
-    reservation.status = 'cancelled'
-    db.session.commit()
+    if reservation.status not in ('waiting', 'notified'):
+        return jsonify({'code': 400, 'msg':  '预约已结束，无法取消'}), 400
+    
+    def work():
+        # 按状态分别做条件更新，以实际命中的那条为准：
+        # 读取之后该预约可能刚被提升为 notified，不能按事务外读到的状态判断
+        def cancel_if(status):
+            return Reservation.query.filter(
+                Reservation.id == reservation_id,
+                Reservation.status == status
+            ).update({'status': 'cancelled'}, synchronize_session=False)
+        
+        if cancel_if('waiting'):
+            stats.bump_counter(stats.WAITING_RESERVATIONS, -1)
+        elif cancel_if('notified'):
+            # 放弃已保留的副本：转给下一位读者或加回库存
+            release_copy(reservation.book_id)
+        else:
+            raise InventoryError('预约已结束，无法取消')
+    
+    try:
+        run_in_transaction(work)
+    except InventoryError as e:
+        return jsonify({'code': e.code, 'msg': e.message}), e.code
+    invalidate_book(reservation.book_id)
     
     return jsonify({'code': 200, 'msg': '取消成功'}), 200
 
 @reservation_bp.route('/queue/<int:book_id>', methods=['GET'])
 def get_reservation_queue(book_id):
-    """获取预约队列"""
-    reservations = Reservation.query.filter(
+    """获取预约队列（按队列顺序返回前 limit 条）"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    reservations = Reservation.query.options(*Reservation.serializer.load_options()).filter(
         and_(
             Reservation.book_id == book_id,
             Reservation.status.in_(['waiting', 'notified'])
         )
-    ).order_by(Reservation.queue_position).all()
+    ).order_by(
+        # 已通知（保留中）的排在等待中的前面
+        case((Reservation.status == 'notified', 0), else_=1), Reservation.queue_position
+    ).limit(limit).all()
+    
+    data = []
+    position = 0
+    for res in reservations:
+        item = res.to_dict()
+        if res.status == 'waiting':
+            position += 1
+            item['position'] = position
+        data.append(item)
     
     return jsonify({
         'code': 200,
-        'data': [res.to_dict() for res in reservations]
+        'data': data,
+        'waiting': waiting_count(book_id)
     }), 200
\ No newline at end of file
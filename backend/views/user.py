@@ -1,6 +1,8 @@
-from flask import Blueprint, request, jsonify
-from models import db, User
-from utils.jwt_handler import create_token, token_required
+from flask import Blueprint, request, jsonify, current_app
+from models import db, User, Book, BorrowRecord
+from utils.jwt_handler import create_token, token_required, revoke_token
+from utils.recommendations import recommend_for_user
+from utils import stats
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
 
@@ -35,6 +37,7 @@ def register():
         email=email
     )
     db.session.add(user)
+    stats.bump_counter(stats.USERS, 1)
     db.session.commit()
     
     return jsonify({
@@ -85,6 +88,41 @@ def get_profile(payload):
         'data': user.to_dict()
     }), 200
 
+@user_bp.route('/recommendations', methods=['GET'])
+@token_required
+def get_recommendations(payload):
+    """个性化推荐：最近借阅图书的相似图书；没有借阅记录或相似数据时退回未借过的热门图书"""
+    user_id = payload['user_id']
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    try:
+        fields = Book.serializer.requested_fields()
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
+    options = Book.serializer.load_options(fields)
+    
+    source = 'similar'
+    rows = recommend_for_user(
+        user_id, limit, current_app.config.get('RECOMMEND_HISTORY_SIZE', 20), options
+    )
+    if not rows:
+        source = 'popular'
+        borrowed = db.session.query(BorrowRecord.book_id).filter(BorrowRecord.user_id == user_id)
+        books = Book.query.options(*options).filter(Book.id.notin_(borrowed)).order_by(
+            Book.borrowed_count.desc(), Book.id
+        ).limit(limit).all()
+        rows = [(book, None) for book in books]
+    
+    data = []
+    for book, score in rows:
+        item = Book.serializer.dump(book, fields)
+        item['score'] = round(score, 4) if score is not None else None
+        data.append(item)
+    return jsonify({
+        'code': 200,
+        'data': data,
+        'source': source
+    }), 200
+
 @user_bp.route('/profile', methods=['PUT'])
 @token_required
 def update_profile(payload):
@@ -130,4 +168,13 @@ def change_password(payload):
     user.password = generate_password_hash(new_password)
     db.session.commit()
     
-    return jsonify({'code': 200, 'msg': '密码修改成功'}), 200
\ No newline at end of file
+    return jsonify({'code': 200, 'msg': '密码修改成功'}), 200
+
+@user_bp.route('/logout', methods=['POST'])
+@token_required
+def logout(payload):
+    """退出登录（吊销当前 token）"""
+    token = request.headers['Authorization'].split(' ')[1]
+    revoke_token(token, payload)
+    
+    return jsonify({'code': 200, 'msg': '已退出登录'}), 200
\ No newline at end of file
@@ -0,0 +1,11 @@
+"""生产环境 WSGI 入口
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+FLASK_CONFIG 指定配置（默认 prod），数据库和进程数等见 config.ProdConfig。
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.getenv('FLASK_CONFIG', 'prod'))
@@ -16,6 +16,12 @@ export const getImageUrl = (path) => {
   return `http://localhost:5000${path}`
 }
 
+// 列表等小图场景使用缩略图（WebP），没有变体时退回原图
+export const getCoverUrl = (book, size = 'thumb') => {
+  const variant = book.cover_variants?.[size]?.webp
+  return getImageUrl(variant || book.cover_url)
+}
+
 // ✅ 修改：支持 FormData（文件上传）
 export const addBook = (data) => {
   return request.post('/books', data, {
@@ -10,4 +10,14 @@ export const markAsRead = (notifId) => {
 
 export const readAllNotifications = () => {
   return request.put('/notifications/read-all')
+}
+
+export const getUnreadCount = () => {
+  return request.get('/notifications/unread-count')
+}
+
+// EventSource 不能设置请求头：先用登录 token 换取短期票据，URL 中只出现票据
+export const openNotificationStream = async () => {
+  const res = await request.post('/notifications/stream-ticket')
+  return new EventSource(`/api/notifications/stream?ticket=${encodeURIComponent(res.data.ticket)}`)
 }
\ No newline at end of file
@@ -18,4 +18,8 @@ export const updateProfile = (data) => {
 
 export const changePassword = (data) => {
   return request.post('/users/change-password', data)
+}
+
+export const logout = () => {
+  return request.post('/users/logout')
 }
\ No newline at end of file